@@ -0,0 +1,169 @@
+import re
+from typing import List
+
+from common.token_utils import char_token_weight, estimate_tokens
+
+# 段落标记，如【用量用法】【现代研究】，只在行首出现时才作为切分点
+SECTION_MARKER_PATTERN = re.compile(r"^[ \t]*【[^】\n]{1,20}】", re.MULTILINE)
+
+
+def split_sections(text: str) -> List[str]:
+    """
+    按行首的【...】标记把文本切成若干段，标记保留在所属段的开头
+    """
+    starts = [match.start() for match in SECTION_MARKER_PATTERN.finditer(text)]
+    if not starts or starts[0] != 0:
+        starts = [0] + starts
+    sections = [text[start:end] for start, end in zip(starts, starts[1:] + [len(text)])]
+    return [section for section in sections if section.strip()]
+
+
+def split_by_token_window(text: str, max_tokens: int, overlap_tokens: int) -> List[str]:
+    """
+    把超长文本按 token 预算切成滑动窗口，相邻窗口之间重叠 overlap_tokens 个 token
+
+    Args:
+        text: 输入文本
+        max_tokens: 每个窗口的 token 上限
+        overlap_tokens: 相邻窗口的重叠 token 数，需小于 max_tokens
+
+    Returns:
+        窗口文本列表
+    """
+    overlap_tokens = min(overlap_tokens, max_tokens // 2)
+    # 逐字符估算 token 数（与 estimate_tokens 口径一致），累计后作为切分依据
+    boundaries = [0.0]
+    for char in text:
+        boundaries.append(boundaries[-1] + char_token_weight(char))
+
+    windows = []
+    start = 0
+    while start < len(text):
+        end = start
+        while end < len(text) and boundaries[end + 1] - boundaries[start] <= max_tokens:
+            end += 1
+        end = max(end, start + 1)
+        windows.append(text[start:end])
+        if end >= len(text):
+            break
+        # 下一个窗口从 end 往回退 overlap_tokens 个 token 开始
+        next_start = end
+        while next_start > start + 1 and boundaries[end] - boundaries[next_start - 1] <= overlap_tokens:
+            next_start -= 1
+        start = next_start
+    return windows
+
+
+def split_text_into_chunks(text: str, max_tokens: int = 1500, overlap_tokens: int = 100) -> List[str]:
+    """
+    把长文档切分成若干块，用于分块抽取
+
+    先按【...】段落标记切分，再把相邻段落合并到 max_tokens 以内；单个段落超出预算时
+    按 token 窗口切分并保留 overlap_tokens 的重叠，切剩的尾部与下一段合并后再切分。文档首行
+    （如【方剂名称】十全大补汤）加到每一块的开头，保证每一块都知道在讲哪个方剂或药材，不会单独成块。
+
+    Args:
+        text: 输入文本
+        max_tokens: 每块的 token 上限（不含首行标题）
+        overlap_tokens: 段落内切分时相邻块的重叠 token 数
+
+    Returns:
+        分块后的文本列表；文本未超出预算时只有一块，即原文
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+
+    # 首行标题单独取出，最后加到每一块开头，不单独成块，也不计入预算
+    title, _, body = text.strip().partition("\n")
+    title = title.strip()
+    pieces = []
+    carry = ""
+    for section in split_sections(body):
+        section = carry + section
+        carry = ""
+        if estimate_tokens(section) <= max_tokens:
+            pieces.append(section)
+            continue
+        windows = split_by_token_window(section, max_tokens, overlap_tokens)
+        pieces.extend(windows[:-1])
+        # 超长段落切剩的尾部并入下一段一起切分，不单独成为一个很小的块
+        carry = windows[-1]
+    if carry:
+        pieces.append(carry)
+
+    chunks = []
+    current = ""
+    for piece in pieces:
+        if current and estimate_tokens(current) + estimate_tokens(piece) > max_tokens:
+            chunks.append(current)
+            current = ""
+        current += piece
+    if current:
+        chunks.append(current)
+
+    return [f"{title}\n{chunk}" for chunk in chunks] if chunks else [title]
+
+
+def merge_extraction_results(results: List[dict]) -> dict:
+    """
+    合并多个分块的抽取结果
+
+    实体按 (name, type) 去重，属性取并集，同名属性后出现的覆盖先出现的
+    （与 parse_entities_and_relations 的合并方式一致）；关系按五元组去重。
+    合并结果保持各实体、关系首次出现的顺序。
+
+    Args:
+        results: 每个分块的抽取结果，形如 {"entities": [...], "relations": [...]}
+
+    Returns:
+        合并后的抽取结果
+    """
+    entities_dict = {}
+    relations_dict = {}
+
+    for result in results:
+        if not result:
+            continue
+        for entity in result.get("entities") or []:
+            name = entity.get("name")
+            entity_type = entity.get("type")
+            if not name or not entity_type:
+                continue
+            attributes = entity.get("attributes") or {}
+            if not isinstance(attributes, dict):
+                attributes = {}
+
+            entity_key = (name, entity_type)
+            if entity_key in entities_dict:
+                merged_attributes = entities_dict[entity_key].get("attributes") or {}
+                merged_attributes.update(attributes)
+                if merged_attributes:
+                    entities_dict[entity_key]["attributes"] = merged_attributes
+            else:
+                merged_entity = {"name": name, "type": entity_type}
+                if attributes:
+                    merged_entity["attributes"] = dict(attributes)
+                entities_dict[entity_key] = merged_entity
+
+        for relation in result.get("relations") or []:
+            relation_key = (relation.get("subject"), relation.get("subject_type"), relation.get("relation"),
+                            relation.get("object"), relation.get("object_type"))
+            if all(relation_key) and relation_key not in relations_dict:
+                relations_dict[relation_key] = {
+                    "subject": relation_key[0],
+                    "subject_type": relation_key[1],
+                    "relation": relation_key[2],
+                    "object": relation_key[3],
+                    "object_type": relation_key[4]
+                }
+
+    return {
+        "entities": list(entities_dict.values()),
+        "relations": list(relations_dict.values())
+    }
+
+
+if __name__ == '__main__':
+    text = "【方剂名称】十全大补汤\n组成\n人参6克，肉桂3克。\n【用量用法】\n上药为细末。\n【现代研究】\n增强免疫。\n"
+    for chunk in split_text_into_chunks(text, max_tokens=20, overlap_tokens=5):
+        print(repr(chunk))
@@ -1,12 +1,27 @@
+from langchain_core.exceptions import OutputParserException
 from langchain_core.output_parsers import JsonOutputParser
 from pydantic import BaseModel
-from typing import List, Literal, Optional, Union
+from typing import Dict, List, Literal, Optional, Union
 import os
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from tqdm import tqdm
 
+from __002__extract_information.__000__extract_chunk_utils import merge_extraction_results, split_text_into_chunks
+from __002__extract_information.__000__extract_prefilter_utils import RelationPreFilter
+from common.config import Config
+from common.extraction_cache import ExtractionCache, get_extraction_cache, make_cache_key
 from common.llm import my_llm
+from common.path_utils import get_file_path
+from common.rate_limiter import RateLimiter, call_with_retry
+from common.token_utils import estimate_tokens
+
+conf = Config()
+
+# 抽取结果缓存的默认位置，中药和方剂两个抽取脚本共用
+DEFAULT_EXTRACTION_CACHE_PATH = get_file_path("__002__extract_information/extraction_cache.sqlite")
 
 # ======================
 # 枚举定义
@@ -71,6 +86,8 @@ class TCMKnowledgeGraph(BaseModel):
 
 # 初始化解析器
 parser = JsonOutputParser(pydantic_object=TCMKnowledgeGraph)
+# 多文档打包抽取的输出是 {文件名: 抽取结果}，不绑定固定的结构
+packed_parser = JsonOutputParser()
 """
 {
     "entities":[{"name":"麻黄汤", "type":"Formula", "attributes":{"effects":"止咳化痰"}}, {...}, {...}],
@@ -79,8 +96,9 @@ parser = JsonOutputParser(pydantic_object=TCMKnowledgeGraph)
 """
 
 
-def get_prompt(text: str):
-    prompt = ("你是一个中医知识图谱抽取专家。请从以下文本中提取结构化知识：\n"
+def get_prompt_instructions() -> str:
+    """抽取提示词中与输入文本无关的固定部分（任务说明、实体/关系类型和输出格式）"""
+    instructions = ("你是一个中医知识图谱抽取专家。请从以下文本中提取结构化知识：\n"
               "仅当文本中存在实体之间的明确关系时（如‘某方剂治疗某疾病’、‘某药材具有某功效’、‘方剂包含药材’等），才进行抽取。\n"
               "如果文本中仅描述单个实体的信息、未涉及其他实体或关系，请不要抽取，返回空结构：\n"
               "{{\"entities\": [], \"relations\": []}}\n\n"
@@ -106,63 +124,148 @@ def get_prompt(text: str):
               "如果文本主要是讲药材的，请不要抽取方剂的属性字段。\n"
               "如果值为空null，则不必显示键的值。"
               "所有输出必须严格符合以下 JSON 格式：\n"
-              f"{parser.get_format_instructions()}\n\n"
-              f"输入文本：{text}")
+              f"{parser.get_format_instructions()}\n\n")
+    return instructions
+
+
+def get_prompt(text: str):
+    prompt = get_prompt_instructions() + f"输入文本：{text}"
     return prompt
 
 
-def extract_tcm_knowledge(text: str, verbose: bool = True):
+def get_packed_prompt(documents: Dict[str, str]) -> str:
     """
-    从文本中提取中医知识图谱
-    
+    构造多文档打包抽取的提示词：多篇短文档共用一份固定说明，输出按文件名分组
+
     Args:
-        text: 输入文本
-        verbose: 是否打印流式输出，默认True
-    
+        documents: {文件名: 文本}
+
     Returns:
-        提取的知识图谱数据
+        提示词
+    """
+    document_blocks = "\n\n".join(f"【文档：{filename}】\n{text}" for filename, text in documents.items())
+    prompt = (get_prompt_instructions() +
+              "本次输入包含多篇相互独立的文档，每篇以【文档：文件名】开头。\n"
+              "请对每篇文档分别按上述要求抽取，输出一个 JSON 对象：键为文件名（与【文档：...】中的完全一致），"
+              "值为该文档的抽取结果，格式与上面的单篇输出格式相同；没有可抽取内容的文档，值为空结构。\n"
+              "例如：{\"a.txt\": {\"entities\": [...], \"relations\": [...]}, \"b.txt\": {\"entities\": [], \"relations\": []}}\n\n"
+              f"输入文档：\n{document_blocks}")
+    return prompt
+
+
+def get_extraction_cache_key(text: str, packed: bool = False) -> str:
+    """
+    生成抽取结果的缓存键：输入文本 + 提示词模板 + 模型名称
+
+    提示词模板用 get_prompt("") 表示，模板或格式说明有任何改动都会让旧缓存自然失效；
+    文件改名或同一段文本出现在不同语料中时仍能命中。
+    packed=True 时使用打包提示词的模板，打包抽取的结果与单篇抽取的结果分开缓存，单篇抽取不会读到打包的结果。
+    """
+    template = get_packed_prompt({}) if packed else get_prompt("")
+    return make_cache_key(text, template, conf.MODEL_NAME)
+
+
+def stream_llm_content(prompt: str, verbose: bool = True):
     """
-    prompt = get_prompt(text)
+    流式调用大模型，拼接完整输出
 
-    # 流式输出模版
+    Args:
+        prompt: 提示词
+        verbose: 是否打印流式输出
+
+    Returns:
+        (完整输出文本, 接口返回的 token 用量字典或 None)
+    """
     full_content = ""
+    usage_metadata = None
     for chunk in my_llm.stream(prompt):
         if chunk.content:
             if verbose:
                 print(chunk.content, end="", flush=True)
             full_content += chunk.content
+        # 部分接口会在最后一个 chunk 中返回真实的 token 用量
+        if getattr(chunk, "usage_metadata", None):
+            usage_metadata = chunk.usage_metadata
     if verbose:
         print()
+    return full_content, usage_metadata
 
-    return parser.parse(full_content)
 
+def call_llm(prompt: str, verbose: bool = True, rate_limiter: Optional[RateLimiter] = None,
+             max_retries: int = 0, usage: Optional[dict] = None) -> str:
+    """
+    带限流、重试和用量统计的大模型流式调用
 
-def load_existing_results(output_json_path: str):
+    Args:
+        prompt: 提示词
+        verbose: 是否打印流式输出
+        rate_limiter: 可选的限流器，调用前按预估 token 数占用配额
+        max_retries: 遇到 429 / 5xx 等可重试错误时的最大重试次数
+        usage: 可选的统计字典，会累加本次调用的 input_tokens / output_tokens / llm_calls
+
+    Returns:
+        大模型的完整输出文本
     """
-    加载已存在的json文件结果，用于断点续跑
+    input_tokens = estimate_tokens(prompt)
+
+    def _call():
+        if rate_limiter is not None:
+            rate_limiter.acquire(input_tokens)
+        return stream_llm_content(prompt, verbose=verbose)
+
+    def _on_retry(attempt, error, delay):
+        tqdm.write(f"  ↻ 第 {attempt} 次重试（{delay:.1f}s 后）: {error}")
+
+    full_content, usage_metadata = call_with_retry(_call, max_retries=max_retries, on_retry=_on_retry)
+
+    if usage_metadata:
+        input_tokens = usage_metadata.get("input_tokens", input_tokens)
+        output_tokens = usage_metadata.get("output_tokens", 0)
+    else:
+        output_tokens = estimate_tokens(full_content)
+    if rate_limiter is not None:
+        # 输出 token 在调用前无法预知，调用完成后补记
+        rate_limiter.record_tokens(output_tokens)
+    if usage is not None:
+        usage["input_tokens"] = usage.get("input_tokens", 0) + input_tokens
+        usage["output_tokens"] = usage.get("output_tokens", 0) + output_tokens
+        usage["llm_calls"] = usage.get("llm_calls", 0) + 1
+
+    return full_content
+
+
+def extract_tcm_knowledge(text: str, verbose: bool = True, rate_limiter: Optional[RateLimiter] = None,
+                          max_retries: int = 0, usage: Optional[dict] = None,
+                          cache: Optional[ExtractionCache] = None):
+    """
+    从文本中提取中医知识图谱
     
     Args:
-        output_json_path: json文件路径
+        text: 输入文本
+        verbose: 是否打印流式输出，默认True
+        rate_limiter: 可选的限流器，调用前按预估 token 数占用配额
+        max_retries: 遇到 429 / 5xx 等可重试错误时的最大重试次数，默认0不重试
+        usage: 可选的统计字典，会累加本次调用的 input_tokens / output_tokens，命中缓存时累加 cache_hits
+        cache: 可选的抽取结果缓存，命中时不再调用大模型
     
     Returns:
-        已处理的文件名集合和已有的结果列表
+        提取的知识图谱数据
     """
-    processed_files = set()
-    existing_results = []
-
-    if os.path.exists(output_json_path):
-        try:
-            with open(output_json_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                if "output_list" in data:
-                    existing_results = data["output_list"]
-                    processed_files = {item["filename"] for item in existing_results if "filename" in item}
-                    print(f"发现已存在的json文件，已处理 {len(processed_files)} 个文件，将跳过这些文件")
-        except Exception as e:
-            print(f"读取已存在的json文件失败: {e}，将重新开始")
-            existing_results = []
-
-    return processed_files, existing_results
+    cache_key = None
+    if cache is not None:
+        cache_key = get_extraction_cache_key(text)
+        cached_result = cache.get(cache_key)
+        if cached_result is not None:
+            if usage is not None:
+                usage["cache_hits"] = usage.get("cache_hits", 0) + 1
+            return cached_result
+
+    full_content = call_llm(get_prompt(text), verbose=verbose, rate_limiter=rate_limiter,
+                            max_retries=max_retries, usage=usage)
+    result = parser.parse(full_content)
+    if cache is not None:
+        cache.put(cache_key, result)
+    return result
 
 
 def save_result_to_json(output_json_path: str, output_list: List[dict]):
@@ -203,12 +306,433 @@ def save_finetune_data_to_json(finetune_output_path: str, finetune_data_list: Li
         json.dump(finetune_data_list, f, ensure_ascii=False, indent=2)
 
 
+def extract_tcm_knowledge_chunked(text: str, max_chunk_tokens: Optional[int] = None, chunk_overlap_tokens: int = 100,
+                                  chunk_workers: int = 4, usage: Optional[dict] = None, **extract_kwargs):
+    """
+    分块抽取长文档：按【...】段落或 token 预算切块，各块并发调用大模型后合并结果
+
+    总耗时取决于最慢的一块而不是所有块之和；某一块的输出解析失败时只丢弃该块，丢弃的块数记在
+    usage["failed_chunks"]，全部失败才抛出异常；限流、超时、网络等重试后仍失败的错误直接抛出，
+    整个文件记为失败，断点续跑时会重新处理。文本不超过预算或 max_chunk_tokens 为 None 时等同于 extract_tcm_knowledge。
+
+    Args:
+        text: 输入文本
+        max_chunk_tokens: 每块的 token 上限，None 表示不分块
+        chunk_overlap_tokens: 段落内切分时相邻块的重叠 token 数
+        chunk_workers: 同一文档内并发抽取的最大块数
+        usage: 可选的统计字典，累加所有块的 token 用量和解析失败的块数
+        **extract_kwargs: 透传给 extract_tcm_knowledge 的其它参数（verbose / rate_limiter / max_retries / cache）
+
+    Returns:
+        合并后的知识图谱数据
+    """
+    if max_chunk_tokens is None:
+        return extract_tcm_knowledge(text, usage=usage, **extract_kwargs)
+
+    chunks = split_text_into_chunks(text, max_chunk_tokens, chunk_overlap_tokens)
+    if len(chunks) == 1:
+        return extract_tcm_knowledge(text, usage=usage, **extract_kwargs)
+
+    # 每块使用独立的统计字典，避免多线程同时累加同一个字典
+    chunk_usages = [{} for _ in chunks]
+    results = []
+    errors = []
+    with ThreadPoolExecutor(max_workers=max(1, min(chunk_workers, len(chunks)))) as executor:
+        futures = [executor.submit(extract_tcm_knowledge, chunk, usage=chunk_usage, **extract_kwargs)
+                   for chunk, chunk_usage in zip(chunks, chunk_usages)]
+        for index, future in enumerate(futures):
+            try:
+                results.append(future.result())
+            except OutputParserException as e:
+                errors.append(e)
+                tqdm.write(f"  ✗ 第 {index + 1}/{len(chunks)} 块输出解析失败: {e}")
+
+    if usage is not None:
+        for chunk_usage in chunk_usages:
+            for key, value in chunk_usage.items():
+                usage[key] = usage.get(key, 0) + value
+        if errors:
+            usage["failed_chunks"] = usage.get("failed_chunks", 0) + len(errors)
+
+    if not results:
+        raise errors[0]
+    return merge_extraction_results(results)
+
+
+def extract_tcm_knowledge_packed(documents: Dict[str, str], verbose: bool = True,
+                                 rate_limiter: Optional[RateLimiter] = None, max_retries: int = 0,
+                                 usage: Optional[dict] = None) -> Dict[str, dict]:
+    """
+    把多篇短文档打包到一次请求中抽取，固定的说明和格式要求只发送一次
+
+    Args:
+        documents: {文件名: 文本}
+        verbose: 是否打印流式输出
+        rate_limiter: 可选的限流器
+        max_retries: 可重试错误的最大重试次数
+        usage: 可选的统计字典，累加本次调用的 token 用量
+
+    Returns:
+        {文件名: 抽取结果}，只包含输出中结构合法的文档；整体解析失败时抛出异常
+    """
+    full_content = call_llm(get_packed_prompt(documents), verbose=verbose, rate_limiter=rate_limiter,
+                            max_retries=max_retries, usage=usage)
+    packed_result = packed_parser.parse(full_content)
+    if not isinstance(packed_result, dict):
+        raise ValueError("打包抽取的输出不是按文件名分组的JSON对象")
+
+    results = {}
+    for filename in documents:
+        result = packed_result.get(filename)
+        if (isinstance(result, dict) and isinstance(result.get("entities"), list)
+                and isinstance(result.get("relations"), list)):
+            results[filename] = {"entities": result["entities"], "relations": result["relations"]}
+    return results
+
+
+def get_checkpoint_path(json_path: str) -> str:
+    """
+    获取json结果文件对应的追加式检查点日志路径（同名 .jsonl 文件）
+
+    例如 herb_knowledge_graph.json -> herb_knowledge_graph.jsonl
+    """
+    return f"{os.path.splitext(json_path)[0]}.jsonl"
+
+
+def append_jsonl_records(jsonl_path: str, records: List[dict]):
+    """
+    以追加方式把记录写入JSONL检查点日志，每条记录一行，写完后 fsync 落盘
+
+    每次写入的开销只与本次记录大小有关，与已处理文件数无关。
+
+    Args:
+        jsonl_path: JSONL日志路径
+        records: 要追加的记录列表
+    """
+    output_dir = os.path.dirname(jsonl_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    with open(jsonl_path, 'a', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def read_jsonl_records(jsonl_path: str):
+    """
+    逐行读取JSONL检查点日志
+
+    进程在写入中途被杀时最后一行可能不完整，解析失败的行会被跳过。
+    """
+    with open(jsonl_path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                print(f"跳过检查点日志 {jsonl_path} 第 {line_no} 行（记录不完整）")
+
+
+def load_existing_results(output_json_path: str):
+    """
+    扫描检查点日志，重建已处理的文件名集合，用于断点续跑
+
+    如果只有旧版的json结果文件而没有日志，会先把json中的记录导入日志，
+    之后的运行都只追加日志。
+    
+    Args:
+        output_json_path: json文件路径
+    
+    Returns:
+        已处理的文件名集合（最后一条记录为失败的文件不计入）和日志中的记录条数
+    """
+    checkpoint_path = get_checkpoint_path(output_json_path)
+    processed_files = set()
+    record_count = 0
+
+    if not os.path.exists(checkpoint_path) and os.path.exists(output_json_path):
+        try:
+            with open(output_json_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            existing_results = data.get("output_list", [])
+            append_jsonl_records(checkpoint_path, existing_results)
+            print(f"已将json文件中的 {len(existing_results)} 条结果导入检查点日志: {checkpoint_path}")
+        except Exception as e:
+            print(f"读取已存在的json文件失败: {e}，将重新开始")
+
+    if os.path.exists(checkpoint_path):
+        failed_files = set()
+        for record in read_jsonl_records(checkpoint_path):
+            record_count += 1
+            if "filename" not in record:
+                continue
+            # 失败的文件不算已处理，续跑时重新抽取（同名文件以最后一条记录为准）
+            if record.get("error") is None:
+                processed_files.add(record["filename"])
+                failed_files.discard(record["filename"])
+            else:
+                failed_files.add(record["filename"])
+                processed_files.discard(record["filename"])
+        print(f"发现已存在的检查点日志，已处理 {len(processed_files)} 个文件，将跳过这些文件；"
+              f"{len(failed_files)} 个失败的文件将重新处理")
+
+    return processed_files, record_count
+
+
+def load_existing_finetune_data(finetune_output_path: str) -> int:
+    """
+    与 load_existing_results 相同，为微调语料准备检查点日志，必要时从旧版json导入
+
+    Args:
+        finetune_output_path: 微调语料输出文件路径
+
+    Returns:
+        日志中已有的微调语料条数
+    """
+    checkpoint_path = get_checkpoint_path(finetune_output_path)
+
+    if not os.path.exists(checkpoint_path) and os.path.exists(finetune_output_path):
+        try:
+            with open(finetune_output_path, 'r', encoding='utf-8') as f:
+                append_jsonl_records(checkpoint_path, json.load(f))
+        except Exception as e:
+            print(f"读取已存在的微调数据失败: {e}，将重新开始")
+
+    if not os.path.exists(checkpoint_path):
+        return 0
+    return sum(1 for _ in read_jsonl_records(checkpoint_path))
+
+
+def finalize_extraction_results(output_json_path: str, finetune_output_path: str = None):
+    """
+    把检查点日志压缩成原有的json文件格式
+
+    结果日志按文件名去重（同名文件以最后一条记录为准，保留首次出现的顺序），
+    写成 {"output_list": [...]}；微调语料日志写成Alpaca格式的列表。
+
+    Args:
+        output_json_path: json结果文件路径
+        finetune_output_path: 微调语料输出文件路径，None表示不处理微调语料
+
+    Returns:
+        压缩后的结果条数
+    """
+    checkpoint_path = get_checkpoint_path(output_json_path)
+    if not os.path.exists(checkpoint_path):
+        return 0
+
+    results_by_filename = {}
+    for record in read_jsonl_records(checkpoint_path):
+        results_by_filename[record.get("filename")] = record
+    output_list = list(results_by_filename.values())
+    save_result_to_json(output_json_path, output_list)
+
+    if finetune_output_path is not None:
+        finetune_checkpoint_path = get_checkpoint_path(finetune_output_path)
+        if os.path.exists(finetune_checkpoint_path):
+            finetune_data_list = [
+                {key: value for key, value in record.items() if key != "filename"}
+                for record in read_jsonl_records(finetune_checkpoint_path)
+            ]
+            save_finetune_data_to_json(finetune_output_path, finetune_data_list)
+
+    return len(output_list)
+
+
+def _prepare_record(txt_file: Path, prefilter: Optional[RelationPreFilter] = None,
+                    prefilter_audit: bool = False) -> dict:
+    """
+    读取txt文件并执行本地预过滤，生成待抽取的处理记录
+
+    Returns:
+        处理记录字典：filename / text / result / error / usage / latency，
+        以及预过滤相关的 prefiltered（预测为空）和 skipped（实际跳过了大模型调用）
+    """
+    record = {"filename": txt_file.name, "text": None, "result": None, "error": None,
+              "prefiltered": False, "skipped": False, "usage": {}, "latency": 0.0}
+    try:
+        # 读取文件内容
+        with open(txt_file, 'r', encoding='utf-8') as f:
+            record["text"] = f.read()
+        if prefilter is not None and not prefilter.may_have_relations(record["text"]):
+            record["prefiltered"] = True
+        if record["prefiltered"] and not prefilter_audit:
+            record["skipped"] = True
+            record["result"] = {"entities": [], "relations": []}
+    except Exception as e:
+        record["error"] = str(e)
+    return record
+
+
+def _needs_extraction(record: dict) -> bool:
+    return record["error"] is None and record["result"] is None
+
+
+def _extract_record(record: dict, extract_kwargs: dict):
+    """对单条记录调用（分块）抽取，异常写入记录的 error 字段"""
+    try:
+        record["result"] = extract_tcm_knowledge_chunked(record["text"], usage=record["usage"], **extract_kwargs)
+    except Exception as e:
+        record["error"] = str(e)
+
+
+def _extract_one_file(txt_file: Path, extract_kwargs: dict, prefilter: Optional[RelationPreFilter] = None,
+                      prefilter_audit: bool = False):
+    """
+    处理单个txt文件，供顺序模式和线程池模式共用
+
+    Args:
+        txt_file: txt文件路径
+        extract_kwargs: 透传给 extract_tcm_knowledge_chunked 的参数（分块设置及 verbose / rate_limiter / max_retries / cache）
+        prefilter: 可选的本地预过滤器，预测没有关系的文本直接记为空结果，不调用大模型
+        prefilter_audit: 审计模式，预测为空的文本仍调用大模型，用于统计预过滤的漏判
+
+    Returns:
+        处理记录字典，见 _prepare_record
+    """
+    start_time = time.perf_counter()
+    record = _prepare_record(txt_file, prefilter, prefilter_audit)
+    if _needs_extraction(record):
+        _extract_record(record, extract_kwargs)
+    record["latency"] = time.perf_counter() - start_time
+    return record
+
+
+def _extract_file_group(txt_files: List[Path], extract_kwargs: dict, prefilter: Optional[RelationPreFilter] = None,
+                        prefilter_audit: bool = False) -> List[dict]:
+    """
+    处理一组文件：只有一个文件时同 _extract_one_file；多个短文件时先查缓存，
+    未命中的打包成一次请求抽取，按文件名拆回各自的记录。
+    打包输出整体解析失败或缺少某个文件时，对应文件退回单篇抽取。
+
+    Returns:
+        每个文件的处理记录列表
+    """
+    if len(txt_files) == 1:
+        return [_extract_one_file(txt_files[0], extract_kwargs, prefilter, prefilter_audit)]
+
+    start_time = time.perf_counter()
+    records = [_prepare_record(txt_file, prefilter, prefilter_audit) for txt_file in txt_files]
+    cache = extract_kwargs.get("cache")
+
+    pending = []
+    for record in records:
+        if not _needs_extraction(record):
+            continue
+        # 单篇抽取的结果可以直接用于打包的文件，反之不行
+        cached_result = None
+        if cache is not None:
+            cached_result = cache.get(get_extraction_cache_key(record["text"]))
+            if cached_result is None:
+                cached_result = cache.get(get_extraction_cache_key(record["text"], packed=True))
+        if cached_result is not None:
+            record["result"] = cached_result
+            record["usage"]["cache_hits"] = 1
+        else:
+            pending.append(record)
+
+    packed_results = {}
+    if len(pending) > 1:
+        try:
+            # 打包请求的 token 用量记在组内第一条记录上
+            packed_results = extract_tcm_knowledge_packed(
+                {record["filename"]: record["text"] for record in pending},
+                verbose=extract_kwargs.get("verbose", False), rate_limiter=extract_kwargs.get("rate_limiter"),
+                max_retries=extract_kwargs.get("max_retries", 0), usage=pending[0]["usage"])
+        except Exception as e:
+            tqdm.write(f"  ✗ 打包抽取失败，退回逐篇抽取: {e}")
+
+    for record in pending:
+        if record["filename"] in packed_results:
+            record["result"] = packed_results[record["filename"]]
+            if cache is not None:
+                cache.put(get_extraction_cache_key(record["text"], packed=True), record["result"])
+        else:
+            _extract_record(record, extract_kwargs)
+
+    latency = time.perf_counter() - start_time
+    for record in records:
+        record["latency"] = latency
+    return records
+
+
+def group_files_for_packing(txt_files: List[Path], pack_max_tokens: Optional[int] = None,
+                            pack_short_file_tokens: int = 400, pack_max_files: int = 10) -> List[List[Path]]:
+    """
+    把短文件按 token 预算分组，用于多文档打包抽取
+
+    按文件字节数估算 token（UTF-8 中文每字 3 字节，约 1 个 token），
+    不超过 pack_short_file_tokens 的文件参与打包，其余文件各自单独成组。
+
+    Args:
+        txt_files: txt文件列表
+        pack_max_tokens: 每组文档正文的 token 上限，None 表示不打包
+        pack_short_file_tokens: 可参与打包的单个文件 token 上限
+        pack_max_files: 每组最多文件数
+
+    Returns:
+        文件分组列表
+    """
+    if not pack_max_tokens:
+        return [[txt_file] for txt_file in txt_files]
+
+    groups = []
+    current_group = []
+    current_tokens = 0
+    for txt_file in txt_files:
+        file_tokens = os.path.getsize(txt_file) // 3
+        if file_tokens > pack_short_file_tokens:
+            groups.append([txt_file])
+            continue
+        if current_group and (current_tokens + file_tokens > pack_max_tokens or len(current_group) >= pack_max_files):
+            groups.append(current_group)
+            current_group = []
+            current_tokens = 0
+        current_group.append(txt_file)
+        current_tokens += file_tokens
+    if current_group:
+        groups.append(current_group)
+    return groups
+
+
+def _iter_extract_records(file_groups: List[List[Path]], max_workers: int, extract_kwargs: dict,
+                          prefilter: Optional[RelationPreFilter] = None, prefilter_audit: bool = False):
+    """
+    依次产出每个文件的处理记录
+
+    max_workers <= 1 时按顺序逐组处理；否则用线程池并发调用大模型，按完成顺序产出。
+    落盘等有状态的操作都在调用方（主线程）完成，工作线程只负责读文件和调用模型。
+    """
+    if max_workers <= 1:
+        for file_group in file_groups:
+            yield from _extract_file_group(file_group, extract_kwargs, prefilter, prefilter_audit)
+        return
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_extract_file_group, file_group, extract_kwargs, prefilter, prefilter_audit)
+                   for file_group in file_groups]
+        for future in as_completed(futures):
+            yield from future.result()
+
+
 def batch_extract_from_txt_files(input_dir: str, output_json_path: str, verbose: bool = False, 
                                    resume: bool = True, export_finetune_data: bool = False, 
-                                   finetune_output_path: str = None):
+                                   finetune_output_path: str = None, max_workers: int = 1,
+                                   requests_per_minute: Optional[float] = None,
+                                   tokens_per_minute: Optional[float] = None, max_retries: int = 3,
+                                   cache_path: Optional[str] = DEFAULT_EXTRACTION_CACHE_PATH,
+                                   cache_max_mb: int = 512, max_chunk_tokens: Optional[int] = None,
+                                   chunk_overlap_tokens: int = 100, chunk_workers: int = 4,
+                                   use_prefilter: bool = False, prefilter_names_path: Optional[str] = None,
+                                   prefilter_audit: bool = False, pack_max_tokens: Optional[int] = None,
+                                   pack_short_file_tokens: int = 400, pack_max_files: int = 10):
     """
     批量处理目录下的所有txt文件，提取知识图谱数据并保存到json文件
-    每处理完一个文件立即保存，支持断点续传
+    每处理完一个文件立即追加到JSONL检查点日志，支持断点续传，运行结束时压缩成json文件
     
     Args:
         input_dir: 输入目录路径（包含txt文件的目录）
@@ -217,6 +741,24 @@ def batch_extract_from_txt_files(input_dir: str, output_json_path: str, verbose:
         resume: 是否启用断点续传，True表示跳过已处理的文件，False表示重新处理所有文件
         export_finetune_data: 是否导出微调语料（Alpaca格式），默认False
         finetune_output_path: 微调语料输出文件路径，如果为None且export_finetune_data=True，则自动生成
+        max_workers: 并发调用大模型的线程数，默认1即逐个顺序处理
+        requests_per_minute: 每分钟最大请求数限制，None表示不限制
+        tokens_per_minute: 每分钟最大token数限制（输入+输出），None表示不限制
+        max_retries: 遇到 429 / 5xx 等错误时的最大重试次数，默认3
+        cache_path: 抽取结果缓存文件路径，按文本、提示词模板和模型名称命中，None表示不使用缓存
+        cache_max_mb: 缓存大小上限（MB），超出后按LRU淘汰
+        max_chunk_tokens: 长文档分块抽取的每块token上限，None表示整篇一次抽取
+        chunk_overlap_tokens: 分块时相邻块的重叠token数
+        chunk_workers: 同一文档内并发抽取的最大块数
+        use_prefilter: 是否启用本地预过滤，预测没有实体关系的文本直接记为空结果，不调用大模型
+        prefilter_names_path: 预过滤使用的已知实体名称文件，None表示使用 conf.ENTITY_ID2TEXT_PATH
+        prefilter_audit: 预过滤审计模式，预测为空的文本仍调用大模型，统计预过滤的漏判率
+        pack_max_tokens: 多文档打包抽取时每个请求的正文token上限，None表示每个文件单独请求
+        pack_short_file_tokens: 可参与打包的短文件token上限，更长的文件单独请求
+        pack_max_files: 每个打包请求最多包含的文件数
+
+    Returns:
+        本次运行的统计信息字典（成功/失败数、耗时、吞吐等），没有待处理文件时返回None
     """
     # 获取所有txt文件
     txt_files = list(Path(input_dir).glob("*.txt"))
@@ -229,73 +771,136 @@ def batch_extract_from_txt_files(input_dir: str, output_json_path: str, verbose:
 
     # 加载已存在的结果（断点续传）
     processed_files = set()
-    output_list = []
-    finetune_data_list = []
-    
+    output_count = 0
+    finetune_count = 0
+    checkpoint_path = get_checkpoint_path(output_json_path)
+
+    if export_finetune_data and finetune_output_path is None:
+        # 自动生成微调数据文件路径
+        base_path = os.path.splitext(output_json_path)[0]
+        finetune_output_path = f"{base_path}_finetune.json"
+    finetune_checkpoint_path = get_checkpoint_path(finetune_output_path) if export_finetune_data else None
+
     if resume:
-        processed_files, output_list = load_existing_results(output_json_path)
+        processed_files, output_count = load_existing_results(output_json_path)
         # 过滤掉已处理的文件
         txt_files = [f for f in txt_files if f.name not in processed_files]
         if len(processed_files) > 0:
             print(f"跳过已处理的 {len(processed_files)} 个文件，剩余 {len(txt_files)} 个文件待处理")
+    else:
+        # 不续跑时清空旧的检查点日志，重新开始
+        for path in (checkpoint_path, finetune_checkpoint_path):
+            if path and os.path.exists(path):
+                os.remove(path)
     
     # 如果启用微调数据导出，加载已存在的微调数据
     if export_finetune_data:
-        if finetune_output_path is None:
-            # 自动生成微调数据文件路径
-            base_path = os.path.splitext(output_json_path)[0]
-            finetune_output_path = f"{base_path}_finetune.json"
-        
-        if os.path.exists(finetune_output_path) and resume:
-            try:
-                with open(finetune_output_path, 'r', encoding='utf-8') as f:
-                    finetune_data_list = json.load(f)
-                print(f"加载已存在的微调数据 {len(finetune_data_list)} 条")
-            except Exception as e:
-                print(f"读取已存在的微调数据失败: {e}，将重新开始")
-                finetune_data_list = []
+        if resume:
+            finetune_count = load_existing_finetune_data(finetune_output_path)
+            if finetune_count > 0:
+                print(f"加载已存在的微调数据 {finetune_count} 条")
         
         print(f"微调语料将保存到: {finetune_output_path}")
 
     if not txt_files:
+        # 上次运行可能在压缩前中断，这里补做一次
+        finalize_extraction_results(output_json_path, finetune_output_path)
         print("所有文件已处理完成！")
         return
 
-    print(f"开始批量提取知识图谱数据...")
+    print(f"开始批量提取知识图谱数据...（并发线程数: {max_workers}）")
+    print(f"检查点日志: {checkpoint_path}")
 
     success_count = 0
     fail_count = 0
+    input_tokens = 0
+    output_tokens = 0
+    cache_hits = 0
+    rate_limiter = None
+    if requests_per_minute or tokens_per_minute:
+        rate_limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+    extract_kwargs = {
+        "verbose": verbose,
+        "rate_limiter": rate_limiter,
+        "max_retries": max_retries,
+        "cache": get_extraction_cache(cache_path, cache_max_mb * 1024 * 1024),
+        "max_chunk_tokens": max_chunk_tokens,
+        "chunk_overlap_tokens": chunk_overlap_tokens,
+        "chunk_workers": chunk_workers,
+    }
+    prefilter = None
+    if use_prefilter:
+        prefilter = RelationPreFilter.from_id2text(prefilter_names_path or conf.ENTITY_ID2TEXT_PATH)
+    prefiltered_count = 0
+    skipped_count = 0
+    # 审计模式下统计：大模型实际抽出关系的文件数，以及其中被预过滤判为空的文件数（漏判）
+    positive_count = 0
+    false_negative_count = 0
+    llm_calls = 0
+    latencies = []
+    file_groups = group_files_for_packing(txt_files, pack_max_tokens, pack_short_file_tokens, pack_max_files)
+    if pack_max_tokens:
+        print(f"多文档打包: {len(txt_files)} 个文件分为 {len(file_groups)} 组")
     
     # Alpaca格式的固定instruction
     ALPACA_INSTRUCTION = "请从以下中医文档中抽取知识图谱结构，包括实体和关系。"
 
     # 使用tqdm显示进度
-    pbar = tqdm(txt_files, desc="处理进度", unit="个")
-
-    for txt_file in pbar:
-        try:
-            # 读取文件内容
-            with open(txt_file, 'r', encoding='utf-8') as f:
-                text_content = f.read()
+    pbar = tqdm(total=len(txt_files), desc="处理进度", unit="个")
+    start_time = time.perf_counter()
 
+    try:
+        for record in _iter_extract_records(file_groups, max_workers, extract_kwargs, prefilter, prefilter_audit):
+            filename = record["filename"]
+            pbar.update(1)
             # 更新进度条描述
-            filename = txt_file.name
-            pbar.set_description(f"正在处理: {filename[:20]}")
+            pbar.set_description(f"已完成: {filename[:20]}")
+            input_tokens += record["usage"].get("input_tokens", 0)
+            output_tokens += record["usage"].get("output_tokens", 0)
+            cache_hits += record["usage"].get("cache_hits", 0)
+            llm_calls += record["usage"].get("llm_calls", 0)
+            latencies.append(record["latency"])
+            prefiltered_count += record["prefiltered"]
+            skipped_count += record["skipped"]
+
+            if record["error"] is not None:
+                fail_count += 1
+                tqdm.write(f"  ✗ 处理失败: {filename} - {record['error']}")
+                # 即使失败也记录错误信息，追加到检查点日志
+                output_item = {
+                    "filename": filename,
+                    "result": None,
+                    "error": record["error"]
+                }
+                append_jsonl_records(checkpoint_path, [output_item])
+                output_count += 1
+                continue
 
-            # 提取知识图谱数据
-            result_dict = extract_tcm_knowledge(text_content, verbose=verbose)
+            result_dict = record["result"]
+            text_content = record["text"]
             output_item = {
                 "filename": filename,
                 "result": result_dict
             }
-            output_list.append(output_item)
             success_count += 1
-
-            # 每处理完一个文件立即保存
-            save_result_to_json(output_json_path, output_list)
-            
-            # 如果启用微调数据导出，同时保存Alpaca格式数据
-            if export_finetune_data:
+            if record["usage"].get("failed_chunks"):
+                # 部分块解析失败，结果不完整
+                output_item["failed_chunks"] = record["usage"]["failed_chunks"]
+                tqdm.write(f"  ! {filename} 有 {output_item['failed_chunks']} 块解析失败，结果不完整")
+            if record["skipped"]:
+                output_item["skipped_by_prefilter"] = True
+            elif prefilter is not None and result_dict.get("relations"):
+                positive_count += 1
+                if record["prefiltered"]:
+                    false_negative_count += 1
+                    tqdm.write(f"  ! 预过滤漏判: {filename}")
+
+            # 每处理完一个文件立即追加到检查点日志
+            append_jsonl_records(checkpoint_path, [output_item])
+            output_count += 1
+
+            # 如果启用微调数据导出，同时保存Alpaca格式数据（预过滤跳过的文件没有经过大模型，不作为语料）
+            if export_finetune_data and not record["skipped"]:
                 # 处理Pydantic模型的序列化（兼容v1和v2）
                 if hasattr(result_dict, 'model_dump'):
                     result_dict_for_json = result_dict.model_dump()
@@ -303,34 +908,30 @@ def batch_extract_from_txt_files(input_dir: str, output_json_path: str, verbose:
                     result_dict_for_json = result_dict.dict()
                 else:
                     result_dict_for_json = result_dict
-                
+
                 # 将result_dict转换为JSON字符串作为output
                 output_json_str = json.dumps(result_dict_for_json, ensure_ascii=False, indent=2)
-                
+
                 alpaca_item = {
                     "instruction": ALPACA_INSTRUCTION,
                     "input": text_content,
                     "output": output_json_str
                 }
-                finetune_data_list.append(alpaca_item)
-                
-                # 立即保存微调数据
-                save_finetune_data_to_json(finetune_output_path, finetune_data_list)
-
-        except Exception as e:
-            fail_count += 1
-            tqdm.write(f"  ✗ 处理失败: {txt_file.name} - {str(e)}")
-            # 即使失败也记录错误信息
-            output_item = {
-                "filename": txt_file.name,
-                "result": None,
-                "error": str(e)
-            }
-            output_list.append(output_item)
-            # 保存失败记录
-            save_result_to_json(output_json_path, output_list)
-
-    pbar.close()
+                # 立即追加微调数据，日志中额外记录文件名，压缩时去掉
+                append_jsonl_records(finetune_checkpoint_path, [{"filename": filename, **alpaca_item}])
+                finetune_count += 1
+    finally:
+        pbar.close()
+        # 无论正常结束还是中断，都把日志压缩成原有的json格式
+        output_count = finalize_extraction_results(output_json_path, finetune_output_path)
+
+    elapsed = time.perf_counter() - start_time
+    processed_count = success_count + fail_count
+    files_per_minute = processed_count / elapsed * 60 if elapsed > 0 else 0.0
+    tokens_per_second = (input_tokens + output_tokens) / elapsed if elapsed > 0 else 0.0
+    latencies.sort()
+    latency_p50 = latencies[int(0.50 * (len(latencies) - 1))] if latencies else 0.0
+    latency_p95 = latencies[int(0.95 * (len(latencies) - 1))] if latencies else 0.0
 
     print("\n" + "=" * 50)
     print("批量提取完成！")
@@ -339,12 +940,40 @@ def batch_extract_from_txt_files(input_dir: str, output_json_path: str, verbose:
     print(f"本次处理: {len(txt_files)} 个")
     if resume and len(processed_files) > 0:
         print(f"之前已处理: {len(processed_files)} 个")
-    print(f"总计结果: {len(output_list)} 个")
+    print(f"总计结果: {output_count} 个")
     print(f"结果已保存到: {output_json_path}")
     if export_finetune_data:
-        print(f"微调语料已保存到: {finetune_output_path} (共 {len(finetune_data_list)} 条)")
+        print(f"微调语料已保存到: {finetune_output_path} (共 {finetune_count} 条)")
+    print(f"耗时: {elapsed:.1f}s，吞吐: {files_per_minute:.1f} 个文件/分钟，"
+          f"{tokens_per_second:.1f} tokens/s（输入 {input_tokens}，输出 {output_tokens}）")
+    print(f"大模型调用: {llm_calls} 次，单文件耗时 p50 {latency_p50:.2f}s / p95 {latency_p95:.2f}s")
+    if extract_kwargs["cache"] is not None:
+        print(f"缓存命中: {cache_hits} 次（跳过了 {cache_hits} 次大模型调用）")
+    if prefilter is not None:
+        print(f"预过滤判定为空: {prefiltered_count} 个，节省大模型调用: {skipped_count} 次")
+        if prefilter_audit:
+            false_negative_rate = false_negative_count / positive_count if positive_count else 0.0
+            print(f"预过滤审计: 有关系的文件 {positive_count} 个，其中被判为空 {false_negative_count} 个，"
+                  f"漏判率 {false_negative_rate:.2%}")
     print("=" * 50)
 
+    return {
+        "success_count": success_count,
+        "fail_count": fail_count,
+        "elapsed_seconds": elapsed,
+        "files_per_minute": files_per_minute,
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "tokens_per_second": tokens_per_second,
+        "latency_p50": latency_p50,
+        "latency_p95": latency_p95,
+        "llm_calls": llm_calls,
+        "cache_hits": cache_hits,
+        "prefiltered_count": prefiltered_count,
+        "prefilter_skipped_count": skipped_count,
+        "prefilter_false_negative_count": false_negative_count,
+    }
+
 
 if __name__ == '__main__':
     ...
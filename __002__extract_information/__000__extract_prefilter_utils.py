@@ -0,0 +1,98 @@
+import os
+from typing import Iterable, Optional, Set
+
+from common.string_table import load_id2text, resolve_id2text_path
+
+# 六种关系类型在原文中的常见提示词，命中任意一个即认为文本可能包含关系
+# 只收录明确指向某类关系的词；“治”“《”“作用”这类几乎每篇都会出现的字词会让预过滤形同虚设，不收录
+RELATION_KEYWORDS = {
+    "TREATS_DISEASE": ["主治", "治疗", "适应症", "用于治"],
+    "ALLEVIATES_SYMPTOM": ["缓解", "症见", "止咳", "止痛", "止血", "止泻", "止呕"],
+    "HAS_EFFECT": ["功效", "功用", "功能"],
+    "HAS_INGREDIENT": ["组成", "配方", "处方", "药物组成"],
+    "HAS_SYMPTOM": ["症状", "临床表现", "表现为"],
+    "FROM_SOURCE": ["出处", "出自", "来源于"],
+}
+
+
+def load_known_entity_names(id2text_path: str, min_length: int = 2) -> Set[str]:
+    """
+    从向量索引的 id->文本 映射文件中读取图谱里已有的实体名称
+
+    Args:
+        id2text_path: 向量索引的 id->文本 映射文件路径（字符串表或旧的 .pkl）
+        min_length: 参与匹配的最短名称长度，单字名称误匹配太多，默认忽略
+
+    Returns:
+        实体名称集合
+    """
+    id2text = load_id2text(id2text_path)
+    return {name for name in id2text.values() if isinstance(name, str) and len(name) >= min_length}
+
+
+class RelationPreFilter:
+    """
+    本地预过滤：在调用大模型前判断文本是否可能包含实体间关系
+
+    判断依据有两条，满足任意一条即认为"可能有关系"，需要调用大模型：
+    1. 命中六种关系类型的提示词（见 RELATION_KEYWORDS）
+    2. 文本中出现了至少 min_entity_mentions 个不同的已知实体名称
+
+    两条都不满足的文本被预测为空结果，可直接记录为空结构而不调用大模型。
+    规则偏保守，宁可多调用也尽量不漏掉有关系的文本。
+
+    Args:
+        known_names: 已知实体名称集合，None 表示只用关键词规则
+        min_entity_mentions: 判定为"可能有关系"所需的最少不同实体数
+        max_name_length: 匹配实体名称时考虑的最大长度
+    """
+
+    def __init__(self, known_names: Optional[Iterable[str]] = None, min_entity_mentions: int = 2,
+                 max_name_length: int = 20):
+        self.known_names = set(known_names or [])
+        self.min_entity_mentions = min_entity_mentions
+        self.name_lengths = sorted({len(name) for name in self.known_names if len(name) <= max_name_length},
+                                   reverse=True)
+        self.keywords = [keyword for keywords in RELATION_KEYWORDS.values() for keyword in keywords]
+
+    @classmethod
+    def from_id2text(cls, id2text_path: Optional[str], **kwargs) -> "RelationPreFilter":
+        """从 id->文本 映射文件构建预过滤器，文件不存在时只用关键词规则"""
+        known_names = None
+        if id2text_path:
+            id2text_path = resolve_id2text_path(id2text_path)
+        if id2text_path and os.path.exists(id2text_path):
+            known_names = load_known_entity_names(id2text_path)
+            print(f"预过滤器加载已知实体名称 {len(known_names)} 个")
+        else:
+            print(f"未找到实体名称文件 {id2text_path}，预过滤器只使用关键词规则")
+        return cls(known_names, **kwargs)
+
+    def find_entity_mentions(self, text: str, limit: Optional[int] = None) -> Set[str]:
+        """找出文本中出现的已知实体名称，找到 limit 个后提前返回"""
+        found = set()
+        for start in range(len(text)):
+            for length in self.name_lengths:
+                candidate = text[start:start + length]
+                if len(candidate) == length and candidate in self.known_names:
+                    found.add(candidate)
+                    if limit is not None and len(found) >= limit:
+                        return found
+        return found
+
+    def may_have_relations(self, text: str) -> bool:
+        """预测文本是否可能包含实体间关系；返回 False 表示可以跳过大模型调用"""
+        if any(keyword in text for keyword in self.keywords):
+            return True
+        if self.known_names:
+            mentions = self.find_entity_mentions(text, limit=self.min_entity_mentions)
+            return len(mentions) >= self.min_entity_mentions
+        return False
+
+
+if __name__ == '__main__':
+    from common.config import Config
+
+    prefilter = RelationPreFilter.from_id2text(Config().ENTITY_ID2TEXT_PATH)
+    print(prefilter.may_have_relations("【中药名称】人中黄\n- 中医百科\n- 人中黄"))
+    print(prefilter.may_have_relations("【方剂名称】四君子汤\n组成\n人参、白术、茯苓、甘草"))
@@ -0,0 +1,195 @@
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 默认返回的抽取结果，结构与 TCMKnowledgeGraph 一致
+DEFAULT_CANNED_RESULT = {
+    "entities": [
+        {"name": "四君子汤", "type": "Formula", "attributes": {"effect": "益气健脾", "usage": "水煎服"}},
+        {"name": "人参", "type": "Herb"},
+        {"name": "白术", "type": "Herb"},
+        {"name": "茯苓", "type": "Herb"},
+        {"name": "甘草", "type": "Herb"},
+        {"name": "脾胃气虚", "type": "Disease"},
+        {"name": "益气健脾", "type": "Effect"},
+        {"name": "《太平惠民和剂局方》", "type": "Source"}
+    ],
+    "relations": [
+        {"subject": "四君子汤", "subject_type": "Formula", "relation": "HAS_INGREDIENT",
+         "object": "人参", "object_type": "Herb"},
+        {"subject": "四君子汤", "subject_type": "Formula", "relation": "HAS_INGREDIENT",
+         "object": "白术", "object_type": "Herb"},
+        {"subject": "四君子汤", "subject_type": "Formula", "relation": "HAS_INGREDIENT",
+         "object": "茯苓", "object_type": "Herb"},
+        {"subject": "四君子汤", "subject_type": "Formula", "relation": "HAS_INGREDIENT",
+         "object": "甘草", "object_type": "Herb"},
+        {"subject": "四君子汤", "subject_type": "Formula", "relation": "TREATS_DISEASE",
+         "object": "脾胃气虚", "object_type": "Disease"},
+        {"subject": "四君子汤", "subject_type": "Formula", "relation": "HAS_EFFECT",
+         "object": "益气健脾", "object_type": "Effect"},
+        {"subject": "四君子汤", "subject_type": "Formula", "relation": "FROM_SOURCE",
+         "object": "《太平惠民和剂局方》", "object_type": "Source"}
+    ]
+}
+
+# 打包抽取提示词中的文档分隔标记，见 get_packed_prompt
+PACKED_DOCUMENT_PATTERN = re.compile(r"【文档：(.+?)】")
+
+
+class StubOpenAIServer:
+    """
+    本地的 OpenAI 兼容桩服务，只实现 /chat/completions（含 /v1 前缀），用于离线压测抽取流程
+
+    每个请求返回固定的 TCMKnowledgeGraph JSON；打包抽取的请求会按提示词中的文件名返回
+    {文件名: 抽取结果}。支持流式和非流式两种返回方式。
+
+    Args:
+        first_token_latency: 首个 token 之前的等待秒数
+        tokens_per_second: 流式输出速度，按约 4 个字符一个 token 计算，None 表示不限速
+        error_rate: 请求直接返回错误的概率，用于验证重试逻辑
+        error_status_codes: 注入错误时随机选用的 HTTP 状态码
+        canned_result: 每篇文档返回的抽取结果
+        host: 监听地址
+        port: 监听端口，0 表示随机选择空闲端口
+    """
+
+    def __init__(self, first_token_latency: float = 0.2, tokens_per_second=200.0, error_rate: float = 0.0,
+                 error_status_codes=(429, 500, 503), canned_result=None, host: str = "127.0.0.1", port: int = 0):
+        self.first_token_latency = first_token_latency
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.error_status_codes = list(error_status_codes)
+        self.canned_result = canned_result or DEFAULT_CANNED_RESULT
+        self.request_count = 0
+        self.error_count = 0
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> str:
+        """在后台线程中启动服务，返回可直接用作 MODEL_BASE_URL 的地址"""
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self.base_url
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def build_content(self, messages) -> str:
+        """根据请求的提示词生成回复内容"""
+        prompt = "".join(
+            message.get("content", "") if isinstance(message.get("content"), str) else ""
+            for message in messages
+        )
+        filenames = PACKED_DOCUMENT_PATTERN.findall(prompt)
+        if filenames:
+            return json.dumps({filename: self.canned_result for filename in filenames}, ensure_ascii=False)
+        return json.dumps(self.canned_result, ensure_ascii=False)
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                # 压测时不打印访问日志
+                pass
+
+            def _send_json(self, status_code, payload, headers=None):
+                body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status_code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_sse(self, payload):
+                data = payload if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False)
+                chunk = f"data: {data}\n\n".encode("utf-8")
+                self.wfile.write(f"{len(chunk):x}\r\n".encode("ascii") + chunk + b"\r\n")
+                self.wfile.flush()
+
+            def do_POST(self):
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+                    return
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+
+                with server.lock:
+                    server.request_count += 1
+                    inject_error = random.random() < server.error_rate
+                    if inject_error:
+                        server.error_count += 1
+                if inject_error:
+                    status_code = random.choice(server.error_status_codes)
+                    self._send_json(status_code, {"error": {"message": "injected error", "type": "stub_error"}},
+                                    headers={"retry-after": "0"})
+                    return
+
+                content = server.build_content(request.get("messages", []))
+                completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+                created = int(time.time())
+                model = request.get("model", "stub-model")
+                time.sleep(server.first_token_latency)
+
+                if not request.get("stream"):
+                    if server.tokens_per_second:
+                        time.sleep(len(content) / 4 / server.tokens_per_second)
+                    self._send_json(200, {
+                        "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                                     "finish_reason": "stop"}],
+                        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+                    })
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                def chunk_payload(delta, finish_reason=None):
+                    return {"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                            "model": model,
+                            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+
+                self._send_sse(chunk_payload({"role": "assistant", "content": ""}))
+                # 每次发送约 8 个 token（32 个字符），按配置的速度等待
+                piece_size = 32
+                for start in range(0, len(content), piece_size):
+                    piece = content[start:start + piece_size]
+                    if server.tokens_per_second:
+                        time.sleep(len(piece) / 4 / server.tokens_per_second)
+                    self._send_sse(chunk_payload({"content": piece}))
+                self._send_sse(chunk_payload({}, finish_reason="stop"))
+                self._send_sse("[DONE]")
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+if __name__ == '__main__':
+    stub_server = StubOpenAIServer()
+    print(f"桩服务已启动: {stub_server.start()}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stub_server.stop()
@@ -7,5 +7,14 @@ batch_extract_from_txt_files(
     verbose=False,  # 批量处理时建议设为False，避免输出过多
     resume=True,  # 启用断点续跑，跳过已处理的文件
     export_finetune_data=True,  # 导出微调语料（Alpaca格式）
-    finetune_output_path=get_file_path("__002__extract_information/formula_knowledge_graph_finetune.json")  # 微调语料输出路径
+    finetune_output_path=get_file_path("__002__extract_information/formula_knowledge_graph_finetune.json"),  # 微调语料输出路径
+    max_workers=4,  # 并发调用大模型的线程数，设为1则逐个顺序处理
+    requests_per_minute=60,  # 每分钟最大请求数，None表示不限制
+    tokens_per_minute=None,  # 每分钟最大token数，None表示不限制
+    max_retries=3,  # 遇到429/5xx错误时的重试次数
+    cache_path=get_file_path("__002__extract_information/extraction_cache.sqlite"),  # 与方剂/中药抽取共用的结果缓存
+    max_chunk_tokens=1500,  # 长方剂页面按【...】段落分块并发抽取，None表示整篇一次抽取
+    chunk_overlap_tokens=100,  # 段落内切分时相邻块的重叠token数
+    use_prefilter=False,  # 本地预过滤，预测没有实体关系的文本不调用大模型；先用 prefilter_audit 确认漏判率再开启
+    prefilter_audit=False  # 设为True时仍调用大模型，统计预过滤的漏判率
 )
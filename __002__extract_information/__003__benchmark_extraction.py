@@ -0,0 +1,135 @@
+"""
+抽取流程的离线压测：启动本地 OpenAI 兼容桩服务，在合成语料上运行 batch_extract_from_txt_files，
+报告吞吐（文件/秒）、单文件耗时 p50/p95、写盘字节数以及断点续跑的额外开销。
+
+不消耗真实接口额度，抽取相关的性能改动都应在这里对比前后结果。
+"""
+import os
+import random
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from __002__extract_information.__000__stub_llm_server import StubOpenAIServer
+
+# 桩服务参数：首 token 延迟、输出速度和错误注入比例
+STUB_FIRST_TOKEN_LATENCY = 0.3
+STUB_TOKENS_PER_SECOND = 300.0
+STUB_ERROR_RATE = 0.05
+
+# 合成语料规模
+SHORT_FILE_COUNT = 80
+LONG_FILE_COUNT = 20
+
+# 每个场景透传给 batch_extract_from_txt_files 的参数
+BENCHMARK_SCENARIOS = [
+    {"name": "顺序逐个", "max_workers": 1},
+    {"name": "8线程并发", "max_workers": 8},
+    {"name": "8线程+打包", "max_workers": 8, "pack_max_tokens": 2000},
+    {"name": "8线程+分块", "max_workers": 8, "max_chunk_tokens": 600},
+]
+
+HERB_NAMES = ["人参", "黄芪", "白术", "茯苓", "甘草", "当归", "川芎", "熟地黄", "白芍", "柴胡", "半夏", "陈皮"]
+SECTION_NAMES = ["用量用法", "现代研究", "临床应用", "方解", "注意事项", "各家论述"]
+
+
+def generate_synthetic_corpus(corpus_dir: str, short_count: int = SHORT_FILE_COUNT,
+                              long_count: int = LONG_FILE_COUNT, seed: int = 42):
+    """
+    生成合成语料：短文件模拟药材页面，长文件模拟带多个【...】段落的方剂页面
+    """
+    rng = random.Random(seed)
+    os.makedirs(corpus_dir, exist_ok=True)
+    for i in range(short_count):
+        herb = rng.choice(HERB_NAMES)
+        text = (f"【中药名称】{herb}{i}\n- 中医百科\n- {herb}{i}\n"
+                f"性味\n味甘、微苦，性平。\n功效\n大补元气，补脾益肺。\n主治\n脾虚食少，肺虚喘咳。\n")
+        Path(corpus_dir, f"herb_{i:04d}.txt").write_text(text, encoding="utf-8")
+    for i in range(long_count):
+        herbs = rng.sample(HERB_NAMES, 6)
+        sections = "".join(
+            f"【{section}】\n" + "".join(rng.choice(herbs) + "补气健脾，" for _ in range(rng.randint(80, 200))) + "\n"
+            for section in SECTION_NAMES
+        )
+        text = (f"【方剂名称】合成方{i}\n- 中医百科\n出处\n《太平惠民和剂局方》\n组成\n"
+                f"{'、'.join(herbs)}各9克。\n{sections}")
+        Path(corpus_dir, f"formula_{i:04d}.txt").write_text(text, encoding="utf-8")
+
+
+def directory_bytes(directory: str) -> int:
+    return sum(path.stat().st_size for path in Path(directory).iterdir() if path.is_file())
+
+
+def run_scenario(batch_extract, corpus_dir: str, work_dir: str, scenario: dict) -> dict:
+    """运行一个场景：先冷启动全量抽取，再在已完成的结果上测一次断点续跑的耗时"""
+    output_dir = os.path.join(work_dir, scenario["name"])
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.makedirs(output_dir)
+    output_json_path = os.path.join(output_dir, "result.json")
+    kwargs = {key: value for key, value in scenario.items() if key != "name"}
+
+    stats = batch_extract(corpus_dir, output_json_path, resume=False, export_finetune_data=True,
+                          cache_path=None, **kwargs)
+    bytes_written = directory_bytes(output_dir)
+
+    resume_start = time.perf_counter()
+    batch_extract(corpus_dir, output_json_path, resume=True, export_finetune_data=True, cache_path=None, **kwargs)
+    resume_seconds = time.perf_counter() - resume_start
+
+    processed_count = stats["success_count"] + stats["fail_count"]
+    return {
+        "name": scenario["name"],
+        "files_per_second": processed_count / stats["elapsed_seconds"] if stats["elapsed_seconds"] else 0.0,
+        "latency_p50": stats["latency_p50"],
+        "latency_p95": stats["latency_p95"],
+        "llm_calls": stats["llm_calls"],
+        "fail_count": stats["fail_count"],
+        "bytes_written": bytes_written,
+        "resume_seconds": resume_seconds,
+    }
+
+
+def run_benchmark(scenarios=None, short_count: int = SHORT_FILE_COUNT, long_count: int = LONG_FILE_COUNT):
+    """
+    启动桩服务并依次运行各场景，最后打印对比表
+
+    Returns:
+        每个场景的结果列表
+    """
+    stub_server = StubOpenAIServer(first_token_latency=STUB_FIRST_TOKEN_LATENCY,
+                                   tokens_per_second=STUB_TOKENS_PER_SECOND, error_rate=STUB_ERROR_RATE)
+    base_url = stub_server.start()
+    # common.config 使用 load_dotenv 且不覆盖已有环境变量，需在导入抽取模块之前设置
+    os.environ["MODEL_BASE_URL"] = base_url
+    os.environ["MODEL_API_KEY"] = "stub-key"
+    os.environ["MODEL_NAME"] = "stub-model"
+    from __002__extract_information.__000__extract_graph_data_utils import batch_extract_from_txt_files
+
+    work_dir = tempfile.mkdtemp(prefix="extract_benchmark_")
+    corpus_dir = os.path.join(work_dir, "corpus")
+    generate_synthetic_corpus(corpus_dir, short_count, long_count)
+    print(f"桩服务: {base_url}，合成语料: {corpus_dir}（{short_count} 短 + {long_count} 长）")
+
+    results = []
+    try:
+        for scenario in scenarios or BENCHMARK_SCENARIOS:
+            results.append(run_scenario(batch_extract_from_txt_files, corpus_dir, work_dir, scenario))
+    finally:
+        stub_server.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print("\n" + "=" * 100)
+    print(f"{'场景':<12}{'文件/秒':>10}{'p50(s)':>10}{'p95(s)':>10}{'调用次数':>10}{'失败':>8}"
+          f"{'写盘字节':>14}{'续跑耗时(s)':>14}")
+    for result in results:
+        print(f"{result['name']:<12}{result['files_per_second']:>10.2f}{result['latency_p50']:>10.2f}"
+              f"{result['latency_p95']:>10.2f}{result['llm_calls']:>10}{result['fail_count']:>8}"
+              f"{result['bytes_written']:>14}{result['resume_seconds']:>14.3f}")
+    print(f"桩服务共收到 {stub_server.request_count} 个请求，其中注入错误 {stub_server.error_count} 个")
+    print("=" * 100)
+    return results
+
+
+if __name__ == '__main__':
+    run_benchmark()
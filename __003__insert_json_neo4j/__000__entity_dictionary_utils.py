@@ -0,0 +1,25 @@
+import json
+
+from common.config import Config
+from common.entity_matcher import build_dictionary_entries, save_entity_dictionary
+from common.neo4j_manager import neo4j_client
+
+conf = Config()
+
+
+def get_index_labels():
+    """需要单独建索引的标签：tcm_metadata.json 中定义的全部标签"""
+    return [label["name"] for label in json.loads(conf.TCM_METADATA).get("labels", [])]
+
+
+def build_entity_dictionary(labels=None):
+    """
+    构建实体词典（名称和别名 -> 标签、标准名称），供实体抽取节点在调用大模型前直接匹配
+    全量构建和流式构建索引后都要调用，保证词典与索引来自同一份节点数据
+    :param labels: 标签列表，None 表示 tcm_metadata.json 中的全部标签
+    """
+    rows = [(label, name, alias) for label in labels or get_index_labels()
+            for name, alias in neo4j_client.get_node_names_and_aliases_by_label(label)]
+    entries = build_dictionary_entries(rows)
+    save_entity_dictionary(conf.ENTITY_DICTIONARY_PATH, entries)
+    print(f"✅ 实体词典已保存到 {conf.ENTITY_DICTIONARY_PATH}，共 {len(entries)} 条")
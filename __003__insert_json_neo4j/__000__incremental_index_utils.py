@@ -0,0 +1,112 @@
+import os
+
+import faiss
+import numpy as np
+
+from common.embedding_backends import read_backend_marker, write_backend_marker
+from common.faiss_index_utils import create_faiss_index, enable_reconstruct, get_index_type, stable_text_id
+from common.string_table import StringTable, is_string_table, write_string_table
+
+
+def load_indexed_entries(index_path, mapping_path, backend_key=None):
+    """
+    读取已有的索引和其中的 {稳定 id: 名称}
+    :param backend_key: 当前的向量后端标识，与索引构建时的不同则不能在其上追加向量
+    :return: (index, entries)；文件不存在、是旧的按下标编号的索引（无法增量更新）或后端不同时返回 (None, {})
+    """
+    if not (os.path.exists(index_path) and os.path.exists(mapping_path)) or not is_string_table(mapping_path):
+        return None, {}
+    if backend_key is not None and read_backend_marker(index_path) != backend_key:
+        print(f"索引 {index_path} 由其他向量后端构建（{read_backend_marker(index_path)}），重新全量构建")
+        return None, {}
+    table = StringTable(mapping_path)
+    try:
+        if not table.keyed:
+            return None, {}
+        entries = dict(table.items())
+    finally:
+        table.close()
+    index = faiss.read_index(index_path)
+    if not isinstance(index, faiss.IndexIDMap2) or index.ntotal != len(entries):
+        print(f"索引 {index_path} 与映射不一致，重新全量构建")
+        return None, {}
+    return index, entries
+
+
+def save_index_atomically(index, index_path, mapping_path, entries, label=None, backend_key=None):
+    """
+    先替换映射和后端标记、最后替换索引文件，索引文件的修改时间即更新完成的标志：
+    检索服务看到新的索引文件时映射已经就绪，已打开的旧映射通过 mmap 继续有效
+    """
+    ids = list(entries)
+    write_string_table(mapping_path, [entries[i] for i in ids],
+                       labels=None if label is None else [label] * len(ids), node_ids=ids, keyed=True)
+    if backend_key is not None:
+        write_backend_marker(index_path, backend_key)
+    tmp_path = f"{index_path}.tmp"
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, index_path)
+
+
+def update_faiss_index(names, index_path, mapping_path, encode, index_type="flat", label=None, backend_key=None,
+                       **index_kwargs):
+    """
+    增量更新 IndexIDMap2 索引：与已索引的名称做差集，只编码新增名称，删除图谱中已不存在的名称
+    索引不存在或是旧格式时全量构建；已有索引保持原来的索引类型
+
+    Args:
+        names: 图谱中当前的全部名称
+        index_path: 索引路径
+        mapping_path: 字符串表路径
+        encode: 把名称列表编码为归一化 float32 向量的函数
+        index_type: 全量构建时的索引类型
+        label: 写入字符串表标签列的标签，None 表示不写
+        backend_key: encode 所用的向量后端标识，记录在索引旁；已有索引的后端不同时全量重建
+        index_kwargs: 透传给 create_faiss_index 的参数
+
+    Returns:
+        统计 {"total", "added", "removed", "encoded", "saved"}，saved 为相比全量重建少编码的条数
+    """
+    wanted = {}
+    for name in dict.fromkeys(names):
+        name_id = stable_text_id(name)
+        if name_id in wanted:
+            raise ValueError(f"名称 id 冲突: {wanted[name_id]} / {name}")
+        wanted[name_id] = name
+
+    index, indexed = load_indexed_entries(index_path, mapping_path, backend_key)
+    if index is not None and not any(i in wanted for i in indexed):
+        index = None  # 没有可保留的名称，等同于全量构建
+    if index is None:
+        ids = list(wanted)
+        embeddings = encode([wanted[i] for i in ids]) if ids else None
+        if ids:
+            index = create_faiss_index(embeddings, index_type, ids=ids, **index_kwargs)
+            save_index_atomically(index, index_path, mapping_path, wanted, label, backend_key)
+        stats = {"total": len(wanted), "added": len(ids), "removed": 0, "encoded": len(ids), "saved": 0}
+        print(f"全量构建 {index_path}: {stats}")
+        return stats
+
+    added = [i for i in wanted if i not in indexed]
+    removed = [i for i in indexed if i not in wanted]
+    if removed:
+        existing_type = get_index_type(index)
+        if existing_type == "flat":
+            index.remove_ids(np.array(removed, dtype="int64"))
+        else:
+            # HNSW 图不支持删除节点；IVF 删除后内部位置不会像 IndexIDMap2 假定的那样前移，id 映射会错位。
+            # 两者都取回保留的向量重建索引，不需要重新编码
+            kept = np.array([i for i in indexed if i in wanted], dtype="int64")
+            enable_reconstruct(index)
+            index = create_faiss_index(index.reconstruct_batch(kept), existing_type, ids=kept, **index_kwargs)
+    if added:
+        embeddings = np.ascontiguousarray(encode([wanted[i] for i in added]), dtype="float32")
+        index.add_with_ids(embeddings, np.array(added, dtype="int64"))
+    if added or removed:
+        save_index_atomically(index, index_path, mapping_path, wanted, label, backend_key)
+
+    stats = {"total": len(wanted), "added": len(added), "removed": len(removed), "encoded": len(added),
+             "saved": len(wanted) - len(added)}
+    print(f"增量更新 {index_path}: 新增 {len(added)}，删除 {len(removed)}，"
+          f"相比全量重建少编码 {stats['saved']} 条")
+    return stats
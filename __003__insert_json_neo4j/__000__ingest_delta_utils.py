@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+
+MANIFEST_VERSION = 1
+# 清单中拼接键的分隔符，实体名称里不会出现
+KEY_SEPARATOR = "\x1f"
+
+
+def hash_props(props):
+    """实体属性的内容哈希，键顺序不影响结果"""
+    payload = json.dumps(props, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def entity_manifest_key(entity_type, name):
+    return f"{entity_type}{KEY_SEPARATOR}{name}"
+
+
+def relation_manifest_key(group_key, row):
+    subject_type, relation_type, object_type = group_key
+    return KEY_SEPARATOR.join((subject_type, row["subject"], relation_type, object_type, row["object"]))
+
+
+def split_relation_manifest_key(key):
+    """relation_manifest_key 的逆操作，返回 (group_key, row)"""
+    subject_type, subject, relation_type, object_type, object_name = key.split(KEY_SEPARATOR)
+    return (subject_type, relation_type, object_type), {"subject": subject, "object": object_name}
+
+
+def build_manifest(entity_groups, relation_groups):
+    """
+    由分组后的实体和关系生成清单
+    :param entity_groups: group_entity_rows 的返回值
+    :param relation_groups: group_relation_rows 的返回值
+    :return: {"version": ..., "entities": {键: 属性哈希}, "relations": [键, ...]}
+    """
+    entities = {
+        entity_manifest_key(entity_type, row["name"]): hash_props(row["props"])
+        for entity_type, rows in entity_groups.items()
+        for row in rows
+    }
+    relations = sorted(
+        relation_manifest_key(group_key, row)
+        for group_key, rows in relation_groups.items()
+        for row in rows
+    )
+    return {"version": MANIFEST_VERSION, "entities": entities, "relations": relations}
+
+
+def load_manifest(manifest_path):
+    """读取上次导入的清单，不存在或版本不符时返回空清单（即全部视为新增）"""
+    empty = {"version": MANIFEST_VERSION, "entities": {}, "relations": []}
+    if not manifest_path or not os.path.exists(manifest_path):
+        return empty
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"读取导入清单失败: {e}，按首次导入处理")
+        return empty
+    if manifest.get("version") != MANIFEST_VERSION:
+        print(f"导入清单版本为 {manifest.get('version')}，当前为 {MANIFEST_VERSION}，按首次导入处理")
+        return empty
+    return manifest
+
+
+def save_manifest(manifest_path, manifest):
+    """先写临时文件再替换，避免中断时留下半个清单"""
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp_path, manifest_path)
+
+
+def compute_ingest_delta(entity_groups, relation_groups, old_manifest):
+    """
+    对比本次数据与上次导入的清单，得到需要写入图谱的变更
+
+    Returns:
+        dict:
+            entity_inserts / entity_updates: {entity_type: [{"name":..., "props":...}]}
+            entity_deletes: {entity_type: [{"name":...}]}
+            relation_inserts / relation_deletes: {(subject_type, relation, object_type): [{"subject":..., "object":...}]}
+            manifest: 本次数据对应的新清单
+    """
+    new_manifest = build_manifest(entity_groups, relation_groups)
+    old_entities = old_manifest.get("entities", {})
+    old_relations = set(old_manifest.get("relations", []))
+
+    delta = {
+        "entity_inserts": {},
+        "entity_updates": {},
+        "entity_deletes": {},
+        "relation_inserts": {},
+        "relation_deletes": {},
+        "manifest": new_manifest,
+    }
+
+    for entity_type, rows in entity_groups.items():
+        for row in rows:
+            key = entity_manifest_key(entity_type, row["name"])
+            old_hash = old_entities.get(key)
+            if old_hash is None:
+                delta["entity_inserts"].setdefault(entity_type, []).append(row)
+            elif old_hash != new_manifest["entities"][key]:
+                delta["entity_updates"].setdefault(entity_type, []).append(row)
+
+    for key in old_entities.keys() - new_manifest["entities"].keys():
+        entity_type, name = key.split(KEY_SEPARATOR, 1)
+        delta["entity_deletes"].setdefault(entity_type, []).append({"name": name})
+
+    new_relations = set(new_manifest["relations"])
+    for key in sorted(new_relations - old_relations):
+        group_key, row = split_relation_manifest_key(key)
+        delta["relation_inserts"].setdefault(group_key, []).append(row)
+    for key in sorted(old_relations - new_relations):
+        group_key, row = split_relation_manifest_key(key)
+        delta["relation_deletes"].setdefault(group_key, []).append(row)
+
+    return delta
+
+
+def retain_deleted_in_manifest(manifest, old_manifest):
+    """
+    跳过删除时，把本次数据中已不存在的实体和关系保留在新清单里，下次对比时仍会报告为待删除
+    :return: 合并后的清单
+    """
+    entities = dict(old_manifest.get("entities", {}))
+    entities.update(manifest["entities"])
+    relations = sorted(set(manifest["relations"]) | set(old_manifest.get("relations", [])))
+    return {**manifest, "entities": entities, "relations": relations}
+
+
+def count_delta_rows(delta):
+    """各类变更的行数，用于打印报告"""
+    return {
+        name: sum(len(rows) for rows in delta[name].values())
+        for name in ("entity_inserts", "entity_updates", "entity_deletes", "relation_inserts", "relation_deletes")
+    }
@@ -0,0 +1,68 @@
+def relation_endpoint_keys(group_key, row):
+    """关系的两个端点节点，以 (标签, name) 标识"""
+    subject_type, _, object_type = group_key
+    return (subject_type, row["subject"]), (object_type, row["object"])
+
+
+def partition_relation_batches(relation_groups, batch_size=1000, max_workers=4):
+    """
+    把关系切成若干轮，每轮最多 max_workers 个批次，同一轮内的批次之间没有公共端点节点
+
+    MERGE 关系时会锁住两个端点，只要并发的事务不共享节点就不会互相等待，也就不会死锁。
+    按贪心方式逐轮分配：一条关系的端点已属于本轮某个批次时只能放进该批次，两个端点分属
+    不同批次或目标批次已满时推迟到下一轮；甘草、当归这类热点节点的关系因此会集中在
+    同一批次里串行写入，其它批次照常并行。
+
+    Args:
+        relation_groups: group_relation_rows 的返回值
+        batch_size: 每个批次最多的关系行数
+        max_workers: 每轮最多的批次数，即并发写入的会话数
+
+    Returns:
+        轮次列表；每一轮是批次列表，每个批次形如 {(subject_type, relation, object_type): [row, ...]}
+    """
+    pending = [(group_key, row) for group_key, rows in relation_groups.items() for row in rows]
+    rounds = []
+    while pending:
+        batches = []
+        batch_sizes = []
+        node_owner = {}  # 端点节点 -> 本轮所属批次下标
+        deferred = []
+        for group_key, row in pending:
+            endpoints = relation_endpoint_keys(group_key, row)
+            owners = {node_owner[node] for node in endpoints if node in node_owner}
+            if len(owners) > 1:
+                deferred.append((group_key, row))
+                continue
+            if owners:
+                index = owners.pop()
+            elif len(batches) < max_workers:
+                index = len(batches)
+                batches.append({})
+                batch_sizes.append(0)
+            else:
+                # 新节点放进当前最空的批次，让各批次大小尽量均衡
+                index = min(range(len(batches)), key=batch_sizes.__getitem__)
+            if batch_sizes[index] >= batch_size:
+                deferred.append((group_key, row))
+                continue
+            batches[index].setdefault(group_key, []).append(row)
+            batch_sizes[index] += 1
+            for node in endpoints:
+                node_owner[node] = index
+        rounds.append(batches)
+        pending = deferred
+    return rounds
+
+
+def check_rounds_disjoint(rounds):
+    """校验每一轮内各批次的端点节点互不相交，返回 True/False"""
+    for batches in rounds:
+        seen = set()
+        for batch in batches:
+            nodes = {node for group_key, rows in batch.items() for row in rows
+                     for node in relation_endpoint_keys(group_key, row)}
+            if seen & nodes:
+                return False
+            seen |= nodes
+    return True
@@ -0,0 +1,172 @@
+import json
+import os
+import sqlite3
+import tempfile
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+_NUMBER_START = "-0123456789"
+# 合法 JSON 中数字之后只能是这些字符
+_AFTER_NUMBER = _WHITESPACE + ",]}"
+
+
+class _JsonStreamReader:
+    """按块读取文件并在缓冲区上逐个解码 JSON 值，缓冲区只保留尚未解码的部分"""
+
+    def __init__(self, f, chunk_size):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _read_more(self):
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        # 丢弃已解码的部分，避免缓冲区随文件增长
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """跳过空白，返回下一个字符（不消费），文件结束返回空串"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._read_more():
+                return ""
+
+    def expect(self, char):
+        actual = self.peek()
+        if actual != char:
+            raise ValueError(f"JSON 格式错误：期望 {char!r}，实际为 {actual!r}")
+        self.pos += 1
+
+    def _is_complete(self, end):
+        """
+        解码结果是否完整：数字可能恰好被块边界截断，如 "1.5" 只读到 "1." 时会被解码成 1，
+        因此数字必须后跟分隔符才算完整，结尾处或后跟其它字符时需要再读一块确认
+        """
+        if self.eof:
+            return True
+        if end >= len(self.buf):
+            return False
+        return self.buf[self.pos] not in _NUMBER_START or self.buf[end] in _AFTER_NUMBER
+
+    def decode_value(self):
+        """解码下一个完整的 JSON 值，数据不完整时继续读取"""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+                if self._is_complete(end):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            if not self._read_more():
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+                self.pos = end
+                return value
+
+
+def iter_json_array_items(json_path, array_key="results", chunk_size=1 << 16):
+    """
+    流式读取顶层对象中某个数组字段的元素，内存占用只与单个元素大小有关
+
+    适用于 {"results": [{...}, {...}]} 这种抽取结果文件；顶层的其它字段会被跳过。
+    :param json_path: JSON 文件路径
+    :param array_key: 顶层数组字段名，抽取结果为 "results"，批量抽取的原始输出为 "output_list"
+    :param chunk_size: 每次读取的字符数
+    """
+    with open(json_path, "r", encoding="utf-8") as f:
+        reader = _JsonStreamReader(f, chunk_size)
+        reader.expect("{")
+        if reader.peek() == "}":
+            return
+        while True:
+            key = reader.decode_value()
+            reader.expect(":")
+            if key == array_key:
+                reader.expect("[")
+                if reader.peek() == "]":
+                    reader.pos += 1
+                else:
+                    while True:
+                        yield reader.decode_value()
+                        if reader.peek() == ",":
+                            reader.pos += 1
+                            continue
+                        reader.expect("]")
+                        break
+            else:
+                reader.decode_value()
+            if reader.peek() == ",":
+                reader.pos += 1
+                continue
+            reader.expect("}")
+            return
+
+
+class IngestKeyStore:
+    """
+    流式导入时用于去重的磁盘键值存储（SQLite），内存占用与数据量无关
+
+    - 实体按 (name, type) 保存合并后的属性，用于判断新出现的属性是否改变了节点
+    - 关系按五元组保存是否已写入
+    :param store_path: SQLite 文件路径，None 表示使用临时文件并在 close 时删除
+    """
+
+    def __init__(self, store_path=None):
+        self.temporary = store_path is None
+        if self.temporary:
+            fd, store_path = tempfile.mkstemp(suffix=".sqlite", prefix="ingest_store_")
+            os.close(fd)
+        self.store_path = store_path
+        self.conn = sqlite3.connect(store_path)
+        self.conn.execute("PRAGMA journal_mode=OFF")
+        self.conn.execute("PRAGMA synchronous=OFF")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS entities (name TEXT, type TEXT, props TEXT, PRIMARY KEY (name, type))"
+        )
+        self.conn.execute("CREATE TABLE IF NOT EXISTS relations (key TEXT PRIMARY KEY)")
+
+    def merge_entity(self, name, entity_type, attributes):
+        """
+        合并实体属性（新属性覆盖旧属性，与 parse_entities_and_relations 一致）
+        :return: 节点需要写入时返回合并后的属性，否则返回 None
+        """
+        row = self.conn.execute(
+            "SELECT props FROM entities WHERE name = ? AND type = ?", (name, entity_type)
+        ).fetchone()
+        if row is None:
+            merged = dict(attributes)
+        else:
+            old = json.loads(row[0])
+            merged = {**old, **attributes}
+            if merged == old:
+                return None
+        self.conn.execute(
+            "INSERT OR REPLACE INTO entities (name, type, props) VALUES (?, ?, ?)",
+            (name, entity_type, json.dumps(merged, ensure_ascii=False, sort_keys=True))
+        )
+        return merged
+
+    def add_relation(self, relation_key):
+        """记录关系五元组，首次出现返回 True"""
+        cursor = self.conn.execute("INSERT OR IGNORE INTO relations (key) VALUES (?)",
+                                   ("\x1f".join(relation_key),))
+        return cursor.rowcount == 1
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+        if self.temporary and os.path.exists(self.store_path):
+            os.remove(self.store_path)
@@ -0,0 +1,223 @@
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import faiss
+import numpy as np
+from tqdm import tqdm
+
+from common.config import Config
+from common.embedding_backends import load_embedding_model, prepare_onnx_model, write_backend_marker
+from common.faiss_index_utils import get_ivf_nlist, new_faiss_index, stable_text_id
+from common.string_table import write_string_table
+
+CHECKPOINT_VERSION = 1
+
+# 工作进程内的向量模型，由 _init_worker 加载，每个进程只加载一次
+_worker_model = None
+
+
+def _prepare_worker_model():
+    """在主进程中准备工作进程要加载的模型文件：ONNX 后端的导出和量化只做一次，工作进程只负责加载"""
+    conf = Config()
+    prepare_onnx_model(conf.EMBEDDING_BACKEND, conf.EMBEDDING_MODEL_PATH, conf.EMBEDDING_ONNX_DIR)
+
+
+def _init_worker(threads):
+    """
+    工作进程初始化：按 EMBEDDING_BACKEND 加载向量模型，并限制每个进程的计算线程数，避免多个进程争抢 CPU
+    模型文件已由主进程的 _prepare_worker_model 准备好。不导入 common.embedding_model：
+    那里的查询向量缓存会在进程退出时写回 EMBEDDING_CACHE_PATH，多个工作进程会同时写同一个文件
+    """
+    global _worker_model
+    conf = Config()
+    _worker_model = load_embedding_model(conf.EMBEDDING_BACKEND, conf.EMBEDDING_MODEL_PATH, conf.EMBEDDING_ONNX_DIR,
+                                         threads)
+
+
+def _encode_chunk(texts):
+    return np.asarray(_worker_model.encode(texts, convert_to_numpy=True, normalize_embeddings=True), dtype="float32")
+
+
+def iter_chunks(pages, chunk_size):
+    """把分页读出的 (name, label) 重新切成固定大小的块，跨页的余数并入下一块"""
+    buffer = []
+    for page in pages:
+        buffer.extend(page)
+        while len(buffer) >= chunk_size:
+            yield buffer[:chunk_size]
+            buffer = buffer[chunk_size:]
+    if buffer:
+        yield buffer
+
+
+def _partial_paths(index_path):
+    """断点文件：未完成的索引、已加入索引的名称（每行一个 JSON），以及记录进度的检查点"""
+    return f"{index_path}.partial", f"{index_path}.names.jsonl", f"{index_path}.checkpoint.json"
+
+
+def _remove_partial_files(index_path):
+    for path in _partial_paths(index_path):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _load_checkpoint(index_path, index_type, backend_key=None):
+    """
+    读取上次中断时的检查点
+    :return: (index, 已完成条数, 游标 name)；没有可用的检查点时返回 (None, 0, "")
+    """
+    partial_index_path, names_path, checkpoint_path = _partial_paths(index_path)
+    if not all(os.path.exists(path) for path in _partial_paths(index_path)):
+        return None, 0, ""
+    try:
+        with open(checkpoint_path, "r", encoding="utf-8") as f:
+            checkpoint = json.load(f)
+        index = faiss.read_index(partial_index_path)
+    except (OSError, RuntimeError, json.JSONDecodeError) as e:
+        print(f"读取检查点失败: {e}，从头构建")
+        return None, 0, ""
+    if checkpoint.get("version") != CHECKPOINT_VERSION or checkpoint.get("index_type") != index_type \
+            or checkpoint.get("backend") != backend_key or index.ntotal != checkpoint["done"]:
+        print("检查点与当前构建参数不一致，从头构建")
+        return None, 0, ""
+
+    # 名称文件可能比检查点多写了几行（检查点之后中断），截断到检查点的位置
+    with open(names_path, "r", encoding="utf-8") as f:
+        lines = [next(f) for _ in range(checkpoint["done"])]
+    with open(names_path, "w", encoding="utf-8") as f:
+        f.writelines(lines)
+    print(f"从检查点继续: 已完成 {checkpoint['done']} 条，游标 {checkpoint['after']}")
+    return index, checkpoint["done"], checkpoint["after"]
+
+
+def _save_checkpoint(index, index_path, names_file, done, after, index_type, backend_key=None):
+    partial_index_path, _, checkpoint_path = _partial_paths(index_path)
+    names_file.flush()
+    os.fsync(names_file.fileno())
+    faiss.write_index(index, f"{partial_index_path}.tmp")
+    os.replace(f"{partial_index_path}.tmp", partial_index_path)
+    with open(f"{checkpoint_path}.tmp", "w", encoding="utf-8") as f:
+        json.dump({"version": CHECKPOINT_VERSION, "index_type": index_type, "backend": backend_key, "done": done,
+                   "after": after}, f, ensure_ascii=False)
+    os.replace(f"{checkpoint_path}.tmp", checkpoint_path)
+
+
+def stream_build_faiss_index(iter_pages, index_path, mapping_path, total=None, index_type="flat", chunk_size=256,
+                             workers=None, checkpoint_every=20, resume=True, backend_key=None, **index_kwargs):
+    """
+    流式构建 IndexIDMap2 索引：分页读取名称，切成固定大小的块交给进程池编码，按顺序逐块加入索引
+    同时在途的块数不超过 2×workers，内存中不会出现完整的向量矩阵；每 checkpoint_every 块保存一次检查点，
+    中断后重新运行会从检查点继续
+
+    Args:
+        iter_pages: 函数 f(after)，返回从大于 after 的 name 开始、按 name 升序的分页迭代器，每页为 [(name, label)]
+        index_path: 索引路径
+        mapping_path: 字符串表路径
+        total: 名称总数，用于显示进度；ivf 索引据此确定聚类中心数，必须提供
+        index_type: flat / hnsw / ivf
+        chunk_size: 每块的名称数
+        workers: 编码进程数，None 时取 CPU 核数与 4 的较小值
+        checkpoint_every: 每多少块保存一次检查点
+        resume: 是否从上次中断的检查点继续
+        backend_key: 工作进程所用的向量后端标识（与 EMBEDDING_BACKEND 一致），写入检查点和索引旁的后端标记
+        index_kwargs: 透传给 new_faiss_index 的参数，如 hnsw_m
+
+    Returns:
+        统计 {"total", "encoded", "seconds", "names_per_second"}
+    """
+    if index_type == "ivf" and not total:
+        raise ValueError("ivf 索引需要提供 total 以确定聚类中心数")
+    workers = workers or min(4, os.cpu_count() or 1)
+    threads = max(1, (os.cpu_count() or 1) // workers)
+
+    index, done, after = _load_checkpoint(index_path, index_type, backend_key) if resume else (None, 0, "")
+    if index is None:
+        _remove_partial_files(index_path)
+    _, names_path, _ = _partial_paths(index_path)
+    ivf_nlist = get_ivf_nlist(total) if index_type == "ivf" else 1
+    training_size = min(total, ivf_nlist * 39) if index_type == "ivf" else 0
+    training_buffer = []  # ivf 训练前暂存的 (ids, vectors)
+
+    def add_to_index(ids, vectors):
+        nonlocal index
+        if index is None:
+            base = new_faiss_index(vectors.shape[1], index_type, ivf_nlist=ivf_nlist, **index_kwargs)
+            index = faiss.IndexIDMap2(base)
+        if index_type == "ivf" and not index.is_trained:
+            # IVF 需要先用足够的样本训练聚类中心，训练前的向量先暂存
+            training_buffer.append((ids, vectors))
+            if sum(len(buffered_ids) for buffered_ids, _ in training_buffer) < training_size:
+                return
+            index.train(np.concatenate([buffered for _, buffered in training_buffer]))
+            for buffered_ids, buffered in training_buffer:
+                index.add_with_ids(buffered, buffered_ids)
+            training_buffer.clear()
+            return
+        index.add_with_ids(vectors, ids)
+
+    start = time.perf_counter()
+    encoded = 0
+    chunk_count = 0
+    progress = tqdm(total=total, initial=done, unit="name", desc=os.path.basename(index_path))
+    _prepare_worker_model()
+    context = multiprocessing.get_context("spawn")  # 主进程持有数据库连接，子进程不 fork
+    with open(names_path, "a", encoding="utf-8") as names_file, \
+            ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                                initargs=(threads,)) as executor:
+        pending = deque()
+
+        def consume():
+            nonlocal done, after, encoded, chunk_count
+            chunk, future = pending.popleft()
+            vectors = future.result()
+            ids = np.array([stable_text_id(name) for name, _ in chunk], dtype="int64")
+            add_to_index(ids, vectors)
+            names_file.writelines(json.dumps([name, label], ensure_ascii=False) + "\n" for name, label in chunk)
+            done += len(chunk)
+            encoded += len(chunk)
+            after = chunk[-1][0]
+            chunk_count += 1
+            progress.update(len(chunk))
+            progress.set_postfix({"names/s": f"{encoded / (time.perf_counter() - start):.1f}"})
+            if chunk_count % checkpoint_every == 0 and not training_buffer:
+                _save_checkpoint(index, index_path, names_file, done, after, index_type, backend_key)
+
+        for chunk in iter_chunks(iter_pages(after), chunk_size):
+            pending.append((chunk, executor.submit(_encode_chunk, [name for name, _ in chunk])))
+            while len(pending) >= 2 * workers:
+                consume()
+        while pending:
+            consume()
+    progress.close()
+
+    if training_buffer:
+        # 总数不足训练样本量（total 偏大）时，用已有的全部向量训练
+        index.train(np.concatenate([buffered for _, buffered in training_buffer]))
+        for buffered_ids, buffered in training_buffer:
+            index.add_with_ids(buffered, buffered_ids)
+    if index is None:
+        print(f"没有需要索引的名称，跳过 {index_path}")
+        _remove_partial_files(index_path)
+        return {"total": 0, "encoded": 0, "seconds": 0.0, "names_per_second": 0.0}
+
+    # 全部完成：先写映射，最后替换索引文件，然后清理断点文件
+    with open(names_path, "r", encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f]
+    write_string_table(mapping_path, [name for name, _ in rows], labels=[label for _, label in rows],
+                       node_ids=[stable_text_id(name) for name, _ in rows], keyed=True)
+    if backend_key is not None:
+        write_backend_marker(index_path, backend_key)
+    faiss.write_index(index, f"{index_path}.tmp")
+    os.replace(f"{index_path}.tmp", index_path)
+    _remove_partial_files(index_path)
+
+    seconds = time.perf_counter() - start
+    stats = {"total": done, "encoded": encoded, "seconds": seconds,
+             "names_per_second": encoded / seconds if seconds else 0.0}
+    print(f"✅ 索引已保存到 {index_path}：共 {done} 条，本次编码 {encoded} 条，"
+          f"耗时 {seconds:.1f}s，{stats['names_per_second']:.1f} names/s")
+    return stats
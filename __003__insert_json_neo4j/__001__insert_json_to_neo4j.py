@@ -1,8 +1,24 @@
 import json
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from __003__insert_json_neo4j.__000__ingest_delta_utils import (compute_ingest_delta, count_delta_rows, load_manifest,
+                                                                retain_deleted_in_manifest, save_manifest)
+from __003__insert_json_neo4j.__000__parallel_ingest_utils import partition_relation_batches
+from __003__insert_json_neo4j.__000__stream_json_utils import IngestKeyStore, iter_json_array_items
+from common.config import Config
 from common.neo4j_manager import neo4j_client
 from common.path_utils import get_file_path
 from tqdm import tqdm
 
+# Cypher 中可直接拼接的标签 / 关系类型名
+CYPHER_IDENTIFIER_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+conf = Config()
+
+# 增量导入的清单：记录上次导入后每个实体的属性哈希和每条关系
+DEFAULT_INGEST_MANIFEST_PATH = get_file_path("__003__insert_json_neo4j/ingest_manifest.json")
+
 
 def load_json_data(json_path):
     """加载 JSON 文件"""
@@ -134,12 +150,270 @@ def create_relation_cypher_queries(relations_list):
     return queries
 
 
-def insert_to_neo4j(json_path, batch_size=1000):
+def check_cypher_identifier(identifier):
+    """
+    标签和关系类型无法参数化，只能拼接进 Cypher，拼接前校验是合法的标识符
+    """
+    if not isinstance(identifier, str) or not CYPHER_IDENTIFIER_PATTERN.match(identifier):
+        raise ValueError(f"非法的标签或关系类型: {identifier!r}")
+    return identifier
+
+
+def group_entity_rows(entities_dict, relations_list=None):
+    """
+    按实体类型分组，生成 UNWIND 批量写入用的参数行
+    关系中出现但没有单独抽取为实体的端点也会补成无属性的节点，保证写关系时能 MATCH 到
+    返回: {entity_type: [{"name": ..., "props": {...}}]}
+    """
+    entity_groups = {}
+    for (name, entity_type), entity_data in entities_dict.items():
+        attributes = entity_data.get("attributes") or {}
+        if not isinstance(attributes, dict):
+            attributes = {}
+        entity_groups.setdefault(entity_type, []).append({"name": name, "props": attributes})
+
+    known_keys = set(entities_dict)
+    for relation in relations_list or []:
+        for entity_key in ((relation["subject"], relation["subject_type"]),
+                           (relation["object"], relation["object_type"])):
+            if entity_key not in known_keys:
+                known_keys.add(entity_key)
+                entity_groups.setdefault(entity_key[1], []).append({"name": entity_key[0], "props": {}})
+
+    return entity_groups
+
+
+def group_relation_rows(relations_list):
+    """
+    按 (subject_type, relation, object_type) 分组并去重，生成 UNWIND 批量写入用的参数行
+    返回: {(subject_type, relation, object_type): [{"subject": ..., "object": ...}]}
+    """
+    relation_groups = {}
+    seen = set()
+    for relation in relations_list:
+        group_key = (relation["subject_type"], relation["relation"], relation["object_type"])
+        relation_key = group_key + (relation["subject"], relation["object"])
+        if relation_key in seen:
+            continue
+        seen.add(relation_key)
+        relation_groups.setdefault(group_key, []).append({
+            "subject": relation["subject"],
+            "object": relation["object"]
+        })
+    return relation_groups
+
+
+def create_entity_unwind_queries(entity_groups, batch_size=1000):
+    """
+    每种实体类型生成一条 UNWIND ... MERGE 语句，按 batch_size 切分参数行
+    返回: List[Tuple[query, params]]
+    """
+    queries = []
+    for entity_type, rows in entity_groups.items():
+        query = (
+            "UNWIND $rows AS row "
+            f"MERGE (n:{check_cypher_identifier(entity_type)} {{name: row.name}}) "
+            "SET n += row.props"
+        )
+        for i in range(0, len(rows), batch_size):
+            queries.append((query, {"rows": rows[i:i + batch_size]}))
+    return queries
+
+
+def create_relation_unwind_queries(relation_groups, batch_size=1000):
+    """
+    每种 (subject_type, relation, object_type) 生成一条 UNWIND 语句，按 batch_size 切分参数行
+    端点节点已在写实体时创建，这里用 MATCH 查找而不是再次 MERGE
+    返回: List[Tuple[query, params]]
+    """
+    queries = []
+    for (subject_type, relation_type, object_type), rows in relation_groups.items():
+        query = (
+            "UNWIND $rows AS row "
+            f"MATCH (s:{check_cypher_identifier(subject_type)} {{name: row.subject}}) "
+            f"MATCH (o:{check_cypher_identifier(object_type)} {{name: row.object}}) "
+            f"MERGE (s)-[r:{check_cypher_identifier(relation_type)}]->(o)"
+        )
+        for i in range(0, len(rows), batch_size):
+            queries.append((query, {"rows": rows[i:i + batch_size]}))
+    return queries
+
+
+def parallel_insert_relations(relation_groups, batch_size=1000, max_workers=4):
+    """
+    并行写入关系：按 partition_relation_batches 切成若干轮，同一轮内的批次没有公共端点，
+    分给 max_workers 个会话并发执行，一轮全部完成后再开始下一轮
+    :param relation_groups: group_relation_rows 的返回值
+    :param batch_size: 每个批次最多的关系行数
+    :param max_workers: 并发会话数
+    :return: {"rounds": 轮数, "batches": 批次数, "retries": 瞬时错误重试次数}
+    """
+    rounds = partition_relation_batches(relation_groups, batch_size, max_workers)
+    stats = {"rounds": len(rounds), "batches": sum(map(len, rounds)), "retries": 0}
+    print(f"\n正在并行插入关系: {max_workers} 个会话，{stats['rounds']} 轮，{stats['batches']} 批")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for batches in tqdm(rounds, desc="插入关系"):
+            # 一个批次可能包含多种三元组，在同一事务中依次执行各自的 UNWIND 语句
+            futures = [
+                executor.submit(neo4j_client.run_write_queries, create_relation_unwind_queries(batch, batch_size))
+                for batch in batches
+            ]
+            stats["retries"] += sum(future.result() for future in futures)
+    return stats
+
+
+def bulk_insert_to_neo4j(entities_dict, relations_list, batch_size=1000, relation_workers=1):
+    """
+    批量写入：实体和关系按类型分组，每批参数行只发送一条 UNWIND 语句
+    :param entities_dict: parse_entities_and_relations 解析出的实体
+    :param relations_list: parse_entities_and_relations 解析出的关系
+    :param batch_size: 每条 UNWIND 语句携带的最大行数
+    :param relation_workers: 写关系的并发会话数，大于 1 时使用 parallel_insert_relations
+    """
+    entity_groups = group_entity_rows(entities_dict, relations_list)
+    relation_groups = group_relation_rows(relations_list)
+    entity_queries = create_entity_unwind_queries(entity_groups, batch_size)
+
+    print(f"\n正在批量插入实体: {len(entity_groups)} 种类型，{len(entity_queries)} 批")
+    for query, params in tqdm(entity_queries, desc="插入实体"):
+        neo4j_client.run_write_cypher(query, params)
+
+    if relation_workers > 1:
+        parallel_insert_relations(relation_groups, batch_size, relation_workers)
+        return
+
+    relation_queries = create_relation_unwind_queries(relation_groups, batch_size)
+    print(f"\n正在批量插入关系: {len(relation_groups)} 种三元组，{len(relation_queries)} 批")
+    for query, params in tqdm(relation_queries, desc="插入关系"):
+        neo4j_client.run_write_cypher(query, params)
+
+
+def get_schema_labels(entity_types=None):
+    """
+    需要建立 name 约束的标签：tcm_metadata.json 中定义的标签 + 本次数据中出现的实体类型
+    """
+    labels = []
+    try:
+        labels = [label["name"] for label in json.loads(conf.TCM_METADATA).get("labels", [])]
+    except (json.JSONDecodeError, KeyError, TypeError) as e:
+        print(f"解析 tcm_metadata.json 失败: {e}，只使用数据中的实体类型")
+    for entity_type in entity_types or []:
+        if entity_type not in labels:
+            labels.append(entity_type)
+    return [check_cypher_identifier(label) for label in labels]
+
+
+def bootstrap_schema(entity_types=None):
+    """
+    导入前为每个标签的 name 建立唯一约束/索引，使 MERGE 和 name 过滤走索引而不是扫描整个标签
+    幂等，重复执行不会报错
+    :param entity_types: 本次数据中出现的实体类型
+    """
+    labels = get_schema_labels(entity_types)
+    print(f"\n正在建立 name 约束/索引: {labels}")
+    created = neo4j_client.create_name_constraints(labels)
+    print(f"约束/索引就绪: {created}")
+    return created
+
+
+def stream_insert_to_neo4j(json_path, batch_size=1000, store_path=None, ensure_schema=True):
+    """
+    流式导入：逐条读取 results[*]，实体和关系经磁盘键值存储去重后攒成 UNWIND 批次边读边写
+    内存中只保留当前一条结果和不超过 batch_size 行的待写批次，峰值内存与文件大小无关
+    :param json_path: JSON 文件路径
+    :param batch_size: 攒够多少行（实体+关系）写入一次
+    :param store_path: 去重存储的 SQLite 路径，None 表示使用临时文件
+    :param ensure_schema: 写入前是否建立 name 约束/索引
+    """
+    print(f"\n开始流式处理文件: {json_path}")
+    start_time = time.perf_counter()
+    store = IngestKeyStore(store_path)
+    schema_labels = set(bootstrap_schema()) if ensure_schema else set()
+    entity_buffer = {}  # {entity_type: {name: props}}
+    relation_buffer = {}  # {(subject_type, relation, object_type): [{"subject":..., "object":...}]}
+    stats = {"results": 0, "entities": 0, "relations": 0, "batches": 0}
+
+    def buffer_entity(name, entity_type, attributes):
+        merged = store.merge_entity(name, entity_type, attributes)
+        if merged is None:
+            return
+        if ensure_schema and entity_type not in schema_labels:
+            schema_labels.update(bootstrap_schema([entity_type]))
+        entity_buffer.setdefault(entity_type, {})[name] = merged
+        stats["entities"] += 1
+
+    def buffered_rows():
+        return sum(map(len, entity_buffer.values())) + sum(map(len, relation_buffer.values()))
+
+    def flush():
+        # 先写实体再写关系，保证关系 MATCH 时端点已存在
+        entity_groups = {
+            entity_type: [{"name": name, "props": props} for name, props in rows.items()]
+            for entity_type, rows in entity_buffer.items()
+        }
+        for query, params in create_entity_unwind_queries(entity_groups, batch_size):
+            neo4j_client.run_write_cypher(query, params)
+            stats["batches"] += 1
+        for query, params in create_relation_unwind_queries(relation_buffer, batch_size):
+            neo4j_client.run_write_cypher(query, params)
+            stats["batches"] += 1
+        entity_buffer.clear()
+        relation_buffer.clear()
+        store.commit()
+
+    try:
+        for result in tqdm(iter_json_array_items(json_path), desc="流式导入", unit="条"):
+            stats["results"] += 1
+            extract_dict = result.get("extract_dict") or {}
+
+            for entity in extract_dict.get("entities") or []:
+                name = entity.get("name")
+                entity_type = entity.get("type")
+                attributes = entity.get("attributes") or {}
+                if not isinstance(attributes, dict):
+                    attributes = {}
+                if name and entity_type:
+                    buffer_entity(name, entity_type, attributes)
+
+            for relation in extract_dict.get("relations") or []:
+                relation_key = (relation.get("subject"), relation.get("subject_type"), relation.get("relation"),
+                                relation.get("object"), relation.get("object_type"))
+                if not all(relation_key):
+                    continue
+                subject, subject_type, relation_type, object_name, object_type = relation_key
+                # 关系端点也登记为实体，没有单独抽取的端点会补成无属性节点
+                buffer_entity(subject, subject_type, {})
+                buffer_entity(object_name, object_type, {})
+                if store.add_relation(relation_key):
+                    relation_buffer.setdefault((subject_type, relation_type, object_type), []).append(
+                        {"subject": subject, "object": object_name})
+                    stats["relations"] += 1
+
+            if buffered_rows() >= batch_size:
+                flush()
+        flush()
+    finally:
+        store.close()
+
+    print(f"\n文件 {json_path} 流式处理完成！耗时 {time.perf_counter() - start_time:.1f}s，"
+          f"结果 {stats['results']} 条，写入实体 {stats['entities']} 次，关系 {stats['relations']} 条，"
+          f"共 {stats['batches']} 批")
+    return stats
+
+
+def insert_to_neo4j(json_path, batch_size=1000, bulk=True, ensure_schema=True, streaming=False, relation_workers=1):
     """
     将 JSON 数据插入到 Neo4j
     :param json_path: JSON 文件路径
     :param batch_size: 批量插入的大小
+    :param bulk: True 使用按类型分组的 UNWIND 批量写入，False 使用逐条 MERGE 语句
+    :param ensure_schema: 写入前是否先建立 name 约束/索引
+    :param streaming: True 使用流式导入（见 stream_insert_to_neo4j），内存占用与文件大小无关
+    :param relation_workers: bulk 模式下写关系的并发会话数，大于 1 时按端点不相交的批次并行写入
     """
+    if streaming:
+        return stream_insert_to_neo4j(json_path, batch_size, ensure_schema=ensure_schema)
+
     print(f"\n开始处理文件: {json_path}")
     
     # 1. 加载数据
@@ -152,6 +426,18 @@ def insert_to_neo4j(json_path, batch_size=1000):
     print(f"  - 实体数量: {len(entities_dict)}")
     print(f"  - 关系数量: {len(relations_list)}")
     
+    if ensure_schema:
+        entity_types = {entity_type for _, entity_type in entities_dict}
+        for relation in relations_list:
+            entity_types.update((relation["subject_type"], relation["object_type"]))
+        bootstrap_schema(sorted(entity_types))
+
+    start_time = time.perf_counter()
+    if bulk:
+        bulk_insert_to_neo4j(entities_dict, relations_list, batch_size, relation_workers)
+        print(f"\n文件 {json_path} 处理完成！耗时 {time.perf_counter() - start_time:.1f}s")
+        return
+
     # 3. 生成实体查询
     print("\n正在生成实体查询...")
     entity_queries = create_entity_cypher_queries(entities_dict)
@@ -172,11 +458,133 @@ def insert_to_neo4j(json_path, batch_size=1000):
         batch = relation_queries[i:i + batch_size]
         neo4j_client.run_multiple_cypher(batch)
     
-    print(f"\n文件 {json_path} 处理完成！")
+    print(f"\n文件 {json_path} 处理完成！耗时 {time.perf_counter() - start_time:.1f}s")
+
+
+def create_entity_replace_queries(entity_groups, batch_size=1000):
+    """
+    属性有变化的实体整体替换属性（SET n = ...），上次有、这次没有的属性会被删掉
+    返回: List[Tuple[query, params]]
+    """
+    queries = []
+    for entity_type, rows in entity_groups.items():
+        query = (
+            "UNWIND $rows AS row "
+            f"MERGE (n:{check_cypher_identifier(entity_type)} {{name: row.name}}) "
+            "SET n = row.props, n.name = row.name"
+        )
+        for i in range(0, len(rows), batch_size):
+            queries.append((query, {"rows": rows[i:i + batch_size]}))
+    return queries
+
+
+def create_entity_delete_queries(entity_groups, batch_size=1000):
+    """删除不再出现的实体及其所有关系"""
+    queries = []
+    for entity_type, rows in entity_groups.items():
+        query = (
+            "UNWIND $rows AS row "
+            f"MATCH (n:{check_cypher_identifier(entity_type)} {{name: row.name}}) "
+            "DETACH DELETE n"
+        )
+        for i in range(0, len(rows), batch_size):
+            queries.append((query, {"rows": rows[i:i + batch_size]}))
+    return queries
+
+
+def create_relation_delete_queries(relation_groups, batch_size=1000):
+    """删除不再出现的关系，端点节点保留"""
+    queries = []
+    for (subject_type, relation_type, object_type), rows in relation_groups.items():
+        query = (
+            "UNWIND $rows AS row "
+            f"MATCH (s:{check_cypher_identifier(subject_type)} {{name: row.subject}})"
+            f"-[r:{check_cypher_identifier(relation_type)}]->"
+            f"(o:{check_cypher_identifier(object_type)} {{name: row.object}}) "
+            "DELETE r"
+        )
+        for i in range(0, len(rows), batch_size):
+            queries.append((query, {"rows": rows[i:i + batch_size]}))
+    return queries
 
 
-def main():
-    """主函数"""
+def delta_insert_to_neo4j(json_paths, manifest_path=DEFAULT_INGEST_MANIFEST_PATH, batch_size=1000,
+                          dry_run=False, ensure_schema=True, allow_deletes=False):
+    """
+    增量导入：与上次导入的清单对比，只写入新增、属性变化和删除的实体/关系
+    多个 JSON 文件合并成一份数据后再对比，同一实体在不同文件中的属性会先合并（需要把文件整体读入内存）
+    清单不存在时所有数据都视为新增，相当于一次全量导入；写入全部成功后才更新清单
+    :param json_paths: 抽取结果 JSON 文件路径列表
+    :param manifest_path: 清单文件路径
+    :param batch_size: 每条 UNWIND 语句携带的最大行数
+    :param dry_run: 只打印将要进行的变更，不写数据库也不更新清单
+    :param ensure_schema: 写入前是否建立 name 约束/索引
+    :param allow_deletes: 是否删除本次数据中已不存在的实体和关系。默认不删除，只报告，
+                          被截断或只重新抽取了一部分的文件不会误删图谱数据；确认报告（可先 dry_run）后再设为 True
+    :return: 各类变更的行数
+    """
+    start_time = time.perf_counter()
+    results = []
+    for json_path in json_paths:
+        results.extend(load_json_data(json_path).get("results", []))
+    entities_dict, relations_list = parse_entities_and_relations({"results": results})
+    entity_groups = group_entity_rows(entities_dict, relations_list)
+    relation_groups = group_relation_rows(relations_list)
+
+    old_manifest = load_manifest(manifest_path)
+    delta = compute_ingest_delta(entity_groups, relation_groups, old_manifest)
+    counts = count_delta_rows(delta)
+    print(f"\n增量对比完成（耗时 {time.perf_counter() - start_time:.1f}s）:")
+    print(f"  - 新增实体: {counts['entity_inserts']}，属性变化: {counts['entity_updates']}，"
+          f"删除实体: {counts['entity_deletes']}")
+    print(f"  - 新增关系: {counts['relation_inserts']}，删除关系: {counts['relation_deletes']}")
+
+    if dry_run:
+        for name, groups in delta.items():
+            if name == "manifest":
+                continue
+            for group_key, rows in groups.items():
+                print(f"  [{name}] {group_key}: {len(rows)} 行，例如 {rows[:3]}")
+        print("dry_run 模式，未写入数据库")
+        return counts
+
+    if ensure_schema and (delta["entity_inserts"] or delta["entity_updates"]):
+        bootstrap_schema(sorted(set(delta["entity_inserts"]) | set(delta["entity_updates"])))
+
+    manifest = delta["manifest"]
+    if not allow_deletes and (counts["entity_deletes"] or counts["relation_deletes"]):
+        print(f"⚠️ 本次数据中有 {counts['entity_deletes']} 个实体、{counts['relation_deletes']} 条关系已不存在，"
+              f"未删除（allow_deletes=False）；确认无误后以 allow_deletes=True 重新运行")
+        delta["entity_deletes"], delta["relation_deletes"] = {}, {}
+        manifest = retain_deleted_in_manifest(manifest, old_manifest)
+
+    # 先删关系，再写实体和新关系，最后删除实体（DETACH DELETE 会顺带清掉剩余关系）
+    entity_upserts = {}
+    for name in ("entity_inserts", "entity_updates"):
+        for entity_type, rows in delta[name].items():
+            entity_upserts.setdefault(entity_type, []).extend(
+                {"name": row["name"], "props": row["props"]} for row in rows)
+    queries = (
+        create_relation_delete_queries(delta["relation_deletes"], batch_size)
+        + create_entity_replace_queries(entity_upserts, batch_size)
+        + create_relation_unwind_queries(delta["relation_inserts"], batch_size)
+        + create_entity_delete_queries(delta["entity_deletes"], batch_size)
+    )
+    for query, params in tqdm(queries, desc="增量写入"):
+        neo4j_client.run_write_cypher(query, params)
+
+    save_manifest(manifest_path, manifest)
+    print(f"\n增量导入完成！共 {len(queries)} 批，耗时 {time.perf_counter() - start_time:.1f}s")
+    return counts
+
+
+def main(delta=False, dry_run=False, allow_deletes=False):
+    """
+    主函数
+    :param delta: False（默认）全量流式导入，内存占用与文件大小无关；True 使用增量导入（只写入与上次导入相比的变化）
+    :param dry_run: 增量导入时只打印变更报告，不写数据库
+    :param allow_deletes: 增量导入时是否删除本次数据中已不存在的实体和关系
+    """
     # 文件路径
     formula_json_path = get_file_path("__002__extract_information/extract_formula_data.json")
     herb_json_path = get_file_path("__002__extract_information/extract_herb_data.json")
@@ -185,11 +593,16 @@ def main():
     # print("正在清空数据库...")
     # neo4j_client.run_cypher("MATCH (n) DETACH DELETE n")
     
+    if delta:
+        delta_insert_to_neo4j([formula_json_path, herb_json_path], dry_run=dry_run, allow_deletes=allow_deletes)
+        print("\n所有数据插入完成！")
+        return
+
     # 插入方剂数据
-    insert_to_neo4j(formula_json_path)
+    insert_to_neo4j(formula_json_path, streaming=True)
     
     # 插入中药数据
-    insert_to_neo4j(herb_json_path)
+    insert_to_neo4j(herb_json_path, streaming=True)
     
     print("\n所有数据插入完成！")
 
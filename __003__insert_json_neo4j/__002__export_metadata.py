@@ -1,5 +1,6 @@
 from common.neo4j_manager import neo4j_client
 from common.path_utils import get_file_path
 
-# 导出元数据
-neo4j_client.export_tcm_metadata_to_json(get_file_path("__003__create_neo4j_database/tcm_metadata.json"))
\ No newline at end of file
+# 导出元数据（incremental=True 时只合并新发现的标签、属性和三元组，已有条目和手写描述不会被删除）
+neo4j_client.export_tcm_metadata_to_json(get_file_path("__003__insert_json_neo4j/tcm_metadata.json"),
+                                         probe_size=1000, incremental=True)
\ No newline at end of file
@@ -1,41 +1,101 @@
 import faiss
+import os
 import pickle
 
-from common.embedding_model import my_embedding_model
+from __003__insert_json_neo4j.__000__entity_dictionary_utils import build_entity_dictionary, get_index_labels
+from __003__insert_json_neo4j.__000__incremental_index_utils import update_faiss_index
+from common.config import Config
+from common.embedding_backends import write_backend_marker
+from common.embedding_model import EMBEDDING_BACKEND_KEY, my_embedding_model
+from common.faiss_index_utils import create_faiss_index, stable_text_id
 from common.neo4j_manager import neo4j_client
+from common.string_table import write_string_table
 
+conf = Config()
 
-def build_faiss_index(sentences, index_path="faiss.index", mapping_path="id2text.pkl"):
+
+def encode_sentences(sentences):
+    """建索引时批量编码名称，返回归一化的 float32 向量"""
+    return my_embedding_model.encode(sentences, convert_to_numpy=True, normalize_embeddings=True)
+
+
+def build_faiss_index(sentences, index_path="faiss.index", mapping_path="id2text.strtab", index_type=None,
+                      labels=None, **index_kwargs):
     """
     基于字符串列表构建 FAISS 索引并保存
     :param sentences: List[str] 输入的文本列表
     :param index_path: FAISS 索引保存路径
-    :param mapping_path: id->原始文本映射保存路径
+    :param mapping_path: id->原始文本映射保存路径，.strtab 写以稳定 id 为键的字符串表（可增量更新），
+                         .pkl 写按下标编号的 pickle 字典（旧格式）
+    :param index_type: flat / hnsw / ivf，None 时使用配置 ENTITY_INDEX_TYPE
+    :param labels: 可选，与 sentences 等长的标签列表，写入字符串表的标签列
+    :param index_kwargs: 透传给 create_faiss_index 的参数，如 hnsw_m、ivf_nlist
     """
-    # 1. 加载预训练文本向量模型
+    legacy = mapping_path.endswith(".pkl")
+    if not legacy:
+        # 稳定 id 要求名称唯一，重复的名称只保留第一次出现
+        keep = sorted({sentence: i for i, sentence in reversed(list(enumerate(sentences)))}.values())
+        sentences = [sentences[i] for i in keep]
+        labels = None if labels is None else [labels[i] for i in keep]
 
-    # 2. 生成向量
-    embeddings = my_embedding_model.encode(sentences, convert_to_numpy=True, normalize_embeddings=True)
+    # 1. 生成向量
+    embeddings = encode_sentences(sentences)
     print("embeddings.shape:", embeddings.shape)
-    # 3. 构建 FAISS 索引
-    dim = embeddings.shape[1]
-    index = faiss.IndexFlatL2(dim)  # L2距离,欧式距离
-    index.add(embeddings)
+    # 2. 构建 FAISS 索引（近似索引在这里完成训练），检索时 _load_index 会自动识别类型
+    index_type = index_type or conf.ENTITY_INDEX_TYPE
+    ids = None if legacy else [stable_text_id(sentence) for sentence in sentences]
+    index = create_faiss_index(embeddings, index_type, ids=ids, **index_kwargs)
+    print(f"索引类型: {index_type}")
 
-    # 4. 保存索引
-    faiss.write_index(index, index_path)
-
-    # 5. 保存 id -> 原始文本 映射
-    id2text = {i: s for i, s in enumerate(sentences)}
-    with open(mapping_path, "wb") as f:
-        pickle.dump(id2text, f)
+    # 3. 保存索引和 id -> 原始文本 映射
+    if legacy:
+        faiss.write_index(index, index_path)
+        id2text = {i: s for i, s in enumerate(sentences)}
+        with open(mapping_path, "wb") as f:
+            pickle.dump(id2text, f)
+    else:
+        write_string_table(mapping_path, sentences, labels=labels, node_ids=ids, keyed=True)
+        write_backend_marker(index_path, EMBEDDING_BACKEND_KEY)
+        tmp_path = f"{index_path}.tmp"
+        faiss.write_index(index, tmp_path)
+        os.replace(tmp_path, index_path)
 
     print(f"✅ 索引已保存到 {index_path}, 映射保存到 {mapping_path}")
 
 
-# 获取所有节点名称
-node_names = neo4j_client.get_all_node_names()
+def build_label_indexes(labels=None, incremental=True):
+    """
+    为每个标签单独构建一个索引，另外构建一个包含所有节点名称的合并索引作为兜底
+    实体词典与索引来自同一份节点数据，一起重建
+    :param labels: 标签列表，None 表示 tcm_metadata.json 中的全部标签
+    :param incremental: 为 True 时与已有索引做差集，只编码新增名称；为 False 时全量重建
+    """
+    build_entity_dictionary(labels)
+    totals = {"total": 0, "encoded": 0, "saved": 0}
+
+    def build(names, index_path, mapping_path, label=None):
+        if incremental:
+            stats = update_faiss_index(names, index_path, mapping_path, encode_sentences, conf.ENTITY_INDEX_TYPE,
+                                       label=label, backend_key=EMBEDDING_BACKEND_KEY)
+        else:
+            build_faiss_index(names, index_path=index_path, mapping_path=mapping_path,
+                              labels=None if label is None else [label] * len(names))
+            stats = {"total": len(set(names)), "encoded": len(set(names)), "saved": 0}
+        for key in totals:
+            totals[key] += stats[key]
+
+    for label in labels or get_index_labels():
+        names = neo4j_client.get_node_names_by_label(label)
+        if not names:
+            print(f"标签 {label} 下没有节点，跳过")
+            continue
+        build(names, *conf.entity_index_paths(label), label=label)
+
+    # 合并索引：按标签的索引缺失时使用，预过滤器也从它的映射读取已知实体名称
+    build(neo4j_client.get_all_node_names(), *conf.entity_index_paths())
+    print(f"✅ 索引共 {totals['total']} 条名称，编码 {totals['encoded']} 条，相比全量重建少编码 {totals['saved']} 条")
+
 
-# 将节点进行向量化
-build_faiss_index(node_names, index_path="neo4j_embedding_faiss.index",
-                  mapping_path="neo4j_embedding_faiss_id2text.pkl")
\ No newline at end of file
+if __name__ == '__main__':
+    # 将节点名称按标签分别向量化（已有索引时只编码新增名称）
+    build_label_indexes()
@@ -0,0 +1,72 @@
+import time
+
+from common.neo4j_manager import neo4j_client
+from common.path_utils import get_file_path
+from __003__insert_json_neo4j.__001__insert_json_to_neo4j import get_schema_labels, bootstrap_schema, insert_to_neo4j
+
+# 与 run_cypher_node 生成的查询形式一致：按 name IN [...] 过滤
+BENCHMARK_QUERIES = [
+    ("MATCH (s:Symptom)-[:ALLEVIATES_SYMPTOM]-(f:Formula) WHERE s.name IN $names "
+     "RETURN DISTINCT f.name AS formula_name", {"names": ["头痛", "咳嗽", "腹痛"]}),
+    ("MATCH (f:Formula)-[:HAS_INGREDIENT]->(h:Herb) WHERE f.name IN $names "
+     "RETURN f.name AS formula_name, collect(h.name) AS herbs", {"names": ["四君子汤", "桂枝汤", "十全大补汤"]}),
+    ("MATCH (h:Herb) WHERE h.name IN $names RETURN h.name AS name, h.effect AS effect",
+     {"names": ["人参", "黄芪", "当归", "甘草"]}),
+]
+
+
+def time_queries(repeat=20):
+    """每条查询执行 repeat 次，返回平均耗时（毫秒）"""
+    timings = []
+    for query, params in BENCHMARK_QUERIES:
+        neo4j_client.run_cypher(query, params)  # 预热
+        start = time.perf_counter()
+        for _ in range(repeat):
+            neo4j_client.run_cypher(query, params)
+        timings.append((time.perf_counter() - start) / repeat * 1000)
+    return timings
+
+
+def time_ingest(json_paths):
+    """清空数据库后导入，返回导入耗时（秒）"""
+    neo4j_client.run_cypher("MATCH (n) CALL { WITH n DETACH DELETE n } IN TRANSACTIONS OF 10000 ROWS")
+    start = time.perf_counter()
+    for json_path in json_paths:
+        insert_to_neo4j(json_path, ensure_schema=False)
+    return time.perf_counter() - start
+
+
+def benchmark_schema(json_paths=None, include_ingest=False):
+    """
+    对比有无 name 约束/索引时的查询耗时，include_ingest=True 时同时对比导入耗时
+    注意：include_ingest 会清空整个数据库后重新导入，只在测试库上使用
+    """
+    labels = get_schema_labels()
+    results = {}
+    for phase in ("无索引", "有索引"):
+        if phase == "无索引":
+            neo4j_client.drop_name_constraints(labels)
+        else:
+            bootstrap_schema(labels)
+        if include_ingest:
+            results[(phase, "导入(s)")] = time_ingest(json_paths)
+        for i, timing in enumerate(time_queries()):
+            results[(phase, f"查询{i + 1}(ms)")] = timing
+
+    print("\n" + "=" * 60)
+    metrics = sorted({metric for _, metric in results}, key=lambda m: (not m.startswith("导入"), m))
+    print(f"{'指标':<12}{'无索引':>14}{'有索引':>14}{'加速比':>10}")
+    for metric in metrics:
+        before = results[("无索引", metric)]
+        after = results[("有索引", metric)]
+        print(f"{metric:<12}{before:>14.2f}{after:>14.2f}{before / after if after else 0:>10.1f}x")
+    print("=" * 60)
+    return results
+
+
+if __name__ == '__main__':
+    benchmark_schema(
+        json_paths=[get_file_path("__002__extract_information/extract_formula_data.json"),
+                    get_file_path("__002__extract_information/extract_herb_data.json")],
+        include_ingest=False  # 设为True会清空数据库并重新导入，对比导入耗时
+    )
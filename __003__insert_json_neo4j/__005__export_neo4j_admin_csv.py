@@ -0,0 +1,127 @@
+"""
+离线全量重建：把抽取结果导出为 neo4j-admin database import 所需的 CSV
+
+每个标签一个节点文件，name 作为该标签 ID 空间内的稳定 ID，属性模型中的字段作为列；
+每种 (关系, 主体类型, 客体类型) 一个关系文件。导出结果按名称排序，同样的输入得到完全相同的文件。
+导入需要在数据库停止的状态下执行，命令见导出目录下的 import_command.txt。
+"""
+import csv
+import json
+import os
+import shutil
+
+from __002__extract_information.__000__extract_graph_data_utils import FormulaAttributes, HerbAttributes
+from __003__insert_json_neo4j.__001__insert_json_to_neo4j import (check_cypher_identifier, group_entity_rows,
+                                                                  group_relation_rows, load_json_data,
+                                                                  parse_entities_and_relations)
+from common.path_utils import get_file_path
+
+DEFAULT_EXPORT_DIR = get_file_path("__003__insert_json_neo4j/admin_import")
+
+# 有属性模型的标签按模型字段顺序输出列，其它标签只输出数据中出现过的属性
+LABEL_ATTRIBUTE_MODELS = {
+    "Formula": FormulaAttributes,
+    "Herb": HerbAttributes,
+}
+
+
+def get_attribute_columns(label, rows):
+    """属性模型中的字段在前，数据中出现但模型里没有的属性按名称排序追加在后"""
+    model = LABEL_ATTRIBUTE_MODELS.get(label)
+    columns = list(model.model_fields) if model else []
+    extra = sorted({key for row in rows for key in row["props"]} - set(columns))
+    return columns + extra
+
+
+def format_csv_value(value):
+    """None 写成空字段（导入为缺失属性），非字符串值序列化为 JSON 文本"""
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value
+    return json.dumps(value, ensure_ascii=False)
+
+
+def write_node_csv(path, label, rows):
+    columns = get_attribute_columns(label, rows)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow([f"name:ID({label})"] + columns + [":LABEL"])
+        for row in sorted(rows, key=lambda item: item["name"]):
+            writer.writerow([row["name"]] + [format_csv_value(row["props"].get(column)) for column in columns]
+                            + [label])
+    return columns
+
+
+def write_relationship_csv(path, subject_type, relation_type, object_type, rows):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow([f":START_ID({subject_type})", f":END_ID({object_type})", ":TYPE"])
+        for row in sorted(rows, key=lambda item: (item["subject"], item["object"])):
+            writer.writerow([row["subject"], row["object"], relation_type])
+
+
+def build_import_command(node_files, relationship_files, database="neo4j"):
+    """
+    生成 neo4j-admin 导入命令（Neo4j 5 语法），文件名使用相对导出目录的路径
+    标签和关系类型已写在 :LABEL / :TYPE 列中；属性值里有换行，必须加 --multiline-fields=true
+    """
+    parts = ["neo4j-admin database import full", database, "--overwrite-destination",
+             "--multiline-fields=true"]
+    parts += [f"--nodes={filename}" for filename in node_files]
+    parts += [f"--relationships={filename}" for filename in relationship_files]
+    return " \\\n  ".join(parts)
+
+
+def export_admin_import_csv(json_paths, output_dir=DEFAULT_EXPORT_DIR, database="neo4j"):
+    """
+    导出 neo4j-admin import 所需的 CSV，会先清空 output_dir
+    :param json_paths: 抽取结果 JSON 文件路径列表，多个文件合并后导出
+    :param output_dir: 导出目录
+    :param database: 导入命令中的目标数据库名
+    :return: {"nodes": {标签: 行数}, "relationships": {文件名: 行数}, "command": 导入命令}
+    """
+    results = []
+    for json_path in json_paths:
+        results.extend(load_json_data(json_path).get("results", []))
+    entities_dict, relations_list = parse_entities_and_relations({"results": results})
+    entity_groups = group_entity_rows(entities_dict, relations_list)
+    relation_groups = group_relation_rows(relations_list)
+
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.makedirs(output_dir)
+
+    summary = {"nodes": {}, "relationships": {}}
+    node_files = []
+    for label in sorted(entity_groups):
+        filename = f"nodes_{check_cypher_identifier(label)}.csv"
+        write_node_csv(os.path.join(output_dir, filename), label, entity_groups[label])
+        node_files.append(filename)
+        summary["nodes"][label] = len(entity_groups[label])
+
+    relationship_files = []
+    for subject_type, relation_type, object_type in sorted(relation_groups):
+        filename = (f"relationships_{check_cypher_identifier(relation_type)}_"
+                    f"{check_cypher_identifier(subject_type)}_{check_cypher_identifier(object_type)}.csv")
+        rows = relation_groups[(subject_type, relation_type, object_type)]
+        write_relationship_csv(os.path.join(output_dir, filename), subject_type, relation_type, object_type, rows)
+        relationship_files.append(filename)
+        summary["relationships"][filename] = len(rows)
+
+    command = build_import_command(node_files, relationship_files, database)
+    with open(os.path.join(output_dir, "import_command.txt"), "w", encoding="utf-8") as f:
+        f.write(f"# 在 {output_dir} 目录下、数据库停止状态执行\n{command}\n")
+    summary["command"] = command
+
+    print(f"\n导出完成: {output_dir}")
+    print(f"  - 节点: {sum(summary['nodes'].values())} 个，{len(node_files)} 个文件")
+    print(f"  - 关系: {sum(summary['relationships'].values())} 条，{len(relationship_files)} 个文件")
+    print(f"\n导入命令:\n{command}")
+    return summary
+
+
+if __name__ == '__main__':
+    export_admin_import_csv([
+        get_file_path("__002__extract_information/extract_formula_data.json"),
+        get_file_path("__002__extract_information/extract_herb_data.json"),
+    ])
@@ -0,0 +1,60 @@
+"""
+并行写关系的压测：同一份数据分别用 1/2/4/8 个会话写入关系，报告耗时和相对单会话的加速比
+注意：每次测量前会删除库中所有关系，只在测试库上运行
+"""
+import time
+
+from common.neo4j_manager import neo4j_client
+from common.path_utils import get_file_path
+from __003__insert_json_neo4j.__001__insert_json_to_neo4j import (bootstrap_schema, create_entity_unwind_queries,
+                                                                  group_entity_rows, group_relation_rows,
+                                                                  load_json_data, parallel_insert_relations,
+                                                                  parse_entities_and_relations)
+
+WORKER_COUNTS = [1, 2, 4, 8]
+
+
+def delete_all_relationships():
+    neo4j_client.run_cypher("MATCH ()-[r]->() CALL { WITH r DELETE r } IN TRANSACTIONS OF 10000 ROWS")
+
+
+def benchmark_parallel_ingest(json_paths, worker_counts=None, batch_size=1000):
+    """
+    先写入全部实体，再对每个并发数清空关系后重新写入并计时
+    :return: {并发数: 耗时秒数}
+    """
+    results = []
+    for json_path in json_paths:
+        results.extend(load_json_data(json_path).get("results", []))
+    entities_dict, relations_list = parse_entities_and_relations({"results": results})
+    relation_groups = group_relation_rows(relations_list)
+
+    entity_groups = group_entity_rows(entities_dict, relations_list)
+    bootstrap_schema(sorted(entity_groups))
+    # 实体只写一次，关系在下面按不同并发数分别写入
+    for query, params in create_entity_unwind_queries(entity_groups, batch_size):
+        neo4j_client.run_write_cypher(query, params)
+
+    timings = {}
+    for workers in worker_counts or WORKER_COUNTS:
+        delete_all_relationships()
+        start = time.perf_counter()
+        stats = parallel_insert_relations(relation_groups, batch_size, workers)
+        timings[workers] = time.perf_counter() - start
+        print(f"{workers} 个会话: {timings[workers]:.2f}s，{stats}")
+
+    baseline = timings[min(timings)]
+    print("\n" + "=" * 50)
+    print(f"{'会话数':<8}{'耗时(s)':>12}{'关系/秒':>12}{'加速比':>10}")
+    relation_count = sum(map(len, relation_groups.values()))
+    for workers, seconds in timings.items():
+        print(f"{workers:<8}{seconds:>12.2f}{relation_count / seconds:>12.0f}{baseline / seconds:>10.2f}x")
+    print("=" * 50)
+    return timings
+
+
+if __name__ == '__main__':
+    benchmark_parallel_ingest([
+        get_file_path("__002__extract_information/extract_formula_data.json"),
+        get_file_path("__002__extract_information/extract_herb_data.json"),
+    ])
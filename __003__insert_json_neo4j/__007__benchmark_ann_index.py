@@ -0,0 +1,108 @@
+"""
+近似索引的召回率/延迟压测：在合成向量上对比 flat、hnsw、ivf
+以 flat 的精确结果为基准报告 recall@k，并报告单条查询的 p50/p99 延迟（与实体匹配时逐条查询的方式一致）
+不依赖向量模型和数据库，合成向量带有聚类结构，比均匀随机向量更接近真实的名称向量分布
+"""
+import time
+
+import numpy as np
+
+from common.faiss_index_utils import configure_search_params, create_faiss_index
+
+VOCABULARY_SIZES = [10_000, 50_000, 100_000]
+DIM = 512
+TOP_K = 3
+QUERY_COUNT = 500
+
+# 待对比的索引配置：(名称, 索引类型, 建索引参数, 检索参数)
+INDEX_CONFIGS = [
+    ("flat", "flat", {}, {}),
+    ("hnsw32-ef64", "hnsw", {"hnsw_m": 32}, {"hnsw_ef_search": 64}),
+    ("hnsw32-ef128", "hnsw", {"hnsw_m": 32}, {"hnsw_ef_search": 128}),
+    ("ivf-nprobe8", "ivf", {}, {"ivf_nprobe": 8}),
+    ("ivf-nprobe32", "ivf", {}, {"ivf_nprobe": 32}),
+]
+
+
+def normalize(vectors):
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def generate_vectors(count, dim=DIM, cluster_count=None, seed=42):
+    """生成归一化的聚类向量：先随机取聚类中心，再在中心附近加噪声"""
+    rng = np.random.default_rng(seed)
+    cluster_count = cluster_count or max(1, count // 50)
+    centers = rng.standard_normal((cluster_count, dim), dtype=np.float32)
+    assignments = rng.integers(0, cluster_count, count)
+    vectors = centers[assignments] + 0.6 * rng.standard_normal((count, dim), dtype=np.float32)
+    return normalize(vectors).astype("float32")
+
+
+def generate_queries(vectors, count=QUERY_COUNT, seed=7):
+    """查询取自词表向量加扰动，模拟用户输入与实体名称相近但不完全相同"""
+    rng = np.random.default_rng(seed)
+    picked = vectors[rng.integers(0, len(vectors), count)]
+    return normalize(picked + 0.3 * rng.standard_normal(picked.shape, dtype=np.float32)).astype("float32")
+
+
+def measure_latency(index, queries, top_k=TOP_K):
+    """逐条查询，返回 (每条结果的 id 矩阵, 延迟毫秒数组)"""
+    ids = np.empty((len(queries), top_k), dtype="int64")
+    latencies = np.empty(len(queries))
+    for i in range(len(queries)):
+        start = time.perf_counter()
+        _, ids[i:i + 1] = index.search(queries[i:i + 1], top_k)
+        latencies[i] = (time.perf_counter() - start) * 1000
+    return ids, latencies
+
+
+def recall_at_k(ids, ground_truth):
+    hits = sum(len(set(row) & set(truth)) for row, truth in zip(ids, ground_truth))
+    return hits / ground_truth.size
+
+
+def benchmark_ann_index(sizes=None, configs=None, top_k=TOP_K, query_count=QUERY_COUNT):
+    """
+    :return: 结果列表，每项含 size、name、build_seconds（复用已建索引时为 None）、recall、p50_ms、p99_ms
+    """
+    results = []
+    for size in sizes or VOCABULARY_SIZES:
+        vectors = generate_vectors(size)
+        queries = generate_queries(vectors, query_count)
+        ground_truth = None
+        built = {}
+        for name, index_type, build_kwargs, search_kwargs in configs or INDEX_CONFIGS:
+            build_key = (index_type, tuple(sorted(build_kwargs.items())))
+            build_seconds = None  # 与前一个配置共用同一个索引，只改检索参数
+            if build_key not in built:
+                start = time.perf_counter()
+                built[build_key] = create_faiss_index(vectors, index_type, **build_kwargs)
+                build_seconds = time.perf_counter() - start
+            index = built[build_key]
+            configure_search_params(index, **search_kwargs)
+            ids, latencies = measure_latency(index, queries, top_k)
+            if ground_truth is None:
+                # 第一个配置须为 flat，作为精确基准
+                ground_truth = ids
+            results.append({
+                "size": size,
+                "name": name,
+                "build_seconds": build_seconds,
+                "recall": recall_at_k(ids, ground_truth),
+                "p50_ms": float(np.percentile(latencies, 50)),
+                "p99_ms": float(np.percentile(latencies, 99)),
+            })
+            print(f"词表 {size}，{name} 完成")
+
+    print("\n" + "=" * 76)
+    print(f"{'词表大小':<10}{'索引':<16}{'建索引(s)':>12}{f'recall@{top_k}':>12}{'p50(ms)':>12}{'p99(ms)':>12}")
+    for result in results:
+        build = "-" if result["build_seconds"] is None else f"{result['build_seconds']:.2f}"
+        print(f"{result['size']:<10}{result['name']:<16}{build:>12}{result['recall']:>12.3f}"
+              f"{result['p50_ms']:>12.3f}{result['p99_ms']:>12.3f}")
+    print("=" * 76)
+    return results
+
+
+if __name__ == '__main__':
+    benchmark_ann_index()
@@ -0,0 +1,96 @@
+"""
+id->文本 映射存储的压测：对比 pickle 字典与 mmap 字符串表的启动耗时、常驻内存增量和随机查找耗时
+每种格式在独立的子进程中加载，避免互相影响内存统计
+"""
+import json
+import os
+import pickle
+import random
+import subprocess
+import sys
+import tempfile
+
+from common.path_utils import get_file_path
+from common.string_table import write_string_table
+
+ENTRY_COUNTS = [100_000, 1_000_000]
+LOOKUP_COUNT = 100_000
+
+# 子进程中执行：加载映射并随机查找，输出 JSON 结果
+_LOAD_SCRIPT = """
+import json, random, sys, time
+sys.path.insert(0, {project_root!r})
+
+def rss_kb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+
+from common.string_table import load_id2text
+rss_before = rss_kb()
+start = time.perf_counter()
+id2text = load_id2text({path!r})
+load_seconds = time.perf_counter() - start
+rss_after_load = rss_kb()
+
+ids = [random.randrange(len(id2text)) for _ in range({lookup_count})]
+start = time.perf_counter()
+for i in ids:
+    id2text[i]
+lookup_us = (time.perf_counter() - start) / len(ids) * 1e6
+# mmap 的页在访问后才计入 RSS，查找之后再统计一次
+rss_after_lookup = rss_kb()
+print(json.dumps({{"load_seconds": load_seconds, "rss_mb": (rss_after_load - rss_before) / 1024,
+                  "rss_after_lookup_mb": (rss_after_lookup - rss_before) / 1024, "lookup_us": lookup_us}}))
+"""
+
+
+def generate_names(count, seed=42):
+    """生成类似实体名称的 2~8 字中文字符串"""
+    rng = random.Random(seed)
+    return ["".join(chr(rng.randint(0x4E00, 0x9FA5)) for _ in range(rng.randint(2, 8))) for _ in range(count)]
+
+
+def measure_load(path, lookup_count=LOOKUP_COUNT):
+    script = _LOAD_SCRIPT.format(project_root=get_file_path(""), path=path, lookup_count=lookup_count)
+    output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def benchmark_id2text_store(entry_counts=None):
+    """
+    :return: 结果列表，每项含 count、format、file_mb、load_seconds、rss_mb、rss_after_lookup_mb、lookup_us
+    """
+    results = []
+    work_dir = tempfile.mkdtemp(prefix="id2text_benchmark_")
+    try:
+        for count in entry_counts or ENTRY_COUNTS:
+            names = generate_names(count)
+            pickle_path = os.path.join(work_dir, f"id2text_{count}.pkl")
+            with open(pickle_path, "wb") as f:
+                pickle.dump({i: name for i, name in enumerate(names)}, f)
+            table_path = os.path.join(work_dir, f"id2text_{count}.strtab")
+            write_string_table(table_path, names)
+
+            for store_format, path in (("pickle", pickle_path), ("strtab", table_path)):
+                result = measure_load(path)
+                result.update({"count": count, "format": store_format, "file_mb": os.path.getsize(path) / 2 ** 20})
+                results.append(result)
+    finally:
+        for filename in os.listdir(work_dir):
+            os.remove(os.path.join(work_dir, filename))
+        os.rmdir(work_dir)
+
+    print("\n" + "=" * 86)
+    print(f"{'条数':<10}{'格式':<8}{'文件(MB)':>10}{'加载(s)':>10}{'加载后RSS(MB)':>14}{'查找后RSS(MB)':>14}"
+          f"{'查找(us)':>10}")
+    for result in results:
+        print(f"{result['count']:<10}{result['format']:<8}{result['file_mb']:>10.1f}{result['load_seconds']:>10.3f}"
+              f"{result['rss_mb']:>14.1f}{result['rss_after_lookup_mb']:>14.1f}{result['lookup_us']:>10.2f}")
+    print("=" * 86)
+    return results
+
+
+if __name__ == '__main__':
+    benchmark_id2text_store()
@@ -0,0 +1,51 @@
+"""
+大词表的流式索引构建：按 name 游标分页读取节点，固定大小的块在多进程中编码，逐块加入索引
+内存只随在途的块数增长，所有 CPU 核都参与编码；中断后重新运行从检查点继续
+与 __003__faiss_embedding.py 生成同样格式的索引（IndexIDMap2 + 以稳定 id 为键的字符串表），之后可照常增量更新；
+实体词典也一同重建
+"""
+from __003__insert_json_neo4j.__000__entity_dictionary_utils import build_entity_dictionary, get_index_labels
+from __003__insert_json_neo4j.__000__streaming_embedding_utils import stream_build_faiss_index
+from common.config import Config
+from common.embedding_backends import embedding_backend_key
+from common.neo4j_manager import neo4j_client
+
+conf = Config()
+
+
+def stream_build_index(label=None, chunk_size=256, workers=None, page_size=10000, resume=True):
+    """
+    :param label: 标签，None 表示合并索引
+    :param chunk_size: 每块编码的名称数
+    :param workers: 编码进程数
+    :param page_size: 每次从 Neo4j 读取的名称数
+    :param resume: 是否从上次中断的检查点继续
+    """
+    index_path, mapping_path = conf.entity_index_paths(label)
+    total = neo4j_client.count_node_names(label)
+    print(f"{label or '合并索引'}: 共 {total} 个名称")
+    return stream_build_faiss_index(
+        lambda after: neo4j_client.iter_node_name_pages(label, page_size, after),
+        index_path, mapping_path, total=total, index_type=conf.ENTITY_INDEX_TYPE,
+        chunk_size=chunk_size, workers=workers, resume=resume,
+        backend_key=embedding_backend_key(conf.EMBEDDING_BACKEND, conf.EMBEDDING_MODEL_PATH))
+
+
+def main(labels=None, chunk_size=256, workers=None, resume=True):
+    """为每个标签和合并索引依次流式构建，然后重建实体词典，最后汇总吞吐"""
+    labels = labels or get_index_labels()
+    results = {label: stream_build_index(label, chunk_size, workers, resume=resume) for label in labels}
+    results["合并索引"] = stream_build_index(None, chunk_size, workers, resume=resume)
+    # 实体抽取节点的词典快速路径依赖词典，与索引一起更新，避免继续匹配旧的名称
+    build_entity_dictionary(labels)
+
+    print("\n" + "=" * 56)
+    print(f"{'索引':<14}{'名称数':>10}{'本次编码':>10}{'耗时(s)':>10}{'names/s':>12}")
+    for name, stats in results.items():
+        print(f"{name:<14}{stats['total']:>10}{stats['encoded']:>10}{stats['seconds']:>10.1f}"
+              f"{stats['names_per_second']:>12.1f}")
+    print("=" * 56)
+
+
+if __name__ == '__main__':
+    main()
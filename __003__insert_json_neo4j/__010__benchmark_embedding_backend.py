@@ -0,0 +1,94 @@
+"""
+向量模型推理后端的压测：对比 torch、onnx、onnx-int8
+报告单条查询的 p50/p99 延迟、批量编码吞吐（names/s），以及与 torch 向量的余弦一致度和 top1 近邻一致率
+名称取自已构建的合并索引映射；缺少某个后端的依赖（onnxruntime、transformers）或模型含 ONNX 不支持的模块时跳过该后端
+"""
+import time
+
+import numpy as np
+
+from common.config import Config
+from common.embedding_backends import EMBEDDING_BACKENDS, load_embedding_model
+from common.string_table import load_id2text
+
+conf = Config()
+
+NAME_COUNT = 2000
+QUERY_COUNT = 200
+BATCH_SIZE = 64
+
+# 口语化的查询，用于测单条延迟和近邻一致率
+SAMPLE_QUERIES = ["头疼", "脑袋疼", "肚子疼", "睡不着", "咳嗽有痰", "四君子", "十全大补", "补气", "人参", "感冒发烧"]
+
+
+def load_sample_names(count=NAME_COUNT):
+    id2text = load_id2text(conf.ENTITY_ID2TEXT_PATH)
+    names = [name for name in id2text.values() if isinstance(name, str)]
+    return names[:count]
+
+
+def measure_single_latency(model, queries):
+    """逐条编码，返回延迟毫秒数组（与检索时一次请求只编码少量查询词的情况一致）"""
+    latencies = np.empty(len(queries))
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        model.encode([query], convert_to_numpy=True, normalize_embeddings=True)
+        latencies[i] = (time.perf_counter() - start) * 1000
+    return latencies
+
+
+def benchmark_embedding_backend(backends=None, name_count=NAME_COUNT, query_count=QUERY_COUNT):
+    """
+    :param backends: 待对比的后端，默认全部；第一个成功加载的后端作为一致度的基准，建议把 torch 放在第一个
+    :return: 结果列表，每项含 backend、p50_ms、p99_ms、names_per_second、mean_cosine、min_cosine、top1_agreement
+    """
+    names = load_sample_names(name_count)
+    queries = [SAMPLE_QUERIES[i % len(SAMPLE_QUERIES)] for i in range(query_count)]
+    print(f"名称 {len(names)} 条，查询 {len(queries)} 条")
+
+    results = []
+    reference = None  # (名称向量, 查询向量, 查询的 top1 近邻)
+    for backend in backends or EMBEDDING_BACKENDS:
+        try:
+            model = load_embedding_model(backend, conf.EMBEDDING_MODEL_PATH, conf.EMBEDDING_ONNX_DIR)
+        except (ImportError, OSError, RuntimeError, ValueError) as e:
+            print(f"后端 {backend} 加载失败，跳过: {e}")
+            continue
+        model.encode(queries[:8], convert_to_numpy=True, normalize_embeddings=True)  # 预热
+
+        latencies = measure_single_latency(model, queries)
+        start = time.perf_counter()
+        name_embs = np.asarray(model.encode(names, batch_size=BATCH_SIZE, convert_to_numpy=True,
+                                            normalize_embeddings=True), dtype="float32")
+        names_per_second = len(names) / (time.perf_counter() - start)
+        query_embs = np.asarray(model.encode(SAMPLE_QUERIES, convert_to_numpy=True, normalize_embeddings=True),
+                                dtype="float32")
+        top1 = (query_embs @ name_embs.T).argmax(axis=1)
+
+        if reference is None:
+            reference = (name_embs, query_embs, top1)
+        cosines = (name_embs * reference[0]).sum(axis=1)
+        results.append({
+            "backend": backend,
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p99_ms": float(np.percentile(latencies, 99)),
+            "names_per_second": names_per_second,
+            "mean_cosine": float(cosines.mean()),
+            "min_cosine": float(cosines.min()),
+            "top1_agreement": float((top1 == reference[2]).mean()),
+        })
+        print(f"后端 {backend} 完成")
+
+    print("\n" + "=" * 84)
+    print(f"{'后端':<12}{'p50(ms)':>10}{'p99(ms)':>10}{'names/s':>12}{'平均余弦':>12}{'最小余弦':>12}{'top1一致':>12}")
+    for result in results:
+        print(f"{result['backend']:<12}{result['p50_ms']:>10.2f}{result['p99_ms']:>10.2f}"
+              f"{result['names_per_second']:>12.1f}{result['mean_cosine']:>12.4f}{result['min_cosine']:>12.4f}"
+              f"{result['top1_agreement']:>12.2f}")
+    print("=" * 84)
+    print("注意：切换 EMBEDDING_BACKEND 后需用同一后端重新构建索引（__003__faiss_embedding.py 会自动全量重建）")
+    return results
+
+
+if __name__ == '__main__':
+    benchmark_embedding_backend()
@@ -0,0 +1,83 @@
+"""
+Cypher 生成提示词的压测：对比完整元数据与裁剪后的图谱结构
+报告提示词 token 数；run_llm=True 时再报告大模型耗时和生成 Cypher 的语法有效率（EXPLAIN 校验）
+"""
+import json
+import time
+
+from langchain_core.messages import HumanMessage
+
+from __004__langgraph.nodes.__005__generate_neo4j_cypher_node import build_cypher_prompt
+from common.token_utils import estimate_tokens
+
+# 覆盖各类匹配实体组合的样例问题
+BENCHMARK_STATES = [
+    {"input": "我脑袋疼该吃什么药？", "matched_symptoms": ["脑风头痛", "头顶痛", "头风脑痛"]},
+    {"input": "四君子汤由哪些药材组成？", "matched_formulas": ["四君子汤"]},
+    {"input": "人参有什么功效，出自哪本书？", "matched_herbs": ["人参"]},
+    {"input": "治疗感冒的方剂有哪些？", "matched_diseases": ["感冒"]},
+    {"input": "有哪些药能补气健脾？", "matched_effects": ["补气健脾", "益气健脾"]},
+    {"input": "《伤寒论》里有哪些方剂能治疗发热？", "matched_sources": ["伤寒论"], "matched_symptoms": ["发热"]},
+    {"input": "黄芪和当归一起能治什么病？", "matched_herbs": ["黄芪", "当归"]},
+    {"input": "中医怎么调理失眠？"},
+]
+
+PROMPT_VARIANTS = {
+    "完整元数据": {"prune_schema": False},
+    "裁剪结构1跳": {"prune_schema": True, "schema_hops": 1},
+    "裁剪结构2跳": {"prune_schema": True, "schema_hops": 2},
+}
+
+
+def generate_cypher(prompt):
+    """与 generate_neo4j_cypher_node 相同的调用和解析方式，返回 (cypher 列表, 耗时秒数)"""
+    from common.llm import my_llm
+
+    start = time.perf_counter()
+    response = my_llm.invoke([HumanMessage(content=prompt)])
+    elapsed = time.perf_counter() - start
+    try:
+        cypher_list = json.loads(response.content.strip()).get("cypher", [])
+    except (json.JSONDecodeError, AttributeError):
+        cypher_list = []
+    return cypher_list, elapsed
+
+
+def benchmark_cypher_prompt(states=None, run_llm=False):
+    """
+    :param states: 样例状态列表，默认 BENCHMARK_STATES
+    :param run_llm: 是否实际调用大模型并校验 Cypher（需要大模型和 Neo4j）
+    :return: {变体名: 统计结果}
+    """
+    states = states or BENCHMARK_STATES
+    results = {}
+    for name, kwargs in PROMPT_VARIANTS.items():
+        prompts = [build_cypher_prompt(dict(state), **kwargs) for state in states]
+        stats = {"avg_tokens": sum(map(estimate_tokens, prompts)) / len(prompts)}
+        if run_llm:
+            from common.neo4j_manager import neo4j_client
+
+            latencies = []
+            valid_count = 0
+            for prompt in prompts:
+                cypher_list, elapsed = generate_cypher(prompt)
+                latencies.append(elapsed)
+                # 生成了至少一条 Cypher 且全部通过 EXPLAIN 才算有效，与 check_cypher_node 一致
+                if cypher_list and all(neo4j_client.validate_cypher(cypher) for cypher in cypher_list):
+                    valid_count += 1
+            stats["avg_latency"] = sum(latencies) / len(latencies)
+            stats["valid_rate"] = valid_count / len(prompts)
+        results[name] = stats
+
+    print("\n" + "=" * 60)
+    print(f"{'变体':<14}{'平均token':>12}{'平均耗时(s)':>14}{'有效率':>10}")
+    for name, stats in results.items():
+        latency = f"{stats['avg_latency']:.2f}" if "avg_latency" in stats else "-"
+        valid_rate = f"{stats['valid_rate']:.0%}" if "valid_rate" in stats else "-"
+        print(f"{name:<14}{stats['avg_tokens']:>12.0f}{latency:>14}{valid_rate:>10}")
+    print("=" * 60)
+    return results
+
+
+if __name__ == '__main__':
+    benchmark_cypher_prompt(run_llm=False)  # 设为 True 会调用大模型并连接 Neo4j 校验语法
@@ -0,0 +1,102 @@
+"""
+实体匹配方式的评测：对比 dense（仅向量）、lexical（仅字符 n-gram）、hybrid（两者融合）
+报告匹配的精确率、召回率和单条查询的 p50/p99 延迟；向量模型不可用时只评测 lexical
+需要先用 __003__faiss_embedding.py 构建好索引
+"""
+import time
+
+import numpy as np
+
+from __004__langgraph.nodes import __004__match_entity_from_neo4j_node as match_node
+
+# 标注样例：(用户说法, 标签, 图谱中应匹配到的名称)，覆盖同义字、口语说法和缺字的变体
+BENCHMARK_QUERIES = [
+    ("头疼", "Symptom", {"头痛"}),
+    ("脑袋疼", "Symptom", {"头痛"}),
+    ("肚子疼", "Symptom", {"腹痛"}),
+    ("睡不着", "Symptom", {"失眠"}),
+    ("咳嗽", "Symptom", {"咳嗽"}),
+    ("四君子", "Formula", {"四君子汤"}),
+    ("十全大补", "Formula", {"十全大补汤"}),
+    ("六味地黄", "Formula", {"六味地黄丸"}),
+    ("人参", "Herb", {"人参"}),
+    ("当归", "Herb", {"当归"}),
+    ("感冒", "Disease", {"感冒"}),
+    ("补气", "Effect", {"补气"}),
+    ("伤寒", "Source", {"伤寒论"}),
+    ("本草纲目", "Source", {"本草纲目"}),
+]
+
+
+def filter_known_queries(queries):
+    """只保留期望名称在对应索引词表中存在的样例，图谱里没有的实体无法评测"""
+    known = []
+    for query, label, expected in queries:
+        _, id2text = match_node._load_index(label)
+        vocabulary = set(id2text.values())
+        expected = expected & vocabulary
+        if expected:
+            known.append((query, label, expected))
+        else:
+            print(f"跳过 {query}：期望名称不在 {label} 索引中")
+    return known
+
+
+def evaluate_mode(mode, queries, top_k=3):
+    """
+    逐条查询（与节点处理单个问题的方式一致），返回精确率、召回率和延迟
+    精确率 = 返回结果中正确的条数 / 返回的总条数；召回率 = 期望名称被找到的条数 / 期望名称总数
+    """
+    if match_node.query_embedding_cache is not None:
+        match_node.query_embedding_cache.clear()
+    returned = correct = expected_total = found = 0
+    latencies = []
+    for query, label, expected in queries:
+        start = time.perf_counter()
+        texts = match_node.search_faiss_batch({label: [query]}, top_k=top_k, mode=mode)[label][0]
+        latencies.append((time.perf_counter() - start) * 1000)
+        returned += len(texts)
+        correct += len(set(texts) & expected)
+        expected_total += len(expected)
+        found += len(expected & set(texts))
+    return {
+        "mode": mode,
+        "precision": correct / returned if returned else 0.0,
+        "recall": found / expected_total if expected_total else 0.0,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+
+def benchmark_entity_match(queries=None, modes=None, top_k=3):
+    """
+    :param queries: 标注样例，默认 BENCHMARK_QUERIES
+    :param modes: 待评测的匹配方式，默认全部；向量模型不可用时只评测 lexical
+    :return: 每种匹配方式的统计结果列表
+    """
+    queries = filter_known_queries(queries or BENCHMARK_QUERIES)
+    if not queries:
+        print("没有可评测的样例")
+        return []
+    modes = modes or match_node.MATCH_MODES
+    if match_node.encode_queries is None:
+        modes = ["lexical"]
+
+    # 预先加载索引和 n-gram 表，不计入查询延迟
+    for label in {label for _, label, _ in queries}:
+        match_node._load_lexical_index(match_node._load_index(label)[1])
+
+    results = [evaluate_mode(mode, queries, top_k) for mode in modes]
+
+    print("\n" + "=" * 60)
+    print(f"样例数: {len(queries)}")
+    print(f"{'匹配方式':<10}{'精确率':>10}{'召回率':>10}{'p50(ms)':>12}{'p99(ms)':>12}")
+    for result in results:
+        print(f"{result['mode']:<10}{result['precision']:>10.3f}{result['recall']:>10.3f}"
+              f"{result['p50_ms']:>12.3f}{result['p99_ms']:>12.3f}")
+    print("=" * 60)
+    return results
+
+
+if __name__ == '__main__':
+    benchmark_entity_match()
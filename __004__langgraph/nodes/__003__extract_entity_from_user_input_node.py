@@ -13,12 +13,55 @@ except ImportError:
     sys.path.insert(0, str(Path(__file__).parent.parent))
     import agent_state
     AgentState = agent_state.AgentState
+from common.config import Config
+from common.entity_matcher import EntityDictionary, has_leftover_content
 from common.llm import my_llm
 
+conf = Config()
+
+# 图谱实体词典，词典文件更新后自动重新加载
+entity_dictionary = EntityDictionary(conf.ENTITY_DICTIONARY_PATH)
+
+# 标签 -> 词典直接命中时写入的 matched_* 字段
+LABEL_MATCHED_FIELDS = {
+    "Symptom": "matched_symptoms",
+    "Disease": "matched_diseases",
+    "Formula": "matched_formulas",
+    "Herb": "matched_herbs",
+    "Effect": "matched_effects",
+    "Source": "matched_sources",
+}
+
+
+def match_entity_from_dictionary(state: AgentState) -> str:
+    """
+    用实体词典（名称和别名）在用户输入中做最长匹配，命中的标准名称直接写入 matched_* 字段
+    :return: 匹配上的片段遮掉后剩下的文本；剩下的只有疑问词、标点等时返回空字符串
+    """
+    user_input = state["input"]
+    matched, leftovers = entity_dictionary.match(user_input)
+    for label, names in matched.items():
+        matched_field = LABEL_MATCHED_FIELDS.get(label)
+        if matched_field:
+            state[matched_field] = list(dict.fromkeys(state.get(matched_field, []) + names))
+    if matched:
+        print(f"实体词典命中: {matched}")
+    if not has_leftover_content(leftovers):
+        return ""
+    # 命中的片段用空格隔开，避免大模型把前后文拼成新的实体
+    return " ".join(leftovers) if matched else user_input
+
 
 def extract_entity_from_user_input_node(state: AgentState) -> AgentState:
     print("开始从用户输入中抽取实体")
-    user_input = state["input"]
+    user_input = match_entity_from_dictionary(state)
+    if not user_input:
+        # 全部实体都已由词典命中，无需调用大模型
+        for field in ("user_input_symptoms", "user_input_diseases", "user_input_formulas",
+                      "user_input_herbs", "user_input_effects", "user_input_sources"):
+            state[field] = []
+        print("完成从用户输入中抽取实体（词典全部命中，跳过大模型）")
+        return state
 
     # 构建提示词
     prompt = f"""
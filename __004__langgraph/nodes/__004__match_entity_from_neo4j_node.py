@@ -1,5 +1,4 @@
 import faiss
-import pickle
 import sys
 from pathlib import Path
 
@@ -14,127 +13,266 @@ except ImportError:
     import agent_state
     AgentState = agent_state.AgentState
 from common.config import Config
-from common.embedding_model import my_embedding_model
+from common.embedding_backends import read_backend_marker
+from common.faiss_index_utils import configure_search_params, enable_reconstruct, reconstruct_similarities
+from common.lexical_index import NgramIndex
+from common.string_table import load_id2text, resolve_id2text_path
 
 conf = Config()
 
-# 索引和映射的懒加载变量
-_index = None
-_id2text = None
-
-
-def _load_index():
-    """懒加载索引和映射，仅在需要时加载"""
-    global _index, _id2text
-    if _index is None or _id2text is None:
-        import os
-        # 规范化路径，处理混合的路径分隔符
-        index_path = os.path.normpath(conf.ENTITY_INDEX_PATH)
-        id2text_path = os.path.normpath(conf.ENTITY_ID2TEXT_PATH)
-        
-        # 检查文件是否存在
-        if not os.path.exists(index_path):
-            raise FileNotFoundError(f"索引文件不存在: {index_path} (绝对路径: {os.path.abspath(index_path)})")
-        if not os.path.exists(id2text_path):
-            raise FileNotFoundError(f"映射文件不存在: {id2text_path} (绝对路径: {os.path.abspath(id2text_path)})")
-        
-        # 检查文件是否可读
-        if not os.access(index_path, os.R_OK):
-            raise PermissionError(f"索引文件不可读: {index_path}")
-        if not os.access(id2text_path, os.R_OK):
-            raise PermissionError(f"映射文件不可读: {id2text_path}")
-        
-        try:
-            # 使用绝对路径确保faiss能正确读取
-            abs_index_path = os.path.abspath(index_path)
-            abs_id2text_path = os.path.abspath(id2text_path)
-            
-            print(f"正在加载索引文件: {abs_index_path}")
-            # 确保路径是字符串格式
-            _index = faiss.read_index(str(abs_index_path))
-            
-            print(f"正在加载映射文件: {abs_id2text_path}")
-            with open(str(abs_id2text_path), "rb") as f:
-                _id2text = pickle.load(f)
-            print("索引和映射文件加载成功")
-        except Exception as e:
-            raise RuntimeError(f"加载索引文件失败: {e}, 索引路径: {abs_index_path}, 映射路径: {abs_id2text_path}") from e
-    return _index, _id2text
-
-
-def search_faiss(query, top_k=3, threshold=0.65):
+try:
+    from common.embedding_model import EMBEDDING_BACKEND_KEY, encode_queries, query_embedding_cache
+except Exception as e:
+    # 向量模型不可用（未安装 sentence-transformers 或模型文件缺失）时只用字符 n-gram 匹配
+    print(f"向量模型不可用: {e}，实体匹配只使用字符 n-gram")
+    EMBEDDING_BACKEND_KEY = encode_queries = query_embedding_cache = None
+
+# 匹配方式：hybrid / dense / lexical
+MATCH_MODES = ("hybrid", "dense", "lexical")
+
+# 索引和映射的懒加载缓存：{label: (index, id2text)}，None 为合并索引
+_indexes = {}
+# 已加载索引文件的修改时间：{label: mtime}，索引被增量更新替换后下次检索前重新加载
+_index_mtimes = {}
+# 索引文件不存在、退回合并索引的标签
+_fallback_labels = set()
+# n-gram 索引的懒加载缓存，按 id2text 对象区分，退回合并索引的标签共用一份
+_lexical_indexes = {}
+
+# user_input_* 字段 -> (matched_* 字段, 检索使用的标签索引)
+ENTITY_FIELD_ROUTES = {
+    "user_input_effects": ("matched_effects", "Effect"),
+    "user_input_diseases": ("matched_diseases", "Disease"),
+    "user_input_symptoms": ("matched_symptoms", "Symptom"),
+    "user_input_formulas": ("matched_formulas", "Formula"),
+    "user_input_herbs": ("matched_herbs", "Herb"),
+    "user_input_sources": ("matched_sources", "Source"),
+}
+
+
+def _load_index(label=None):
     """
-    在已有的 FAISS 索引中搜索，并设置相似度阈值
+    懒加载索引和映射，仅在需要时加载；索引文件的修改时间变化（增量更新完成）后重新加载并整体替换
+    :param label: 实体标签；该标签的索引文件不存在时退回到合并索引
     """
-    print("开始从faiss索引搜索")
-    
-    # 懒加载索引和映射
-    index, id2text = _load_index()
+    import os
+    index_path, id2text_path = conf.entity_index_paths(label)
+    id2text_path = resolve_id2text_path(id2text_path)
+    if label is not None and not (os.path.exists(index_path) and os.path.exists(id2text_path)):
+        if label not in _fallback_labels:
+            print(f"标签 {label} 的索引不存在，使用合并索引")
+            _fallback_labels.add(label)
+        return _load_index(None)
+    _fallback_labels.discard(label)
+
+    mtime = os.path.getmtime(index_path) if os.path.exists(index_path) else None
+    if label in _indexes and _index_mtimes.get(label) == mtime:
+        return _indexes[label]
+    if label in _indexes:
+        print(f"检测到索引 {index_path} 已更新，重新加载")
+
+    # 规范化路径，处理混合的路径分隔符
+    index_path = os.path.normpath(index_path)
+    id2text_path = os.path.normpath(id2text_path)
+
+    # 检查文件是否存在
+    if not os.path.exists(index_path):
+        raise FileNotFoundError(f"索引文件不存在: {index_path} (绝对路径: {os.path.abspath(index_path)})")
+    if not os.path.exists(id2text_path):
+        raise FileNotFoundError(f"映射文件不存在: {id2text_path} (绝对路径: {os.path.abspath(id2text_path)})")
+
+    # 检查文件是否可读
+    if not os.access(index_path, os.R_OK):
+        raise PermissionError(f"索引文件不可读: {index_path}")
+    if not os.access(id2text_path, os.R_OK):
+        raise PermissionError(f"映射文件不可读: {id2text_path}")
+
+    # 查询向量与索引向量须出自同一后端（torch / onnx / onnx-int8），旧索引没有后端标记时不检查
+    index_backend = read_backend_marker(index_path)
+    if EMBEDDING_BACKEND_KEY is not None and index_backend is not None and index_backend != EMBEDDING_BACKEND_KEY:
+        raise ValueError(f"索引 {index_path} 由向量后端 {index_backend} 构建，当前后端为 {EMBEDDING_BACKEND_KEY}，"
+                         f"请用当前后端重新构建索引或修改 EMBEDDING_BACKEND")
+
+    try:
+        # 使用绝对路径确保faiss能正确读取
+        abs_index_path = os.path.abspath(index_path)
+        abs_id2text_path = os.path.abspath(id2text_path)
+
+        print(f"正在加载索引文件: {abs_index_path}")
+        # 确保路径是字符串格式
+        index = faiss.read_index(str(abs_index_path))
+        # 近似索引（hnsw / ivf）按配置设置检索参数
+        index_type = configure_search_params(index, conf.HNSW_EF_SEARCH, conf.IVF_NPROBE)
+        # 融合匹配需要按 id 取回 n-gram 候选的向量
+        enable_reconstruct(index)
+        print(f"索引类型: {index_type}")
+
+        print(f"正在加载映射文件: {abs_id2text_path}")
+        # 字符串表通过 mmap 打开，按 id 直接取文本，不需要整体反序列化
+        id2text = load_id2text(str(abs_id2text_path))
+        print("索引和映射文件加载成功")
+    except Exception as e:
+        raise RuntimeError(f"加载索引文件失败: {e}, 索引路径: {abs_index_path}, 映射路径: {abs_id2text_path}") from e
+    # 先准备好新的索引和映射再一次性替换，正在进行的检索继续使用旧对象
+    previous = _indexes.get(label)
+    _indexes[label] = (index, id2text)
+    _index_mtimes[label] = mtime
+    if previous is not None:
+        _lexical_indexes.pop(id(previous[1]), None)
+    return _indexes[label]
+
+
+class _LexicalIndex:
+    """n-gram 索引及其文本下标到 FAISS id 的映射（稳定 id 索引的 FAISS id 不是下标）"""
+
+    def __init__(self, id2text):
+        self.faiss_ids = list(id2text.keys())
+        self.ngram_index = NgramIndex(id2text.values())
+
+    def search(self, query, top_k=3):
+        """:return: [(FAISS id, 归一化分数)]"""
+        return [(self.faiss_ids[i], score) for i, score in self.ngram_index.search(query, top_k)]
+
+
+def _load_lexical_index(id2text):
+    """懒加载 n-gram 索引，由向量索引的 id2text 构建，返回的 id 与 FAISS id 一致"""
+    key = id(id2text)
+    if key not in _lexical_indexes:
+        _lexical_indexes[key] = _LexicalIndex(id2text)
+        print(f"n-gram 索引构建完成: {len(id2text)} 条")
+    return _lexical_indexes[key]
 
-    # 生成查询向量
-    query_emb = my_embedding_model.encode([query], convert_to_numpy=True, normalize_embeddings=True)
 
-    # 检索 (返回 L2 距离)
-    dists, ids = index.search(query_emb, top_k)
+def resolve_match_mode(mode=None):
+    """未指定时使用配置的匹配方式；向量模型不可用时一律退回 lexical"""
+    mode = mode or conf.ENTITY_MATCH_MODE
+    if mode not in MATCH_MODES:
+        raise ValueError(f"不支持的匹配方式: {mode}，可选 {MATCH_MODES}")
+    return mode if encode_queries is not None else "lexical"
 
+
+def _filter_hits(dists, ids, id2text, threshold):
+    """
+    把一行检索结果转换为文本列表，丢弃未找到的位置和相似度低于阈值的结果
+    索引与映射不同步（如增量更新进行到一半）时映射里可能没有某个 id，跳过该结果而不是让整个查询失败
+    """
     results = []
-    for j, i in enumerate(ids[0]):
+    for dist, i in zip(dists, ids):
         if i == -1:  # 没找到
             continue
-        dist = dists[0][j]
         sim = 1.0 - dist / 2.0  # 转换成余弦相似度
-        if sim >= threshold:
-            results.append({"text": id2text[i], "similarity": float(sim)})
-    print("完成从faiss索引搜索")
+        text = id2text.get(i)
+        if text is not None and sim >= threshold:
+            results.append({"text": text, "similarity": float(sim)})
     return [result['text'] for result in results]
 
 
+def _fuse_hits(index, id2text, query_emb, dists, ids, lexical_hits, top_k, threshold):
+    """
+    融合向量和 n-gram 的结果：候选为两者 top_k 的并集，融合分数 = dense + w·lexical·(1 − dense)
+    n-gram 分数只会提高向量相似度，仅有向量命中的结果（如“脑袋疼”->“头痛”）不会被压到阈值以下
+    """
+    dense = {int(i): 1.0 - float(dist) / 2.0 for dist, i in zip(dists, ids)
+             if i != -1 and id2text.get(int(i)) is not None}
+    lexical = dict(lexical_hits)
+    missing = [i for i in lexical if i not in dense]
+    if missing:
+        sims = reconstruct_similarities(index, query_emb, missing)
+        dense.update(zip(missing, [0.0] * len(missing) if sims is None else sims.tolist()))
+    weight = conf.LEXICAL_WEIGHT
+    scored = sorted(((dense[i] + weight * lexical.get(i, 0.0) * (1.0 - dense[i]), i) for i in dense), reverse=True)
+    return [id2text[i] for score, i in scored[:top_k] if score >= threshold]
+
+
+def search_faiss_batch(queries_by_label, top_k=3, threshold=0.65, mode=None):
+    """
+    批量检索：所有查询词只调用一次 encode，每个索引只调用一次 index.search
+    :param queries_by_label: {标签: [查询词, ...]}，标签为 None 表示合并索引
+    :param mode: hybrid / dense / lexical，None 表示使用配置的 ENTITY_MATCH_MODE
+    :return: {标签: [[匹配文本, ...], ...]}，与输入的查询词一一对应，阈值按每个查询词单独过滤
+    """
+    mode = resolve_match_mode(mode)
+    print(f"开始从faiss索引批量搜索，匹配方式: {mode}")
+    unique_queries = list(dict.fromkeys(query for queries in queries_by_label.values() for query in queries))
+    if not unique_queries:
+        return {label: [] for label in queries_by_label}
+
+    if mode == "lexical":
+        results = {label: [] for label in queries_by_label}
+        for label, queries in queries_by_label.items():
+            if not queries:
+                continue
+            _, id2text = _load_index(label)
+            lexical_index = _load_lexical_index(id2text)
+            for query in queries:
+                results[label].append([id2text[i] for i, score in lexical_index.search(query, top_k)
+                                       if score >= conf.LEXICAL_THRESHOLD])
+        print("完成n-gram批量搜索")
+        return results
+
+    # 生成查询向量（先查缓存，未命中的一次前向计算）
+    query_embs = encode_queries(unique_queries)
+    row_of = {query: row for row, query in enumerate(unique_queries)}
+
+    # 按实际加载到的索引分组，索引缺失而退回合并索引的标签共用一次检索
+    groups = {}
+    for label, queries in queries_by_label.items():
+        if queries:
+            index, id2text = _load_index(label)
+            groups.setdefault(id(index), (index, id2text, []))[2].append(label)
+
+    results = {label: [] for label in queries_by_label}
+    for index, id2text, labels in groups.values():
+        rows = sorted({row_of[query] for label in labels for query in queries_by_label[label]})
+        # 检索 (返回 L2 距离)
+        dists, ids = index.search(query_embs[rows], top_k)
+        position_of = {row: position for position, row in enumerate(rows)}
+        lexical_index = _load_lexical_index(id2text) if mode == "hybrid" else None
+        for label in labels:
+            for query in queries_by_label[label]:
+                position = position_of[row_of[query]]
+                if lexical_index is None:
+                    results[label].append(_filter_hits(dists[position], ids[position], id2text, threshold))
+                else:
+                    results[label].append(_fuse_hits(index, id2text, query_embs[row_of[query]], dists[position],
+                                                     ids[position], lexical_index.search(query, top_k),
+                                                     top_k, threshold))
+    print(f"完成从faiss索引批量搜索，向量缓存: {query_embedding_cache.stats()}")
+    return results
+
+
+def search_faiss(query, top_k=3, threshold=0.65, label=None, mode=None):
+    """
+    在已有的 FAISS 索引中搜索，并设置相似度阈值
+    :param label: 只在该标签的索引中搜索，None 表示在合并索引中搜索
+    :param mode: hybrid / dense / lexical，None 表示使用配置的 ENTITY_MATCH_MODE
+    """
+    return search_faiss_batch({label: [query]}, top_k, threshold, mode)[label][0]
+
+
 def match_entity_from_neo4j_node(state: AgentState) -> AgentState:
     """
-        对六类实体分别在 FAISS 索引中进行匹配搜索：
+        对六类实体分别在各自标签的 FAISS 索引中进行匹配搜索：
         - Effect（功效）
         - Disease（疾病）
         - Symptom（症状）
         - Formula（方剂）
         - Herb（药材）
         - Source（出处）
+        所有查询词合并成一次向量计算，每个索引只检索一次；默认与字符 n-gram 结果融合
         """
-    user_input_effects = state.get("user_input_effects", [])
-    user_input_diseases = state.get("user_input_diseases", [])
-    user_input_symptoms = state.get("user_input_symptoms", [])
-    user_input_formulas = state.get("user_input_formulas", [])
-    user_input_herbs = state.get("user_input_herbs", [])
-    user_input_sources = state.get("user_input_sources", [])
-
-    matched_effects, matched_diseases, matched_symptoms = [], [], []
-    matched_formulas, matched_herbs, matched_sources = [], [], []
-
-    # 分别在 FAISS 中检索
-    for eff in user_input_effects:
-        matched_effects.extend(search_faiss(eff))
-
-    for dis in user_input_diseases:
-        matched_diseases.extend(search_faiss(dis))
-
-    for sym in user_input_symptoms:
-        matched_symptoms.extend(search_faiss(sym))
-
-    for form in user_input_formulas:
-        matched_formulas.extend(search_faiss(form))
-
-    for herb in user_input_herbs:
-        matched_herbs.extend(search_faiss(herb))
-
-    for src in user_input_sources:
-        matched_sources.extend(search_faiss(src))
-
-    # 存入 state
-    state["matched_effects"] = matched_effects
-    state["matched_diseases"] = matched_diseases
-    state["matched_symptoms"] = matched_symptoms
-    state["matched_formulas"] = matched_formulas
-    state["matched_herbs"] = matched_herbs
-    state["matched_sources"] = matched_sources
+    # 每类实体只在对应标签的索引中检索，症状不会匹配到药材名称，扫描的向量也更少
+    queries_by_label = {label: list(state.get(input_field, []))
+                        for input_field, (_, label) in ENTITY_FIELD_ROUTES.items()}
+    results = search_faiss_batch(queries_by_label)
+
+    for input_field, (matched_field, label) in ENTITY_FIELD_ROUTES.items():
+        # 保留实体抽取节点中由词典直接命中的结果，去重后追加向量检索结果
+        matched = list(state.get(matched_field, []))
+        for texts in results[label]:
+            matched.extend(texts)
+        # 存入 state
+        state[matched_field] = list(dict.fromkeys(matched))
 
     print("完成实体匹配搜索")
     return state
@@ -15,13 +15,18 @@ except ImportError:
 from common.config import Config
 from langchain_core.messages import HumanMessage
 from common.llm import my_llm
+from common.schema_context import build_schema_context, get_matched_labels
 
 conf = Config()
 
 
-def generate_neo4j_cypher_node(state: AgentState) -> AgentState:
-    print("开始生成neo4j的cypher语句")
-
+def build_cypher_prompt(state: AgentState, prune_schema: bool = True, schema_hops: int = None) -> str:
+    """
+    构建生成 Cypher 的提示词
+    :param state: 当前状态，需包含 input 和 matched_* 字段
+    :param prune_schema: True 时只放入从匹配实体标签出发可达的紧凑图谱结构，False 时放入完整的元数据 JSON
+    :param schema_hops: 裁剪时从匹配标签扩展的跳数，None 时使用 conf.SCHEMA_PRUNE_HOPS
+    """
     user_input = state["input"]
 
     # 从 state 取出所有匹配到的实体
@@ -32,7 +37,12 @@ def generate_neo4j_cypher_node(state: AgentState) -> AgentState:
     matched_herbs = state.get("matched_herbs", [])
     matched_sources = state.get("matched_sources", [])
 
-    meta_data = conf.TCM_METADATA  # 知识图谱元数据（节点、关系定义等）
+    if prune_schema:
+        # 每个三元组一行，只保留从匹配到的实体类型出发若干跳内可达的部分（多跳查询如 药材->方剂->疾病 仍可生成）
+        hops = conf.SCHEMA_PRUNE_HOPS if schema_hops is None else schema_hops
+        meta_data = build_schema_context(conf.TCM_METADATA, get_matched_labels(state), hops=hops)
+    else:
+        meta_data = conf.TCM_METADATA  # 知识图谱元数据（节点、关系定义等）
 
     # # 格式化匹配到的实体，确保只保留文本内容
     # def format_entities(entities):
@@ -76,6 +86,13 @@ def generate_neo4j_cypher_node(state: AgentState) -> AgentState:
     }}
     3. 不得包含任何解释或额外文字。
     """
+    return prompt
+
+
+def generate_neo4j_cypher_node(state: AgentState) -> AgentState:
+    print("开始生成neo4j的cypher语句")
+
+    prompt = build_cypher_prompt(state)
 
     # 调用大模型
     response = my_llm.invoke([HumanMessage(content=prompt)])
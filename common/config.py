@@ -29,13 +29,47 @@ class Config:
             self.TCM_METADATA = open(tcm_metadata_path, "r", encoding="utf-8").read()
         else:
             self.TCM_METADATA = "{}"  # 默认空JSON，避免文件不存在时报错
+        # 生成 Cypher 时裁剪图谱结构：从匹配到的实体标签沿关系扩展的跳数
+        self.SCHEMA_PRUNE_HOPS = int(os.getenv("SCHEMA_PRUNE_HOPS", "2"))
 
         # embedding模型
         self.EMBEDDING_MODEL_PATH = os.getenv("EMBEDDING_MODEL_PATH")
+        # 推理后端：torch / onnx / onnx-int8；索引必须用与查询相同的后端构建
+        self.EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+        # ONNX 模型目录，为空时使用 EMBEDDING_MODEL_PATH 同级的 “<模型目录>-onnx”，不存在时自动导出
+        self.EMBEDDING_ONNX_DIR = os.getenv("EMBEDDING_ONNX_DIR") or None
+        # 推理线程数，0 表示使用后端默认值（全部核）；多进程编码时由工作进程按核数分配
+        self.EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))
+        # 查询向量缓存：容量（条），持久化文件路径（为空表示不持久化）
+        self.EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+        self.EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH") or None
         #
         # # index的路径
         self.ENTITY_INDEX_PATH = get_file_path("__003__insert_json_neo4j/neo4j_embedding_faiss.index")
-        self.ENTITY_ID2TEXT_PATH = get_file_path("__003__insert_json_neo4j/neo4j_embedding_faiss_id2text.pkl")
+        # id->文本 映射使用可 mmap 的字符串表（common/string_table.py），不存在时读取同名的旧 .pkl
+        self.ENTITY_ID2TEXT_PATH = get_file_path("__003__insert_json_neo4j/neo4j_embedding_faiss_id2text.strtab")
+        # 实体词典（名称和别名 -> 标签），与向量索引一同构建，用于在大模型抽取前直接匹配实体
+        self.ENTITY_DICTIONARY_PATH = get_file_path("__003__insert_json_neo4j/neo4j_entity_dictionary.json")
+        # 索引类型（flat / hnsw / ivf）及近似索引的检索参数
+        self.ENTITY_INDEX_TYPE = os.getenv("ENTITY_INDEX_TYPE", "flat")
+        self.HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))
+        self.IVF_NPROBE = int(os.getenv("IVF_NPROBE", "16"))
+        # 实体匹配方式：hybrid（向量 + 字符 n-gram 融合）/ dense（仅向量）/ lexical（仅 n-gram，向量模型不可用时自动使用）
+        self.ENTITY_MATCH_MODE = os.getenv("ENTITY_MATCH_MODE", "hybrid")
+        # 融合时 n-gram 分数的权重，及仅用 n-gram 匹配时的相似度阈值
+        self.LEXICAL_WEIGHT = float(os.getenv("LEXICAL_WEIGHT", "0.5"))
+        self.LEXICAL_THRESHOLD = float(os.getenv("LEXICAL_THRESHOLD", "0.6"))
+
+    def entity_index_paths(self, label=None):
+        """
+        向量索引和 id->文本 映射的路径
+        :param label: 实体标签，如 Herb；None 表示包含全部标签的合并索引
+        :return: (index_path, id2text_path)
+        """
+        if label is None:
+            return self.ENTITY_INDEX_PATH, self.ENTITY_ID2TEXT_PATH
+        return (get_file_path(f"__003__insert_json_neo4j/neo4j_embedding_faiss_{label}.index"),
+                get_file_path(f"__003__insert_json_neo4j/neo4j_embedding_faiss_{label}_id2text.strtab"))
 
 
 if __name__ == '__main__':
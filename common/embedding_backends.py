@@ -0,0 +1,204 @@
+import json
+import os
+from typing import List, Optional, Union
+
+import numpy as np
+
+# 可选的推理后端：torch 为原来的 SentenceTransformer；onnx 为导出的 ONNX Runtime 图；onnx-int8 为动态 int8 量化后的图
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+ONNX_MODEL_FILES = {"onnx": "model.onnx", "onnx-int8": "model_int8.onnx"}
+
+
+def embedding_backend_key(backend: str, model_path: Optional[str]) -> str:
+    """
+    向量来源的标识（后端 + 模型），不同后端得到的向量有细微差别，索引和查询必须使用相同的标识
+    """
+    return f"{backend}:{os.path.basename(os.path.normpath(model_path)) if model_path else ''}"
+
+
+def _read_json(path, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# ONNX 推理支持的池化方式，对应 Pooling 配置中的 pooling_mode_cls_token / mean_tokens / max_tokens
+ONNX_POOLING_MODES = {"pooling_mode_cls_token": "cls", "pooling_mode_mean_tokens": "mean",
+                      "pooling_mode_max_tokens": "max"}
+
+
+def read_onnx_pipeline(model_path: str) -> dict:
+    """
+    检查 SentenceTransformer 模型的模块组成，确认导出的 ONNX 图加上 OnnxSentenceEncoder 的池化能得到相同的向量
+    只支持 Transformer + Pooling（cls / mean / max 之一）+ 可选的 Normalize；
+    含 Dense 等其它模块或其它池化方式时抛出 ValueError，此时应使用 torch 后端
+    :return: {"pooling_mode": cls / mean / max, "normalize": 是否带 Normalize 模块}
+    """
+    modules = _read_json(os.path.join(model_path, "modules.json"), None)
+    if modules is None:
+        # 没有 modules.json 的普通 transformers 模型，SentenceTransformer 默认使用 mean 池化
+        return {"pooling_mode": "mean", "normalize": False}
+
+    module_types = [module.get("type", "").rsplit(".", 1)[-1] for module in modules]
+    if module_types not in (["Transformer", "Pooling"], ["Transformer", "Pooling", "Normalize"]):
+        raise ValueError(f"模型 {model_path} 的模块为 {module_types}，ONNX 后端只支持 "
+                         f"Transformer + Pooling (+ Normalize)，请使用 torch 后端")
+    pooling = modules[module_types.index("Pooling")]
+    config = _read_json(os.path.join(model_path, pooling.get("path", ""), "config.json"), {})
+    enabled = [key for key, value in config.items() if key.startswith("pooling_mode_") and value is True]
+    if len(enabled) != 1 or enabled[0] not in ONNX_POOLING_MODES:
+        raise ValueError(f"模型 {model_path} 的池化方式为 {enabled}，ONNX 后端只支持 "
+                         f"{list(ONNX_POOLING_MODES.values())} 之一，请使用 torch 后端")
+    return {"pooling_mode": ONNX_POOLING_MODES[enabled[0]], "normalize": "Normalize" in module_types}
+
+
+def export_onnx(model_path: str, onnx_dir: str, opset: int = 14) -> str:
+    """
+    把 SentenceTransformer 模型中的 Transformer 部分导出为 ONNX（动态 batch 和序列长度），
+    并把分词器、池化方式、是否归一化和最大长度一起保存到 onnx_dir；模块组成见 read_onnx_pipeline
+    :return: 导出的 model.onnx 路径
+    """
+    pipeline = read_onnx_pipeline(model_path)  # 不支持的模块组成在导出前报错
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(onnx_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    model = AutoModel.from_pretrained(model_path).eval()
+    inputs = tokenizer(["中医知识图谱"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in inputs]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]}
+
+    onnx_path = os.path.join(onnx_dir, ONNX_MODEL_FILES["onnx"])
+    with torch.no_grad():
+        torch.onnx.export(model, tuple(inputs[name] for name in input_names), onnx_path,
+                          input_names=input_names, output_names=["last_hidden_state"],
+                          dynamic_axes=dynamic_axes, opset_version=opset)
+    tokenizer.save_pretrained(onnx_dir)
+    max_seq_length = _read_json(os.path.join(model_path, "sentence_bert_config.json"), {}).get("max_seq_length", 512)
+    with open(os.path.join(onnx_dir, "encoder_config.json"), "w", encoding="utf-8") as f:
+        json.dump({**pipeline, "max_seq_length": max_seq_length}, f)
+    print(f"✅ ONNX 模型已导出到 {onnx_path}")
+    return onnx_path
+
+
+def quantize_onnx(onnx_dir: str) -> str:
+    """对导出的 ONNX 模型做动态 int8 量化（权重 int8，激活在运行时量化），不需要校准数据"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantized_path = os.path.join(onnx_dir, ONNX_MODEL_FILES["onnx-int8"])
+    quantize_dynamic(os.path.join(onnx_dir, ONNX_MODEL_FILES["onnx"]), quantized_path, weight_type=QuantType.QInt8)
+    print(f"✅ int8 量化模型已保存到 {quantized_path}")
+    return quantized_path
+
+
+class OnnxSentenceEncoder:
+    """
+    用 ONNX Runtime 推理的句向量模型，encode 的参数和返回值与 SentenceTransformer.encode 一致
+
+    Args:
+        onnx_dir: export_onnx 的输出目录
+        model_file: model.onnx 或 model_int8.onnx
+        threads: ONNX Runtime 的线程数，None 表示使用默认值（全部核）
+    """
+
+    def __init__(self, onnx_dir: str, model_file: str = ONNX_MODEL_FILES["onnx"], threads: Optional[int] = None):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(os.path.join(onnx_dir, model_file), options,
+                                            providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(onnx_dir)
+        config = _read_json(os.path.join(onnx_dir, "encoder_config.json"), {})
+        self.pooling_mode = config.get("pooling_mode", "mean")
+        self.normalize = config.get("normalize", False)  # 模型带 Normalize 模块时与 SentenceTransformer 一样总是归一化
+        self.max_seq_length = config.get("max_seq_length", 512)
+
+    def _pool(self, hidden: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        if self.pooling_mode == "cls":
+            return hidden[:, 0]
+        mask = attention_mask[:, :, None].astype(hidden.dtype)
+        if self.pooling_mode == "max":
+            return np.where(mask > 0, hidden, -1e9).max(axis=1)
+        return (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32, convert_to_numpy: bool = True,
+               normalize_embeddings: bool = False, **kwargs) -> np.ndarray:
+        single = isinstance(sentences, str)
+        sentences = [sentences] if single else list(sentences)
+        # 与 SentenceTransformer 一样按长度排序后分批，减少填充
+        order = np.argsort([-len(sentence) for sentence in sentences], kind="stable")
+        embeddings = [None] * len(sentences)
+        for start in range(0, len(sentences), batch_size):
+            batch = [sentences[i] for i in order[start:start + batch_size]]
+            inputs = self.tokenizer(batch, padding=True, truncation=True, max_length=self.max_seq_length,
+                                    return_tensors="np")
+            feed = {name: value.astype("int64") for name, value in inputs.items() if name in self.input_names}
+            hidden = self.session.run(None, feed)[0]
+            pooled = self._pool(hidden, inputs["attention_mask"])
+            for position, vector in zip(order[start:start + batch_size], pooled):
+                embeddings[position] = vector
+        result = np.asarray(embeddings, dtype="float32").reshape(len(sentences), -1)
+        if normalize_embeddings or self.normalize:
+            result /= np.clip(np.linalg.norm(result, axis=1, keepdims=True), 1e-12, None)
+        return result[0] if single else result
+
+
+def load_embedding_model(backend: str, model_path: str, onnx_dir: Optional[str] = None, threads: int = 0):
+    """
+    按后端加载句向量模型，返回的对象都提供与 SentenceTransformer 相同的 encode
+    onnx / onnx-int8 的模型文件不存在时先从 model_path 导出（并量化）
+    :param threads: 推理线程数，0 表示使用后端默认值
+    """
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"不支持的向量模型后端: {backend}，可选 {EMBEDDING_BACKENDS}")
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        return SentenceTransformer(model_path)
+
+    onnx_dir = prepare_onnx_model(backend, model_path, onnx_dir)
+    return OnnxSentenceEncoder(onnx_dir, ONNX_MODEL_FILES[backend], threads or None)
+
+
+def prepare_onnx_model(backend: str, model_path: str, onnx_dir: Optional[str] = None) -> Optional[str]:
+    """
+    onnx / onnx-int8 的模型文件不存在时从 model_path 导出（并量化），torch 后端不做任何事
+    模型含 ONNX 后端不支持的模块时抛出 ValueError（见 read_onnx_pipeline）
+    多进程编码前应在主进程先调用一次，避免各工作进程同时导出、互相覆盖同一个文件
+    :return: ONNX 模型目录，torch 后端返回 None
+    """
+    if backend == "torch":
+        return None
+    read_onnx_pipeline(model_path)  # 之前导出的文件同样要求模型能被 ONNX 后端等价推理
+    onnx_dir = onnx_dir or f"{os.path.normpath(model_path)}-onnx"
+    if not os.path.exists(os.path.join(onnx_dir, ONNX_MODEL_FILES["onnx"])):
+        export_onnx(model_path, onnx_dir)
+    if backend == "onnx-int8" and not os.path.exists(os.path.join(onnx_dir, ONNX_MODEL_FILES["onnx-int8"])):
+        quantize_onnx(onnx_dir)
+    return onnx_dir
+
+
+def backend_marker_path(index_path: str) -> str:
+    return f"{index_path}.backend.json"
+
+
+def write_backend_marker(index_path: str, backend_key: str):
+    """在索引旁记录构建它所用的向量后端"""
+    tmp_path = f"{backend_marker_path(index_path)}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"backend": backend_key}, f, ensure_ascii=False)
+    os.replace(tmp_path, backend_marker_path(index_path))
+
+
+def read_backend_marker(index_path: str) -> Optional[str]:
+    """:return: 构建索引所用的后端标识；旧索引没有记录时返回 None"""
+    return _read_json(backend_marker_path(index_path), {}).get("backend")
@@ -0,0 +1,143 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Optional
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """
+    查询向量的 LRU 缓存，键为输入文本
+
+    所有向量存放在一个预分配的 float32 矩阵中，字典里只记录文本到行号的映射，
+    不为每条缓存单独保存 numpy 对象；淘汰最久未使用的条目时复用其所在行。
+
+    Args:
+        capacity: 最多缓存的条目数
+        persist_path: 持久化文件路径（.npz），None 表示不持久化
+        model_key: 生成向量的模型标识，持久化文件中的标识与之不同时不加载，避免混用不同模型的向量
+    """
+
+    def __init__(self, capacity: int = 10000, persist_path: Optional[str] = None, model_key: str = ""):
+        self.capacity = capacity
+        self.persist_path = persist_path
+        self.model_key = model_key
+        self.lock = threading.Lock()
+        self._slots = OrderedDict()  # 文本 -> 矩阵行号，按最近使用排序
+        self._free_rows = []
+        self._vectors = None
+        self.hits = 0
+        self.misses = 0
+        if persist_path and os.path.exists(persist_path):
+            self.load()
+
+    def _allocate(self, dim: int):
+        self._vectors = np.zeros((self.capacity, dim), dtype="float32")
+        self._free_rows = list(range(self.capacity - 1, -1, -1))
+
+    def get_many(self, texts: List[str]):
+        """
+        :return: (向量矩阵, 未命中的下标列表)；未命中的行为 0，需由调用方填入
+        """
+        with self.lock:
+            if self._vectors is None:
+                self.misses += len(texts)
+                return None, list(range(len(texts)))
+            result = np.zeros((len(texts), self._vectors.shape[1]), dtype="float32")
+            missing = []
+            for position, text in enumerate(texts):
+                row = self._slots.get(text)
+                if row is None:
+                    missing.append(position)
+                    continue
+                self._slots.move_to_end(text)
+                result[position] = self._vectors[row]
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+            return result, missing
+
+    def put_many(self, texts: List[str], vectors: np.ndarray):
+        """写入（或更新）多条向量，超出容量时淘汰最久未使用的条目"""
+        with self.lock:
+            if self._vectors is None:
+                self._allocate(vectors.shape[1])
+            for text, vector in zip(texts, vectors):
+                row = self._slots.get(text)
+                if row is None:
+                    if self._free_rows:
+                        row = self._free_rows.pop()
+                    else:
+                        _, row = self._slots.popitem(last=False)
+                    self._slots[text] = row
+                else:
+                    self._slots.move_to_end(text)
+                self._vectors[row] = vector
+
+    def get_or_compute(self, texts: List[str], compute: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """
+        返回 texts 的向量，只对未命中的文本调用 compute（一次批量调用）
+        :param compute: 接收文本列表、返回 float32 向量矩阵的函数
+        """
+        result, missing = self.get_many(texts)
+        if not missing:
+            return result
+        missing_texts = list(dict.fromkeys(texts[position] for position in missing))
+        computed = np.asarray(compute(missing_texts), dtype="float32")
+        self.put_many(missing_texts, computed)
+        if result is None:
+            result = np.zeros((len(texts), computed.shape[1]), dtype="float32")
+        row_of = {text: row for row, text in enumerate(missing_texts)}
+        for position in missing:
+            result[position] = computed[row_of[texts[position]]]
+        return result
+
+    def clear(self):
+        """清空缓存和命中统计（压测时用于对比冷启动延迟）"""
+        with self.lock:
+            self._slots.clear()
+            self._vectors = None
+            self._free_rows = []
+            self.hits = self.misses = 0
+
+    def stats(self) -> dict:
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._slots),
+                "capacity": self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+    def save(self):
+        """按最近使用顺序保存到 persist_path，重启后可继续命中"""
+        if not self.persist_path:
+            return
+        with self.lock:
+            if self._vectors is None:
+                return
+            texts = list(self._slots)
+            rows = [self._slots[text] for text in texts]
+            tmp_path = f"{self.persist_path}.tmp.npz"
+            np.savez(tmp_path, texts=np.array(texts, dtype=str), vectors=self._vectors[rows],
+                     model_key=np.array(self.model_key))
+        os.replace(tmp_path, self.persist_path)
+
+    def load(self):
+        """读取 persist_path，模型标识不一致或文件损坏时忽略"""
+        try:
+            with np.load(self.persist_path, allow_pickle=False) as data:
+                if str(data["model_key"]) != self.model_key:
+                    print(f"向量缓存 {self.persist_path} 由其他模型生成，忽略")
+                    return
+                texts = [str(text) for text in data["texts"]]
+                vectors = data["vectors"]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"读取向量缓存失败: {e}，从空缓存开始")
+            return
+        keep = min(len(texts), self.capacity)
+        if keep:
+            self.put_many(texts[-keep:], vectors[-keep:])
+        print(f"已加载向量缓存 {keep} 条")
@@ -1,7 +1,31 @@
-from sentence_transformers import SentenceTransformer
+import atexit
 
 from common.config import Config
+from common.embedding_backends import embedding_backend_key, load_embedding_model
+from common.embedding_cache import EmbeddingCache
 
 conf = Config()
 
-my_embedding_model = SentenceTransformer(conf.EMBEDDING_MODEL_PATH)
\ No newline at end of file
+# 按 EMBEDDING_BACKEND 加载（torch / onnx / onnx-int8），各后端的 encode 接口相同
+my_embedding_model = load_embedding_model(conf.EMBEDDING_BACKEND, conf.EMBEDDING_MODEL_PATH, conf.EMBEDDING_ONNX_DIR,
+                                          conf.EMBEDDING_THREADS)
+# 当前向量来源的标识，写入索引旁的后端标记，检索时据此确认索引与查询向量出自同一后端
+EMBEDDING_BACKEND_KEY = embedding_backend_key(conf.EMBEDDING_BACKEND, conf.EMBEDDING_MODEL_PATH)
+
+# 查询向量缓存，所有检索入口共用；配置了 EMBEDDING_CACHE_PATH 时退出前保存，重启后继续命中
+query_embedding_cache = EmbeddingCache(conf.EMBEDDING_CACHE_SIZE, conf.EMBEDDING_CACHE_PATH,
+                                       model_key=EMBEDDING_BACKEND_KEY)
+atexit.register(query_embedding_cache.save)
+
+
+def encode_queries(queries):
+    """
+    把查询文本编码为归一化的 float32 向量，先查缓存，未命中的一次性批量编码
+    建索引时的大批量编码不经过这里，避免把名称表挤进查询缓存
+    :param queries: List[str]
+    :return: np.ndarray，形状 (len(queries), dim)
+    """
+    return query_embedding_cache.get_or_compute(
+        list(queries),
+        lambda texts: my_embedding_model.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+    )
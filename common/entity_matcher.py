@@ -0,0 +1,192 @@
+import json
+import os
+import re
+import threading
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# 别名字段中多个别名之间的分隔符
+ALIAS_SPLIT_PATTERN = re.compile(r"[、，,；;/\s]+")
+# 判断剩余文本是否还需要交给大模型时忽略的疑问词、功能词、图谱属性词和标点
+LEFTOVER_STOP_PATTERN = re.compile(
+    r"区别|不同|相同|关系|药材|组成|成分|功效|作用|效果|好处|副作用|出处|来源|用法|用量|禁忌|注意|主治|适应症|症状|"
+    r"什么|哪些|哪个|哪种|怎么|怎样|如何|可以|能够|应该|需要|有没有|是否|请问|一下|一起|和|与|及|跟|的|了|吗|呢|吧|啊|"
+    r"我|你|他|她|它|们|最近|经常|总是|有点|有些|一直|该|吃|用|喝|治|治疗|药|方|哪|谁|是|有|在|由|能|会|要|想|"
+    r"[\s\W\d_a-zA-Z]"
+)
+
+
+class AhoCorasickMatcher:
+    """
+    纯 Python 的 Aho-Corasick 多模式匹配，一次扫描找出文本中出现的所有模式串
+
+    Args:
+        min_length: 参与匹配的最短模式长度，单字名称误匹配太多，默认忽略
+    """
+
+    def __init__(self, min_length: int = 2):
+        self.min_length = min_length
+        self._goto = [{}]  # 状态 -> {字符: 下一状态}
+        self._fail = [0]
+        self._output = [None]  # 状态 -> 在此结束的模式 (长度, 载荷)
+        self._dict_link = [0]  # 沿失败链最近的、有输出的状态
+        self._built = False
+
+    def add(self, pattern: str, payload):
+        """加入一个模式串；同一模式串重复加入时载荷以后加入的为准"""
+        if len(pattern) < self.min_length:
+            return
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(None)
+                self._dict_link.append(0)
+            state = next_state
+        self._output[state] = (len(pattern), payload)
+        self._built = False
+
+    def build(self):
+        """按广度优先计算失败链接和输出链接，加入全部模式后调用一次"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                fail_state = self._fail[next_state]
+                self._dict_link[next_state] = fail_state if self._output[fail_state] else self._dict_link[fail_state]
+                queue.append(next_state)
+        self._built = True
+
+    def find_all(self, text: str) -> List[Tuple[int, int, object]]:
+        """找出所有（可能重叠的）匹配，返回 [(start, end, payload)]"""
+        if not self._built:
+            self.build()
+        matches = []
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            output_state = state if self._output[state] else self._dict_link[state]
+            while output_state:
+                length, payload = self._output[output_state]
+                matches.append((position + 1 - length, position + 1, payload))
+                output_state = self._dict_link[output_state]
+        return matches
+
+    def find_longest(self, text: str) -> List[Tuple[int, int, object]]:
+        """从左到右取最长、互不重叠的匹配，如“十全大补汤”不会再拆出“大补”"""
+        selected = []
+        covered_until = 0
+        for start, end, payload in sorted(self.find_all(text), key=lambda match: (match[0], -match[1])):
+            if start >= covered_until:
+                selected.append((start, end, payload))
+                covered_until = end
+        return selected
+
+
+def split_aliases(alias_text) -> List[str]:
+    """别名字段可能是“甲、乙”这样的字符串，也可能是列表"""
+    if not alias_text:
+        return []
+    if isinstance(alias_text, (list, tuple)):
+        return [alias for item in alias_text for alias in split_aliases(item)]
+    if not isinstance(alias_text, str):
+        return []
+    return [alias for alias in ALIAS_SPLIT_PATTERN.split(alias_text) if alias]
+
+
+def build_dictionary_entries(rows: Iterable[Tuple[str, str, Optional[str]]]) -> List[List[str]]:
+    """
+    由 (标签, 名称, 别名字段) 生成词典条目 [表面形式, 标签, 标准名称]
+    名称本身和每个别名各生成一条，别名指向标准名称
+    """
+    entries = []
+    for label, name, alias_text in rows:
+        entries.append([name, label, name])
+        entries.extend([alias, label, name] for alias in split_aliases(alias_text) if alias != name)
+    return entries
+
+
+def save_entity_dictionary(path: str, entries: List[List[str]]):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"entries": entries}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+class EntityDictionary:
+    """
+    图谱实体词典：表面形式（名称或别名）-> [(标签, 标准名称)]，基于 Aho-Corasick 做最长匹配
+
+    词典文件由 __003__faiss_embedding.py 与向量索引一同构建；文件修改时间变化后下次匹配前自动重新加载。
+    :param path: 词典文件路径
+    :param min_length: 参与匹配的最短名称长度
+    """
+
+    def __init__(self, path: str, min_length: int = 2):
+        self.path = path
+        self.min_length = min_length
+        self.lock = threading.Lock()
+        self._matcher = None
+        self._mtime = None
+
+    def _load_if_changed(self):
+        if not os.path.exists(self.path):
+            return None
+        mtime = os.path.getmtime(self.path)
+        if self._matcher is not None and mtime == self._mtime:
+            return self._matcher
+        with self.lock:
+            if self._matcher is None or mtime != self._mtime:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    entries = json.load(f).get("entries", [])
+                payloads: Dict[str, List[Tuple[str, str]]] = {}
+                for surface, label, canonical in entries:
+                    targets = payloads.setdefault(surface, [])
+                    if (label, canonical) not in targets:
+                        targets.append((label, canonical))
+                matcher = AhoCorasickMatcher(self.min_length)
+                for surface, targets in payloads.items():
+                    matcher.add(surface, targets)
+                matcher.build()
+                self._matcher, self._mtime = matcher, mtime
+                print(f"实体词典加载完成: {len(payloads)} 个名称/别名")
+        return self._matcher
+
+    def match(self, text: str):
+        """
+        :return: (匹配结果 {标签: [标准名称, ...]}, 未匹配的剩余片段列表)；词典不存在时整段文本都是剩余片段
+        """
+        matcher = self._load_if_changed()
+        if matcher is None:
+            return {}, [text]
+        matched: Dict[str, List[str]] = {}
+        leftovers = []
+        cursor = 0
+        for start, end, targets in matcher.find_longest(text):
+            if start > cursor:
+                leftovers.append(text[cursor:start])
+            cursor = end
+            for label, canonical in targets:
+                names = matched.setdefault(label, [])
+                if canonical not in names:
+                    names.append(canonical)
+        if cursor < len(text):
+            leftovers.append(text[cursor:])
+        return matched, leftovers
+
+
+def has_leftover_content(leftovers: List[str], min_chars: int = 2) -> bool:
+    """去掉疑问词、功能词和标点后，剩余片段里还有至少 min_chars 个字才值得交给大模型抽取"""
+    remaining = LEFTOVER_STOP_PATTERN.sub("", "".join(leftovers))
+    return len(remaining) >= min_chars
@@ -0,0 +1,126 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+
+def make_cache_key(*parts: str) -> str:
+    """把若干字符串拼接后做 sha256，作为内容寻址的缓存键"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update((part or "").encode("utf-8"))
+        # 分隔符，避免 ("ab", "c") 和 ("a", "bc") 得到相同的键
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """
+    基于 SQLite 的磁盘缓存，保存大模型抽取结果
+
+    键由调用方按内容生成（见 make_cache_key），值为可 JSON 序列化的对象。
+    缓存总大小超过 max_bytes 时按最近最少使用（LRU）顺序淘汰。
+    可在多个线程间共享，也可以被多个抽取脚本共用同一个文件。
+
+    Args:
+        cache_path: SQLite 文件路径
+        max_bytes: 缓存值的总字节数上限
+    """
+
+    def __init__(self, cache_path: str, max_bytes: int = 512 * 1024 * 1024):
+        cache_dir = os.path.dirname(cache_path)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        self.cache_path = cache_path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_last_access ON cache(last_access)")
+        self.conn.commit()
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+
+    def get(self, key: str):
+        """读取缓存，命中时刷新访问时间；未命中返回 None"""
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.conn.execute("UPDATE cache SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+        return json.loads(row[0])
+
+    def put(self, key: str, value):
+        """写入缓存，超出容量时淘汰最久未访问的条目"""
+        value_text = json.dumps(value, ensure_ascii=False)
+        size = len(value_text.encode("utf-8"))
+        with self.lock:
+            old_row = self.conn.execute("SELECT size FROM cache WHERE key = ?", (key,)).fetchone()
+            if old_row is not None:
+                self.total_bytes -= old_row[0]
+            self.conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, value_text, size, time.time())
+            )
+            self.total_bytes += size
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        """按 last_access 从旧到新删除条目，直到总大小不超过上限（调用方持有锁）"""
+        while self.total_bytes > self.max_bytes:
+            rows = self.conn.execute(
+                "SELECT key, size FROM cache ORDER BY last_access LIMIT 100"
+            ).fetchall()
+            if not rows:
+                self.total_bytes = 0
+                return
+            for key, size in rows:
+                self.conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self.total_bytes -= size
+                if self.total_bytes <= self.max_bytes:
+                    return
+
+    def stats(self) -> dict:
+        """返回命中统计和当前占用"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "total_bytes": self.total_bytes,
+        }
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+_shared_caches = {}
+_shared_caches_lock = threading.Lock()
+
+
+def get_extraction_cache(cache_path: Optional[str], max_bytes: int = 512 * 1024 * 1024) -> Optional[ExtractionCache]:
+    """
+    按路径获取进程内共享的缓存实例，cache_path 为 None 时返回 None（不使用缓存）
+    """
+    if cache_path is None:
+        return None
+    cache_path = os.path.abspath(cache_path)
+    with _shared_caches_lock:
+        if cache_path not in _shared_caches:
+            _shared_caches[cache_path] = ExtractionCache(cache_path, max_bytes)
+        cache = _shared_caches[cache_path]
+        cache.max_bytes = max_bytes
+        return cache
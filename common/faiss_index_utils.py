@@ -0,0 +1,121 @@
+import hashlib
+import math
+
+import faiss
+import numpy as np
+
+# 支持的索引类型：flat 精确检索；hnsw 图索引；ivf 倒排索引（需要先用数据训练聚类中心）
+INDEX_TYPES = ("flat", "hnsw", "ivf")
+
+
+def get_ivf_nlist(num_vectors: int) -> int:
+    """
+    IVF 聚类中心数：约 4·sqrt(N)，并保证每个中心至少有 39 个训练样本（faiss 的最低建议）
+    """
+    return max(1, min(int(4 * math.sqrt(num_vectors)), num_vectors // 39))
+
+
+def stable_text_id(text: str) -> int:
+    """
+    名称的稳定 id：UTF-8 的 blake2b 摘要取 63 位，同一名称在每次构建中 id 都相同，便于增量增删
+    """
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little") >> 1
+
+
+def new_faiss_index(dim: int, index_type: str = "flat", hnsw_m: int = 32, hnsw_ef_construction: int = 200,
+                    ivf_nlist: int = 1):
+    """
+    创建空的 L2 距离索引；ivf 索引还需要调用方用样本向量 train 之后才能加入向量
+    :param ivf_nlist: IVF 聚类中心数，通常由 get_ivf_nlist 按总向量数计算
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"不支持的索引类型: {index_type}，可选 {INDEX_TYPES}")
+    if index_type == "flat":
+        return faiss.IndexFlatL2(dim)  # L2距离,欧式距离
+    if index_type == "hnsw":
+        index = faiss.index_factory(dim, f"HNSW{hnsw_m},Flat", faiss.METRIC_L2)
+        index.hnsw.efConstruction = hnsw_ef_construction
+        return index
+    return faiss.index_factory(dim, f"IVF{ivf_nlist},Flat", faiss.METRIC_L2)
+
+
+def create_faiss_index(embeddings: np.ndarray, index_type: str = "flat", hnsw_m: int = 32,
+                       hnsw_ef_construction: int = 200, ivf_nlist: int = None, ids=None):
+    """
+    按索引类型创建 L2 距离的 FAISS 索引，训练（IVF）并加入向量
+
+    Args:
+        embeddings: 归一化后的向量，float32，形状 (N, dim)
+        index_type: flat / hnsw / ivf
+        hnsw_m: HNSW 每个节点的邻居数，越大召回越高、内存越大
+        hnsw_ef_construction: HNSW 建图时的搜索宽度
+        ivf_nlist: IVF 聚类中心数，None 时按 get_ivf_nlist 计算
+        ids: 可选，与 embeddings 等长的稳定 id；提供时外面包一层 IndexIDMap2，检索返回这些 id
+
+    Returns:
+        已加入全部向量的索引
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype="float32")
+    index = new_faiss_index(embeddings.shape[1], index_type, hnsw_m, hnsw_ef_construction,
+                            ivf_nlist or get_ivf_nlist(len(embeddings)))
+    if index_type == "ivf":
+        index.train(embeddings)
+
+    if ids is None:
+        index.add(embeddings)
+        return index
+    id_map = faiss.IndexIDMap2(index)
+    id_map.add_with_ids(embeddings, np.asarray(ids, dtype="int64"))
+    return id_map
+
+
+def base_index(index):
+    """IndexIDMap 包装的索引返回其内部索引，其他索引原样返回"""
+    if isinstance(index, faiss.IndexIDMap):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def get_index_type(index) -> str:
+    """根据读入的索引对象判断索引类型"""
+    if hasattr(base_index(index), "hnsw"):
+        return "hnsw"
+    try:
+        faiss.extract_index_ivf(index)
+        return "ivf"
+    except RuntimeError:
+        return "flat"
+
+
+def configure_search_params(index, hnsw_ef_search: int = 64, ivf_nprobe: int = 16):
+    """
+    设置近似索引的检索参数，flat 索引不受影响
+    :param hnsw_ef_search: HNSW 检索时的搜索宽度，需不小于 top_k
+    :param ivf_nprobe: IVF 检索时访问的聚类中心数
+    :return: 索引类型
+    """
+    index_type = get_index_type(index)
+    if index_type == "hnsw":
+        base_index(index).hnsw.efSearch = hnsw_ef_search
+    elif index_type == "ivf":
+        ivf = faiss.extract_index_ivf(index)
+        ivf.nprobe = min(ivf_nprobe, ivf.nlist)
+    return index_type
+
+
+def enable_reconstruct(index):
+    """IVF 索引默认不能按 id 取回向量，建立直接映射后才能调用 reconstruct；flat / hnsw 无需处理"""
+    if get_index_type(index) == "ivf":
+        faiss.extract_index_ivf(index).make_direct_map()
+
+
+def reconstruct_similarities(index, query_emb: np.ndarray, ids) -> np.ndarray:
+    """
+    计算一条查询向量与索引中指定 id 向量的余弦相似度（向量已归一化），用于给不在向量检索 top_k 中的候选打分
+    :return: 与 ids 等长的相似度数组；索引不支持按 id 取回向量时返回 None
+    """
+    try:
+        vectors = index.reconstruct_batch(np.asarray(ids, dtype="int64"))
+    except RuntimeError:
+        return None
+    return 1.0 - ((vectors - query_emb) ** 2).sum(axis=1) / 2.0
@@ -0,0 +1,91 @@
+import math
+from collections import Counter
+from typing import Iterable, List, Tuple
+
+import numpy as np
+
+# 口语里常与图谱用字互换的字，建索引和查询时统一替换
+CHAR_VARIANTS = str.maketrans({"疼": "痛"})
+
+
+def char_ngrams(text: str, ngram_range: Tuple[int, int] = (1, 2)) -> List[str]:
+    """
+    字符 n-gram，如 "头痛" -> ["头", "痛", "头痛"]
+    保留单字是为了让“头疼 / 头痛”这类只差一个字的两字词仍有重叠
+    """
+    text = "".join(text.split()).translate(CHAR_VARIANTS)
+    grams = []
+    for n in range(ngram_range[0], ngram_range[1] + 1):
+        grams.extend(text[i:i + n] for i in range(len(text) - n + 1))
+    return grams
+
+
+class NgramIndex:
+    """
+    基于字符 n-gram 倒排表的 BM25 词面索引，用于捕捉“头疼 / 头痛”“四君子 / 四君子汤”这类近似字面变体
+
+    每个 n-gram 的倒排表保存 (文本 id 数组, BM25 权重数组)，权重在建索引时算好，
+    查询时只需按 n-gram 累加，不需要向量模型。
+    Args:
+        texts: 文本列表，下标即文本 id（与 FAISS 索引的 id2text 一致）
+        ngram_range: n-gram 长度范围
+        k1: BM25 词频饱和参数
+        b: BM25 长度归一化参数
+    """
+
+    def __init__(self, texts: Iterable[str], ngram_range: Tuple[int, int] = (1, 2), k1: float = 1.2,
+                 b: float = 0.75):
+        self.ngram_range = ngram_range
+        self.k1 = k1
+        self.b = b
+        postings = {}
+        lengths = []
+        for text_id, text in enumerate(texts):
+            grams = Counter(char_ngrams(text, ngram_range))
+            lengths.append(sum(grams.values()))
+            for gram, tf in grams.items():
+                postings.setdefault(gram, []).append((text_id, tf))
+
+        self.size = len(lengths)
+        self.avg_length = (sum(lengths) / self.size) if self.size else 1.0
+        lengths = np.asarray(lengths, dtype="float32")
+        self._postings = {}
+        for gram, items in postings.items():
+            ids = np.fromiter((text_id for text_id, _ in items), dtype="int64", count=len(items))
+            tfs = np.fromiter((tf for _, tf in items), dtype="float32", count=len(items))
+            norm = self.k1 * (1 - self.b + self.b * lengths[ids] / self.avg_length)
+            self._postings[gram] = (ids, self.idf(len(items)) * tfs * (self.k1 + 1) / (tfs + norm))
+
+    def idf(self, df: int) -> float:
+        return math.log(1 + (self.size - df + 0.5) / (df + 0.5))
+
+    def _self_score(self, grams: Counter) -> float:
+        """查询与一个和自己完全相同的文本的 BM25 分数，用于把分数归一化到 [0, 1]；词表中没有的 n-gram 同样计入"""
+        length = sum(grams.values())
+        norm = self.k1 * (1 - self.b + self.b * length / self.avg_length)
+        score = 0.0
+        for gram, tf in grams.items():
+            posting = self._postings.get(gram)
+            df = 0 if posting is None else len(posting[0])
+            score += self.idf(df) * tf * (self.k1 + 1) / (tf + norm)
+        return score
+
+    def search(self, query: str, top_k: int = 3) -> List[Tuple[int, float]]:
+        """
+        :return: [(文本 id, 归一化分数)]，按分数从高到低；归一化分数为 BM25 分数除以查询与自身的分数，截断到 1
+        """
+        grams = Counter(char_ngrams(query, self.ngram_range))
+        if not grams or not self.size:
+            return []
+        scores = np.zeros(self.size, dtype="float32")
+        for gram, tf in grams.items():
+            posting = self._postings.get(gram)
+            if posting is not None:
+                ids, weights = posting
+                scores[ids] += tf * weights
+        top_k = min(top_k, self.size)
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        candidates = candidates[np.argsort(-scores[candidates])]
+        self_score = self._self_score(grams)
+        return [(int(text_id), min(1.0, float(scores[text_id]) / self_score))
+                for text_id in candidates if scores[text_id] > 0]
@@ -1,7 +1,12 @@
 from neo4j import GraphDatabase
+from neo4j.exceptions import TransientError
 from common.config import Config
+from common.rate_limiter import backoff_delay
 from tqdm import tqdm
+import heapq
 import json
+import os
+import time
 
 conf = Config()
 
@@ -49,6 +54,124 @@ class Neo4jClient:
             result = session.run(query, parameters or {})
             return [record.data() for record in result]
 
+    def get_all_node_names(self):
+        """
+        所有节点的 name（去重），用于构建合并的向量索引
+        :return: List[str]
+        """
+        records = self.run_cypher("MATCH (n) WHERE n.name IS NOT NULL RETURN DISTINCT n.name AS name ORDER BY name")
+        return [record["name"] for record in records]
+
+    def get_node_names_by_label(self, label):
+        """
+        某个标签下所有节点的 name，用于构建按标签划分的向量索引
+        :param label: 标签，需是合法的 Cypher 标识符
+        :return: List[str]
+        """
+        records = self.run_cypher(
+            f"MATCH (n:`{label}`) WHERE n.name IS NOT NULL RETURN DISTINCT n.name AS name ORDER BY name")
+        return [record["name"] for record in records]
+
+    def count_node_names(self, label=None):
+        """
+        不同 name 的数量，用于流式构建索引时显示进度和确定 IVF 聚类中心数
+        :param label: 标签，None 表示全部节点
+        """
+        pattern = "(n)" if label is None else f"(n:`{label}`)"
+        records = self.run_cypher(f"MATCH {pattern} WHERE n.name IS NOT NULL RETURN count(DISTINCT n.name) AS count")
+        return records[0]["count"]
+
+    def iter_node_name_pages(self, label=None, page_size=10000, after=""):
+        """
+        按 name 升序分页读取 (name, label)，以上一页最后一个 name 作为游标（keyset 分页），
+        不使用 SKIP，每页都是 name 索引上的范围扫描，内存中只保留一页
+        :param label: 标签，None 表示全部节点：对每个标签分别分页，再按 name 归并（同名节点取标签名最小的一个）
+        :param page_size: 每页条数
+        :param after: 从大于该 name 的位置开始，用于断点续建
+        :return: 迭代器，每次产出 List[Tuple[name, label]]
+        """
+        if label is not None:
+            yield from self._iter_label_name_pages(label, page_size, after)
+            return
+        # 不带标签的 MATCH (n) 用不上按标签建的 name 索引，每页都要聚合全部节点，整体是平方级的；
+        # 改为每个标签各自走索引分页，再做多路归并
+        labels = [record["label"] for record in self.run_cypher("CALL db.labels() YIELD label RETURN label")]
+        streams = [(row for page in self._iter_label_name_pages(each, page_size, after) for row in page)
+                   for each in labels]
+        page = []
+        for name, name_label in heapq.merge(*streams):
+            if page and page[-1][0] == name:
+                continue  # 已按 (name, label) 有序，同名只保留第一个
+            if len(page) >= page_size:
+                yield page
+                page = []
+            page.append((name, name_label))
+        if page:
+            yield page
+
+    def _iter_label_name_pages(self, label, page_size, after):
+        """单个标签的 keyset 分页，查询走 name 索引（create_name_constraints）的范围扫描"""
+        query = (f"MATCH (n:`{label}`) WHERE n.name IS NOT NULL AND n.name > $after "
+                 f"RETURN DISTINCT n.name AS name, '{label}' AS label ORDER BY name LIMIT $limit")
+        while True:
+            records = self.run_cypher(query, {"after": after, "limit": page_size})
+            if not records:
+                return
+            yield [(record["name"], record["label"]) for record in records]
+            if len(records) < page_size:
+                return
+            after = records[-1]["name"]
+
+    def get_node_names_and_aliases_by_label(self, label):
+        """
+        某个标签下所有节点的 name 和 alias，用于构建实体词典
+        :param label: 标签，需是合法的 Cypher 标识符
+        :return: List[Tuple[name, alias]]，没有别名时 alias 为 None
+        """
+        records = self.run_cypher(
+            f"MATCH (n:`{label}`) WHERE n.name IS NOT NULL RETURN n.name AS name, n.alias AS alias ORDER BY name")
+        return [(record["name"], record["alias"]) for record in records]
+
+    def run_write_cypher(self, query, parameters=None):
+        """
+        在一个写事务中执行一条 Cypher 语句（适合携带大批参数行的 UNWIND 语句）
+        :param query: Cypher 语句
+        :param parameters: 可选参数字典
+        :return: 本次写入的统计信息（创建的节点数、关系数等）
+        """
+        with self.driver.session() as session:
+            def transaction_logic(tx):
+                return tx.run(query, parameters or {}).consume().counters
+
+            return session.execute_write(transaction_logic)
+
+    def run_write_queries(self, queries_with_params, max_retries=3):
+        """
+        在同一个写事务中依次执行多条语句，每次调用使用独立的会话，可在多个线程中并发调用
+        execute_write 自身会重试瞬时错误（死锁、锁等待超时等），超出其重试时限后再按指数退避
+        整体重试 max_retries 次
+        :param queries_with_params: List[Tuple[str, Dict]]
+        :param max_retries: execute_write 之外的额外重试次数
+        :return: 重试次数
+        """
+        def transaction_logic(tx):
+            for query, params in queries_with_params:
+                tx.run(query, params or {}).consume()
+
+        attempt = 0
+        while True:
+            try:
+                with self.driver.session() as session:
+                    session.execute_write(transaction_logic)
+                return attempt
+            except TransientError as e:
+                if attempt >= max_retries:
+                    raise
+                delay = backoff_delay(attempt)
+                print(f"写事务遇到瞬时错误: {e.code}，{delay:.1f}s 后第 {attempt + 1} 次重试")
+                time.sleep(delay)
+                attempt += 1
+
     def run_multiple_cypher(self, queries_with_params):
         """
         执行多条 Cypher 语句，使用事务，并显示 tqdm 进度条。
@@ -64,96 +187,196 @@ class Neo4jClient:
 
             session.execute_write(transaction_logic)
 
-    def export_tcm_metadata_to_json(self, output_path="tcm_metadata.json"):
+    def create_name_constraints(self, labels):
+        """
+        为每个标签的 name 属性创建唯一约束（约束自带索引），幂等，可在每次导入前执行。
+        已有重复 name 导致约束创建失败的标签，退而创建普通的 name 索引。
+        :param labels: 标签列表，需是合法的 Cypher 标识符
+        :return: {label: "constraint" | "index"}
+        """
+        created = {}
         with self.driver.session() as session:
+            for label in labels:
+                try:
+                    session.run(
+                        f"CREATE CONSTRAINT {label.lower()}_name_unique IF NOT EXISTS "
+                        f"FOR (n:{label}) REQUIRE n.name IS UNIQUE"
+                    ).consume()
+                    created[label] = "constraint"
+                except Exception as e:
+                    print(f"标签 {label} 创建唯一约束失败（可能存在重复 name）: {e}，改为创建普通索引")
+                    session.run(
+                        f"CREATE INDEX {label.lower()}_name_index IF NOT EXISTS FOR (n:{label}) ON (n.name)"
+                    ).consume()
+                    created[label] = "index"
+            # 等待索引构建完成，之后的 MERGE / 查询才能用上
+            session.run("CALL db.awaitIndexes()").consume()
+        return created
 
-            # 1. 所有节点标签
-            label_query = """
-            MATCH (n)
-            UNWIND labels(n) AS label
-            RETURN DISTINCT label
-            """
-            labels = [record["label"] for record in session.run(label_query)]
+    def drop_name_constraints(self, labels):
+        """删除 create_name_constraints 创建的约束和索引，仅用于对比测试"""
+        with self.driver.session() as session:
+            for label in labels:
+                session.run(f"DROP CONSTRAINT {label.lower()}_name_unique IF EXISTS").consume()
+                session.run(f"DROP INDEX {label.lower()}_name_index IF EXISTS").consume()
 
-            # 2. 所有关系类型
-            rel_query = """
-            MATCH (n)-[r]-()
-            RETURN DISTINCT type(r) AS rel_type
-            """
-            rel_types = [record["rel_type"] for record in session.run(rel_query)]
+    def export_tcm_metadata_to_json(self, output_path="tcm_metadata.json", probe_size=1000, incremental=True):
+        """
+        导出图谱元数据（标签、关系类型、三元组及各自的属性）到 JSON
 
-            # 3. 所有三元组结构
+        标签和关系类型来自 db.labels / db.relationshipTypes；三元组的候选来自 db.schema.visualization，
+        再逐个确认确实存在（见 _triple_exists，每个候选最多读 probe_size 条关系）；
+        属性来自 db.schema.nodeTypeProperties / db.schema.relTypeProperties，覆盖所有节点和关系，
+        只在少数节点上出现的属性也不会漏掉。已有文件中手写的 description 会保留。
+        :param output_path: 输出文件路径
+        :param probe_size: 确认三元组时最多读取的关系条数
+        :param incremental: True 时把新发现的标签、属性和三元组合并进已有文件，不删除已有条目；
+                            False 时以本次导出为准，已不存在的条目（及其手写描述）会被去掉
+        :return: output_path
+        """
+        with self.driver.session() as session:
+            # 1. 所有节点标签、关系类型
+            labels = [record["label"] for record in session.run("CALL db.labels() YIELD label RETURN label")]
+            rel_types = [record["relationshipType"] for record in
+                         session.run("CALL db.relationshipTypes() YIELD relationshipType RETURN relationshipType")]
+
+            # 2. 三元组结构
             triple_query = """
-            MATCH (n)-[r]->(m)
-            WITH head(labels(n)) AS from_label, type(r) AS rel_type, head(labels(m)) AS to_label
-            RETURN DISTINCT from_label, rel_type, to_label
+            CALL db.schema.visualization() YIELD relationships
+            UNWIND relationships AS r
+            RETURN DISTINCT head(labels(startNode(r))) AS from_label, type(r) AS rel_type,
+                   head(labels(endNode(r))) AS to_label
             """
+            candidates = [(record["from_label"], record["rel_type"], record["to_label"])
+                          for record in session.run(triple_query)]
+            # 计数存储只记录“某标签有某类出边”和“某标签有某类入边”，可视化结果是两者的组合，会列出实际不存在的
+            # 标签对（如 Formula 与 Herb 都有 HAS_INGREDIENT 出边时会多出 Herb-HAS_INGREDIENT->Formula）
             triples = [{
-                "from": record["from_label"],
-                "rel_type": record["rel_type"],
-                "to": record["to_label"],
+                "from": from_label,
+                "rel_type": rel_type,
+                "to": to_label,
                 "description": ""
-            } for record in session.run(triple_query)]
-
-            # 4. 节点属性（每个标签下的属性键）
-            node_props_query = """
-            MATCH (n)
-            UNWIND labels(n) AS label
-            UNWIND keys(n) AS prop
-            RETURN DISTINCT label, prop
-            ORDER BY label, prop
-            """
-            label_props = {}
-            for record in session.run(node_props_query):
-                label = record["label"]
-                prop = record["prop"]
-                if prop == "project":  # 忽略 project 字段
+            } for from_label, rel_type, to_label in candidates
+                if self._triple_exists(session, from_label, rel_type, to_label, probe_size)]
+
+            # 3. 节点属性、关系属性
+            label_props = {label: [] for label in labels}
+            for record in session.run("CALL db.schema.nodeTypeProperties() "
+                                      "YIELD nodeLabels, propertyName RETURN nodeLabels, propertyName"):
+                prop = record["propertyName"]
+                if prop is None or prop == "project":  # 没有属性的节点类型；忽略 project 字段
                     continue
-                label_props.setdefault(label, []).append({
-                    "name": prop,
-                    "description": ""
-                })
-
-            # 5. 关系属性（每种关系下的属性键）
-            rel_props_query = """
-            MATCH (n)-[r]->(m)
-            UNWIND keys(r) AS prop
-            RETURN DISTINCT type(r) AS rel_type, prop
-            ORDER BY rel_type, prop
-            """
-            rel_type_props = {}
-            for record in session.run(rel_props_query):
-                rel_type = record["rel_type"]
-                prop = record["prop"]
-                rel_type_props.setdefault(rel_type, []).append({
-                    "name": prop,
-                    "description": ""
-                })
-
-            # 构建 JSON
-            json_obj = {
-                "labels": [
-                    {
-                        "name": label,
-                        "description": "",
-                        "properties": label_props.get(label, [])
-                    } for label in labels
-                ],
-                "relationships": [
-                    {
-                        "type": rel,
-                        "description": "",
-                        "properties": rel_type_props.get(rel, [])
-                    } for rel in rel_types
-                ],
-                "triples": triples
-            }
-
-            # 保存到文件
-            with open(output_path, "w", encoding="utf-8") as f:
-                json.dump(json_obj, f, ensure_ascii=False, indent=2)
-
-            return output_path
+                for label in record["nodeLabels"]:
+                    if prop not in (item["name"] for item in label_props.setdefault(label, [])):
+                        label_props[label].append({"name": prop, "description": ""})
+            rel_type_props = {rel_type: [] for rel_type in rel_types}
+            for record in session.run("CALL db.schema.relTypeProperties() "
+                                      "YIELD relType, propertyName RETURN relType, propertyName"):
+                prop = record["propertyName"]
+                if prop is None:
+                    continue
+                rel_type = record["relType"].lstrip(":").strip("`")  # 形如 :`HAS_INGREDIENT`
+                if prop not in (item["name"] for item in rel_type_props.setdefault(rel_type, [])):
+                    rel_type_props[rel_type].append({"name": prop, "description": ""})
+            for props in list(label_props.values()) + list(rel_type_props.values()):
+                props.sort(key=lambda item: item["name"])
+
+        json_obj = {
+            "labels": [
+                {
+                    "name": label,
+                    "description": "",
+                    "properties": label_props.get(label, [])
+                } for label in labels
+            ],
+            "relationships": [
+                {
+                    "type": rel,
+                    "description": "",
+                    "properties": rel_type_props.get(rel, [])
+                } for rel in rel_types
+            ],
+            "triples": triples
+        }
+
+        # 4. 与已有文件合并，保留手写的描述
+        if os.path.exists(output_path):
+            with open(output_path, "r", encoding="utf-8") as f:
+                existing = json.load(f)
+            json_obj = merge_tcm_metadata(existing, json_obj, keep_missing=incremental)
+
+        # 保存到文件
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(json_obj, f, ensure_ascii=False, indent=2)
+
+        return output_path
+
+    @staticmethod
+    def _triple_exists(session, from_label, rel_type, to_label, probe_size=1000):
+        """
+        确认 (:from_label)-[:rel_type]->(:to_label) 是否存在，每个候选读取的关系数不超过 probe_size：
+        先读计数存储中两端各自的关系数（O(1)），任一端为 0 则不存在；
+        否则从关系数较少的一端最多读 probe_size 条该类关系，检查另一端的标签。
+        较少一端的关系数不超过 probe_size 时结果是精确的，否则只检查了前 probe_size 条，
+        稀有的三元组可能漏掉（增量导出时已有文件中的三元组会保留）
+        """
+        out_count = session.run(f"MATCH (:`{from_label}`)-[r:`{rel_type}`]->() RETURN count(r) AS count").single()
+        in_count = session.run(f"MATCH ()-[r:`{rel_type}`]->(:`{to_label}`) RETURN count(r) AS count").single()
+        if not out_count["count"] or not in_count["count"]:
+            return False
+        if out_count["count"] <= in_count["count"]:
+            query = (f"MATCH (:`{from_label}`)-[r:`{rel_type}`]->() WITH r LIMIT $probe_size "
+                     f"WITH endNode(r) AS other WHERE other:`{to_label}` RETURN 1 LIMIT 1")
+        else:
+            query = (f"MATCH ()-[r:`{rel_type}`]->(:`{to_label}`) WITH r LIMIT $probe_size "
+                     f"WITH startNode(r) AS other WHERE other:`{from_label}` RETURN 1 LIMIT 1")
+        return session.run(query, probe_size=probe_size).single() is not None
+
+
+def _merge_described_items(old_items, new_items, key_func, keep_missing, merge_item=None):
+    """
+    按 key_func 合并两个条目列表：保留旧条目的 description，新条目中出现的新键追加在后
+    keep_missing=True 时保留只在旧列表中出现的条目
+    """
+    old_by_key = {key_func(item): item for item in old_items or []}
+    new_keys = {key_func(item) for item in new_items}
+    merged = []
+    for item in old_items or []:
+        key = key_func(item)
+        if key in new_keys or keep_missing:
+            merged.append(dict(item))
+    merged_index = {key_func(item): i for i, item in enumerate(merged)}
+    for item in new_items:
+        key = key_func(item)
+        if key in merged_index:
+            if merge_item is not None:
+                merged[merged_index[key]] = merge_item(merged[merged_index[key]], item)
+        else:
+            merged.append(dict(item))
+    return merged
+
+
+def merge_tcm_metadata(existing, exported, keep_missing=False):
+    """
+    合并已有的元数据文件与新导出的元数据
+    :param existing: 已有文件内容（含手写 description）
+    :param exported: 本次从数据库导出的内容
+    :param keep_missing: True 时保留本次没有导出到的标签、属性和三元组（增量模式）
+    """
+    def merge_properties(old_item, new_item):
+        old_item["properties"] = _merge_described_items(old_item.get("properties"), new_item["properties"],
+                                                        lambda prop: prop["name"], keep_missing)
+        return old_item
+
+    return {
+        "labels": _merge_described_items(existing.get("labels"), exported["labels"],
+                                         lambda label: label["name"], keep_missing, merge_properties),
+        "relationships": _merge_described_items(existing.get("relationships"), exported["relationships"],
+                                                lambda rel: rel["type"], keep_missing, merge_properties),
+        "triples": _merge_described_items(existing.get("triples"), exported["triples"],
+                                          lambda triple: (triple["from"], triple["rel_type"], triple["to"]),
+                                          keep_missing),
+    }
 
 
 neo4j_client = Neo4jClient(conf.NEO4J_URI, conf.NEO4J_USER, conf.NEO4J_PASSWORD)
@@ -0,0 +1,139 @@
+import random
+import threading
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """
+    线程安全的令牌桶
+
+    桶容量为每分钟配额，令牌按 配额/60 的速度匀速补充。
+    允许一次消费超过当前余量（记为欠账），欠账会让后续调用等待更久，
+    这样事后才知道大小的消耗（如模型输出 token）也能计入限额。
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = float(per_minute) / 60.0
+        self.tokens = float(per_minute)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self, amount: float = 1.0):
+        """阻塞直到桶内令牌足够，然后扣除 amount 个令牌"""
+        # 单次请求超过桶容量时，只要求桶满即可放行，避免永远等待
+        need = min(float(amount), self.capacity)
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= need:
+                    self.tokens -= amount
+                    return
+                wait_seconds = (need - self.tokens) / self.rate
+            time.sleep(min(wait_seconds, 1.0))
+
+    def charge(self, amount: float):
+        """不等待，直接扣除令牌（可扣成负数）"""
+        with self.lock:
+            self._refill()
+            self.tokens -= amount
+
+
+class RateLimiter:
+    """
+    同时限制每分钟请求数（RPM）和每分钟 token 数（TPM）的限流器
+
+    Args:
+        requests_per_minute: 每分钟最大请求数，None 表示不限制
+        tokens_per_minute: 每分钟最大 token 数，None 表示不限制
+    """
+
+    def __init__(self, requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None):
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+    def acquire(self, estimated_tokens: int = 0):
+        """发起请求前调用，按预估输入 token 数占用配额"""
+        if self.request_bucket is not None:
+            self.request_bucket.acquire(1)
+        if self.token_bucket is not None and estimated_tokens > 0:
+            self.token_bucket.acquire(estimated_tokens)
+
+    def record_tokens(self, actual_tokens: int):
+        """请求完成后调用，把超出预估部分（通常是输出 token）补记到配额里"""
+        if self.token_bucket is not None and actual_tokens > 0:
+            self.token_bucket.charge(actual_tokens)
+
+
+def get_error_status_code(error: Exception) -> Optional[int]:
+    """从 openai / httpx 抛出的异常中取出 HTTP 状态码，取不到返回 None"""
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        response = getattr(error, "response", None)
+        status_code = getattr(response, "status_code", None)
+    return status_code if isinstance(status_code, int) else None
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """
+    判断异常是否值得重试：429 限流、5xx 服务端错误以及连接/超时错误
+    """
+    status_code = get_error_status_code(error)
+    if status_code is not None:
+        return status_code == 429 or status_code >= 500
+    error_name = type(error).__name__
+    return "Timeout" in error_name or "Connection" in error_name
+
+
+def get_retry_after_seconds(error: Exception) -> Optional[float]:
+    """读取响应头中的 Retry-After（秒），没有则返回 None"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, base_delay: float = 1.0, max_delay: float = 60.0) -> float:
+    """指数退避加随机抖动：base * 2^attempt，上限 max_delay"""
+    delay = min(max_delay, base_delay * (2 ** attempt))
+    return delay * (0.5 + random.random() / 2)
+
+
+def call_with_retry(func, max_retries: int = 3, base_delay: float = 1.0, max_delay: float = 60.0,
+                    on_retry=None):
+    """
+    调用 func()，遇到可重试的错误时按指数退避重试
+
+    Args:
+        func: 无参可调用对象
+        max_retries: 最大重试次数（不含第一次调用）
+        base_delay: 退避基准秒数
+        max_delay: 单次等待上限秒数
+        on_retry: 可选回调 on_retry(attempt, error, delay)，用于打印日志
+
+    Returns:
+        func() 的返回值
+    """
+    attempt = 0
+    while True:
+        try:
+            return func()
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable_error(e):
+                raise
+            delay = get_retry_after_seconds(e) or backoff_delay(attempt, base_delay, max_delay)
+            if on_retry is not None:
+                on_retry(attempt + 1, e, delay)
+            time.sleep(delay)
+            attempt += 1
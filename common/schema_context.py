@@ -0,0 +1,133 @@
+import json
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+
+# AgentState 中匹配实体字段与图谱标签的对应关系
+MATCHED_FIELD_LABELS = {
+    "matched_effects": "Effect",
+    "matched_diseases": "Disease",
+    "matched_symptoms": "Symptom",
+    "matched_formulas": "Formula",
+    "matched_herbs": "Herb",
+    "matched_sources": "Source",
+}
+
+
+@lru_cache(maxsize=4)
+def parse_schema(metadata_json: str) -> Dict:
+    """
+    把 tcm_metadata.json 的内容解析成紧凑结构，同一份元数据只解析一次
+
+    Returns:
+        {"labels": {标签: {"description": ..., "properties": [(属性名, 描述), ...]}},
+         "triples": [(起点标签, 关系类型, 终点标签, 描述), ...]}
+    """
+    try:
+        metadata = json.loads(metadata_json or "{}")
+    except json.JSONDecodeError:
+        metadata = {}
+    labels = {
+        label["name"]: {
+            "description": label.get("description", ""),
+            "properties": [(prop["name"], prop.get("description", "")) for prop in label.get("properties", [])],
+        }
+        for label in metadata.get("labels", [])
+    }
+    triples = [
+        (triple["from"], triple["rel_type"], triple["to"], triple.get("description", ""))
+        for triple in metadata.get("triples", [])
+    ]
+    return {"labels": labels, "triples": triples}
+
+
+def get_matched_labels(state) -> List[str]:
+    """state 中有匹配实体的字段对应的标签"""
+    return [label for field, label in MATCHED_FIELD_LABELS.items() if state.get(field)]
+
+
+def compact_description(description: str, strip_prefix: bool = False) -> str:
+    """
+    压缩描述文本：去掉属性描述开头重复的“药材的 / 方剂的”等主语；
+    标签描述只保留第一个逗号之前的部分（如“中药材”）
+    :param strip_prefix: 属性描述为 True，标签描述为 False
+    """
+    if not description:
+        return ""
+    if strip_prefix:
+        position = description.find("的")
+        return description[position + 1:] if 0 < position <= 3 else description
+    return description.split("，")[0]
+
+
+def expand_labels(seed_labels: Iterable[str], triples: List, hops: int = 2):
+    """
+    沿三元组（不分方向）从种子标签扩展 hops 跳
+    :return: (扩展过程中经过的三元组, 涉及的全部标签)；第 k 跳保留与前 k-1 跳已到达标签相连的三元组
+    """
+    reached = set(seed_labels)
+    selected = []
+    for _ in range(max(hops, 1)):
+        frontier = set(reached)
+        for triple in triples:
+            if triple not in selected and (triple[0] in frontier or triple[2] in frontier):
+                selected.append(triple)
+                reached.update((triple[0], triple[2]))
+        if reached == frontier:
+            break
+    # 保持元数据中的原始顺序
+    return [triple for triple in triples if triple in selected], reached
+
+
+def build_schema_context(metadata_json: str, seed_labels: Optional[Iterable[str]] = None,
+                         with_descriptions: bool = True, hops: int = 2) -> str:
+    """
+    生成放进 Cypher 生成提示词的图谱结构说明，每个标签一行、每个三元组一行
+
+    seed_labels 非空时从这些标签沿三元组扩展 hops 跳，只保留经过的三元组及其涉及的标签和属性，
+    如只匹配到 Herb 时 2 跳仍保留 Formula-TREATS_DISEASE->Disease，可生成 药材->方剂->疾病 的路径；
+    为空（没有匹配到实体）时输出完整结构。
+
+    Args:
+        metadata_json: tcm_metadata.json 的内容，即 conf.TCM_METADATA
+        seed_labels: 匹配到实体的标签
+        with_descriptions: 是否附带描述；标签和属性描述做压缩，关系描述（含方向说明）原样保留
+        hops: 从种子标签扩展的跳数
+
+    Returns:
+        结构说明文本，例如：
+            节点 Formula(name:标准名称, alias:别名或异名, effect:功效作用)  # 方剂
+            (:Formula)-[:HAS_INGREDIENT]->(:Herb)  # 方剂包含某种药材作为组成成分
+    """
+    schema = parse_schema(metadata_json)
+    seeds = set(seed_labels or [])
+    if seeds:
+        triples, used_labels = expand_labels(seeds, schema["triples"], hops)
+    else:
+        triples, used_labels = schema["triples"], set(schema["labels"])
+    labels = [label for label in schema["labels"] if label in used_labels]
+
+    lines = []
+    for label in labels:
+        info = schema["labels"][label]
+        if with_descriptions:
+            props = ", ".join(f"{name}:{compact_description(description, strip_prefix=True)}" if description else name
+                              for name, description in info["properties"])
+            description = compact_description(info["description"])
+            suffix = f"  # {description}" if description else ""
+        else:
+            props = ", ".join(name for name, _ in info["properties"])
+            suffix = ""
+        lines.append(f"节点 {label}({props}){suffix}")
+    for from_label, rel_type, to_label, description in triples:
+        suffix = f"  # {description}" if with_descriptions and description else ""
+        lines.append(f"(:{from_label})-[:{rel_type}]->(:{to_label}){suffix}")
+    return "\n".join(lines)
+
+
+if __name__ == '__main__':
+    from common.config import Config
+
+    conf = Config()
+    print(build_schema_context(conf.TCM_METADATA, ["Herb"], hops=conf.SCHEMA_PRUNE_HOPS))
+    print("-" * 50)
+    print(build_schema_context(conf.TCM_METADATA, ["Source"], hops=1))
@@ -0,0 +1,206 @@
+import json
+import mmap
+import os
+import pickle
+import struct
+
+import numpy as np
+
+# 文件格式（小端）：
+#   magic(8) | count(u64) | flags(u32) | 标签表长度(u32) | 标签表(UTF-8 JSON 列表) | 对齐到 8 字节
+#   | offsets(u64 × (count+1)) | [标签编号(u16 × count)，对齐到 8 字节] | [节点 id(i64 × count)] | 文本(UTF-8)
+# 第 i 个文本为 blob[offsets[i]:offsets[i+1]]，按 FAISS id 直接定位，无需反序列化
+# 带 FLAG_KEYED 时 FAISS id 为稳定 id（IndexIDMap2），节点 id 列按升序保存，按 id 二分查找行号
+STRING_TABLE_MAGIC = b"TCMSTR01"
+_HEADER = struct.Struct("<8sQII")
+FLAG_LABELS = 1
+FLAG_NODE_IDS = 2
+FLAG_KEYED = 4
+
+
+def _align8(size: int) -> int:
+    return (size + 7) // 8 * 8
+
+
+def write_string_table(path, texts, labels=None, node_ids=None, keyed=False):
+    """
+    写出字符串表，texts 的下标即 FAISS id
+    :param path: 输出路径
+    :param texts: 文本列表
+    :param labels: 可选，与 texts 等长的标签列表
+    :param node_ids: 可选，与 texts 等长的 Neo4j 节点 id 列表（整数）
+    :param keyed: 为 True 时以 node_ids 作为 FAISS id（需互不相同），按 id 而不是下标取文本
+    """
+    if keyed:
+        if node_ids is None:
+            raise ValueError("keyed=True 时必须提供 node_ids")
+        order = np.argsort(np.asarray(node_ids, dtype="<i8"), kind="stable")
+        texts = [texts[i] for i in order]
+        labels = None if labels is None else [labels[i] for i in order]
+        node_ids = np.asarray(node_ids, dtype="<i8")[order]
+        if len(node_ids) > 1 and (np.diff(node_ids) == 0).any():
+            raise ValueError("node_ids 中有重复的 id")
+    encoded = [text.encode("utf-8") for text in texts]
+    count = len(encoded)
+    offsets = np.zeros(count + 1, dtype="<u8")
+    np.cumsum([len(item) for item in encoded], out=offsets[1:])
+
+    flags = 0
+    label_names = []
+    label_codes = None
+    if labels is not None:
+        flags |= FLAG_LABELS
+        label_names = sorted(set(labels))
+        code_of = {label: code for code, label in enumerate(label_names)}
+        label_codes = np.array([code_of[label] for label in labels], dtype="<u2")
+    if node_ids is not None:
+        flags |= FLAG_NODE_IDS
+    if keyed:
+        flags |= FLAG_KEYED
+    label_table = json.dumps(label_names, ensure_ascii=False).encode("utf-8")
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        header = _HEADER.pack(STRING_TABLE_MAGIC, count, flags, len(label_table)) + label_table
+        f.write(header + b"\0" * (_align8(len(header)) - len(header)))
+        f.write(offsets.tobytes())
+        if label_codes is not None:
+            f.write(label_codes.tobytes() + b"\0" * (_align8(label_codes.nbytes) - label_codes.nbytes))
+        if node_ids is not None:
+            f.write(np.asarray(node_ids, dtype="<i8").tobytes())
+        f.write(b"".join(encoded))
+    os.replace(tmp_path, path)
+
+
+class StringTable:
+    """
+    只读的字符串表，通过 mmap 打开，按 id 以 O(1) 取文本；多个进程打开同一文件时共享页缓存
+
+    兼容原来 id2text 字典的常用用法：table[i]、table.get(i)、len(table)、table.values()
+    带 FLAG_KEYED 的表以节点 id 列为键，table[i] 中的 i 是稳定 id 而不是下标
+    :param path: write_string_table 写出的文件
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, flags, label_table_size = _HEADER.unpack_from(self._mmap, 0)
+        if magic != STRING_TABLE_MAGIC:
+            raise ValueError(f"不是字符串表文件: {path}")
+        position = _HEADER.size
+        self.label_names = json.loads(self._mmap[position:position + label_table_size].decode("utf-8"))
+        position = _align8(position + label_table_size)
+
+        self._offsets = np.frombuffer(self._mmap, dtype="<u8", count=self.count + 1, offset=position)
+        position += self._offsets.nbytes
+        self._label_codes = None
+        if flags & FLAG_LABELS:
+            self._label_codes = np.frombuffer(self._mmap, dtype="<u2", count=self.count, offset=position)
+            position += _align8(self._label_codes.nbytes)
+        self._node_ids = None
+        if flags & FLAG_NODE_IDS:
+            self._node_ids = np.frombuffer(self._mmap, dtype="<i8", count=self.count, offset=position)
+            position += self._node_ids.nbytes
+        self.keyed = bool(flags & FLAG_KEYED)
+        self._blob_start = position
+
+    def __len__(self):
+        return self.count
+
+    def _row(self, i):
+        """键 -> 行号，不存在时返回 -1"""
+        i = int(i)
+        if not self.keyed:
+            return i if 0 <= i < self.count else -1
+        row = int(np.searchsorted(self._node_ids, i))
+        return row if row < self.count and self._node_ids[row] == i else -1
+
+    def __contains__(self, i):
+        return self._row(i) != -1
+
+    def _text_at(self, row):
+        start = self._blob_start + int(self._offsets[row])
+        end = self._blob_start + int(self._offsets[row + 1])
+        return self._mmap[start:end].decode("utf-8")
+
+    def _checked_row(self, i):
+        row = self._row(i)
+        if row == -1:
+            raise KeyError(i)
+        return row
+
+    def __getitem__(self, i):
+        return self._text_at(self._checked_row(i))
+
+    def get(self, i, default=None):
+        return self[i] if i in self else default
+
+    def keys(self):
+        if self.keyed:
+            return (int(key) for key in self._node_ids)
+        return range(self.count)
+
+    def values(self):
+        return (self._text_at(row) for row in range(self.count))
+
+    def items(self):
+        return zip(self.keys(), self.values())
+
+    def label(self, i):
+        """键为 i 的文本的标签，写入时没有标签列则返回 None"""
+        return None if self._label_codes is None else self.label_names[self._label_codes[self._checked_row(i)]]
+
+    def node_id(self, i):
+        """键为 i 的文本对应的节点 id，写入时没有节点 id 列则返回 None"""
+        return None if self._node_ids is None else int(self._node_ids[self._checked_row(i)])
+
+    def close(self):
+        # numpy 视图引用着 mmap，先释放视图才能关闭
+        self._offsets = self._label_codes = self._node_ids = None
+        self._mmap.close()
+
+
+def is_string_table(path) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(STRING_TABLE_MAGIC)) == STRING_TABLE_MAGIC
+
+
+def resolve_id2text_path(path):
+    """path 不存在但同名的 .pkl 文件存在时返回 .pkl 路径，兼容字符串表之前构建的索引"""
+    if not os.path.exists(path):
+        legacy_path = os.path.splitext(path)[0] + ".pkl"
+        if os.path.exists(legacy_path):
+            return legacy_path
+    return path
+
+
+def load_id2text(path):
+    """
+    读取 id->文本 映射：字符串表文件通过 mmap 打开，旧的 pickle 字典照常反序列化
+    """
+    path = resolve_id2text_path(path)
+    if is_string_table(path):
+        return StringTable(path)
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def convert_pickle_to_string_table(pickle_path, table_path):
+    """把旧的 pickle 字典（id 从 0 连续编号）转换为字符串表，无需重新构建向量索引"""
+    with open(pickle_path, "rb") as f:
+        id2text = pickle.load(f)
+    if sorted(id2text) != list(range(len(id2text))):
+        raise ValueError(f"{pickle_path} 的 id 不是从 0 开始的连续整数，无法直接转换")
+    write_string_table(table_path, [id2text[i] for i in range(len(id2text))])
+    return table_path
+
+
+if __name__ == '__main__':
+    from common.config import Config
+
+    # 把已有的 pkl 映射转换为字符串表
+    table_path = Config().ENTITY_ID2TEXT_PATH
+    convert_pickle_to_string_table(os.path.splitext(table_path)[0] + ".pkl", table_path)
+    table = StringTable(table_path)
+    print(f"已转换 {len(table)} 条，id 0 -> {table[0]}")
@@ -0,0 +1,33 @@
+import re
+
+# 中日韩统一表意文字（含扩展A区）及全角标点
+_CJK_PATTERN = re.compile(r"[　-〿㐀-䶿一-鿿＀-￯]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算文本的 token 数，不依赖具体模型的分词器
+
+    中文字符按每字约 1 个 token 计算，其余字符按每 4 个字符约 1 个 token 计算，
+    用于限流、分块和吞吐统计等只需要量级准确的场景。
+
+    Args:
+        text: 输入文本
+
+    Returns:
+        估算的 token 数
+    """
+    if not text:
+        return 0
+    cjk_count = len(_CJK_PATTERN.findall(text))
+    other_count = len(text) - cjk_count
+    return cjk_count + (other_count + 3) // 4
+
+
+def char_token_weight(char: str) -> float:
+    """单个字符的估算 token 数，与 estimate_tokens 口径一致：中文字符 1，其余字符 0.25，用于逐字符累计切分"""
+    return 1.0 if _CJK_PATTERN.match(char) else 0.25
+
+
+if __name__ == '__main__':
+    print(estimate_tokens("【中药名称】人参 - 中医百科"))
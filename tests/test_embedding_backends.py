@@ -0,0 +1,60 @@
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.embedding_backends import OnnxSentenceEncoder, read_onnx_pipeline
+
+TRANSFORMER = {"idx": 0, "name": "0", "path": "", "type": "sentence_transformers.models.Transformer"}
+POOLING = {"idx": 1, "name": "1", "path": "1_Pooling", "type": "sentence_transformers.models.Pooling"}
+NORMALIZE = {"idx": 2, "name": "2", "path": "2_Normalize", "type": "sentence_transformers.models.Normalize"}
+DENSE = {"idx": 2, "name": "2", "path": "2_Dense", "type": "sentence_transformers.models.Dense"}
+
+
+def make_model(tmp_path, modules, **pooling_modes):
+    (tmp_path / "modules.json").write_text(json.dumps(modules), encoding="utf-8")
+    (tmp_path / "1_Pooling").mkdir()
+    config = {"word_embedding_dimension": 8, "pooling_mode_cls_token": False, "pooling_mode_mean_tokens": False,
+              "pooling_mode_max_tokens": False, "pooling_mode_mean_sqrt_len_tokens": False, **pooling_modes}
+    (tmp_path / "1_Pooling" / "config.json").write_text(json.dumps(config), encoding="utf-8")
+    return str(tmp_path)
+
+
+@pytest.mark.parametrize("mode, flag", [("mean", "pooling_mode_mean_tokens"), ("cls", "pooling_mode_cls_token"),
+                                        ("max", "pooling_mode_max_tokens")])
+def test_supported_pipelines(tmp_path, mode, flag):
+    model_path = make_model(tmp_path, [TRANSFORMER, POOLING, NORMALIZE], **{flag: True})
+    assert read_onnx_pipeline(model_path) == {"pooling_mode": mode, "normalize": True}
+
+
+def test_plain_transformers_model_defaults_to_mean(tmp_path):
+    assert read_onnx_pipeline(str(tmp_path)) == {"pooling_mode": "mean", "normalize": False}
+
+
+def test_dense_module_is_refused(tmp_path):
+    model_path = make_model(tmp_path, [TRANSFORMER, POOLING, DENSE], pooling_mode_mean_tokens=True)
+    with pytest.raises(ValueError, match="Dense"):
+        read_onnx_pipeline(model_path)
+
+
+@pytest.mark.parametrize("modes", [{"pooling_mode_mean_sqrt_len_tokens": True},
+                                   {"pooling_mode_mean_tokens": True, "pooling_mode_max_tokens": True}, {}])
+def test_unsupported_pooling_is_refused(tmp_path, modes):
+    model_path = make_model(tmp_path, [TRANSFORMER, POOLING], **modes)
+    with pytest.raises(ValueError):
+        read_onnx_pipeline(model_path)
+
+
+def test_pooling_matches_sentence_transformers():
+    encoder = OnnxSentenceEncoder.__new__(OnnxSentenceEncoder)
+    hidden = np.arange(24, dtype="float32").reshape(2, 3, 4)
+    mask = np.array([[1, 1, 0], [1, 1, 1]])
+    encoder.pooling_mode = "mean"
+    assert np.allclose(encoder._pool(hidden, mask), [hidden[0, :2].mean(0), hidden[1].mean(0)])
+    encoder.pooling_mode = "max"
+    assert np.allclose(encoder._pool(hidden, mask), [hidden[0, :2].max(0), hidden[1].max(0)])
+    encoder.pooling_mode = "cls"
+    assert np.allclose(encoder._pool(hidden, mask), hidden[:, 0])
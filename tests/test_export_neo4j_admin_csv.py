@@ -0,0 +1,91 @@
+import csv
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from __002__extract_information.__000__extract_graph_data_utils import FormulaAttributes, HerbAttributes
+from __003__insert_json_neo4j.__005__export_neo4j_admin_csv import export_admin_import_csv
+
+RESULTS = {"results": [
+    {"extract_dict": {
+        "entities": [
+            {"name": "四君子汤", "type": "Formula", "attributes": {"effect": "益气健脾", "alias": "白术汤"}},
+            {"name": "人参", "type": "Herb", "attributes": {"taboo": "反藜芦", "dosage": "3~9g", "extra": "附注"}},
+            {"name": "白术", "type": "Herb", "attributes": {"effect": "健脾益气，\n燥湿利水"}},
+        ],
+        "relations": [
+            {"subject": "四君子汤", "subject_type": "Formula", "relation": "HAS_INGREDIENT",
+             "object": "白术", "object_type": "Herb"},
+            {"subject": "四君子汤", "subject_type": "Formula", "relation": "HAS_INGREDIENT",
+             "object": "人参", "object_type": "Herb"},
+            {"subject": "人参", "subject_type": "Herb", "relation": "HAS_EFFECT",
+             "object": "补气", "object_type": "Effect"},
+        ],
+    }},
+]}
+
+
+def read_csv(path):
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        return list(csv.reader(f))
+
+
+def export(tmp_path, name):
+    json_path = tmp_path / "results.json"
+    json_path.write_text(json.dumps(RESULTS, ensure_ascii=False), encoding="utf-8")
+    output_dir = tmp_path / name
+    summary = export_admin_import_csv([str(json_path)], str(output_dir))
+    return output_dir, summary
+
+
+def test_node_files_use_id_spaces_and_model_column_order(tmp_path):
+    output_dir, summary = export(tmp_path, "out")
+    assert summary["nodes"] == {"Effect": 1, "Formula": 1, "Herb": 2}
+
+    herb = read_csv(output_dir / "nodes_Herb.csv")
+    assert herb[0] == ["name:ID(Herb)"] + list(HerbAttributes.model_fields) + ["extra", ":LABEL"]
+    assert [row[0] for row in herb[1:]] == sorted(["人参", "白术"])
+    ginseng = dict(zip(herb[0], herb[1]))
+    assert ginseng["taboo"] == "反藜芦" and ginseng["extra"] == "附注" and ginseng["origin"] == ""
+    assert dict(zip(herb[0], herb[2]))["effect"] == "健脾益气，\n燥湿利水"
+
+    formula = read_csv(output_dir / "nodes_Formula.csv")
+    assert formula[0] == ["name:ID(Formula)"] + list(FormulaAttributes.model_fields) + [":LABEL"]
+    # 只在关系中出现的端点也导出为节点，没有模型的标签只有 name 列
+    assert read_csv(output_dir / "nodes_Effect.csv") == [["name:ID(Effect)", ":LABEL"], ["补气", "Effect"]]
+
+
+def test_relationship_files_reference_id_spaces_and_are_sorted(tmp_path):
+    output_dir, _ = export(tmp_path, "out")
+    rows = read_csv(output_dir / "relationships_HAS_INGREDIENT_Formula_Herb.csv")
+    assert rows[0] == [":START_ID(Formula)", ":END_ID(Herb)", ":TYPE"]
+    assert rows[1:] == sorted([["四君子汤", "人参", "HAS_INGREDIENT"], ["四君子汤", "白术", "HAS_INGREDIENT"]])
+    assert read_csv(output_dir / "relationships_HAS_EFFECT_Herb_Effect.csv")[0] == \
+        [":START_ID(Herb)", ":END_ID(Effect)", ":TYPE"]
+
+
+def test_import_command_lists_all_files(tmp_path):
+    output_dir, summary = export(tmp_path, "out")
+    command = (output_dir / "import_command.txt").read_text(encoding="utf-8")
+    assert command == (
+        f"# 在 {output_dir} 目录下、数据库停止状态执行\n"
+        "neo4j-admin database import full \\\n"
+        "  neo4j \\\n"
+        "  --overwrite-destination \\\n"
+        "  --multiline-fields=true \\\n"
+        "  --nodes=nodes_Effect.csv \\\n"
+        "  --nodes=nodes_Formula.csv \\\n"
+        "  --nodes=nodes_Herb.csv \\\n"
+        "  --relationships=relationships_HAS_INGREDIENT_Formula_Herb.csv \\\n"
+        "  --relationships=relationships_HAS_EFFECT_Herb_Effect.csv\n")
+    assert summary["command"] in command
+
+
+def test_repeated_exports_are_identical(tmp_path):
+    first, _ = export(tmp_path, "first")
+    second, _ = export(tmp_path, "second")
+    names = sorted(path.name for path in first.iterdir() if path.suffix == ".csv")
+    assert names == sorted(path.name for path in second.iterdir() if path.suffix == ".csv")
+    for name in names:
+        assert (first / name).read_bytes() == (second / name).read_bytes()
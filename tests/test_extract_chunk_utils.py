@@ -0,0 +1,81 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from __002__extract_information.__000__extract_chunk_utils import (merge_extraction_results, split_by_token_window,
+                                                                   split_sections, split_text_into_chunks)
+from common.token_utils import estimate_tokens
+
+TITLE = "【方剂名称】十全大补汤"
+
+
+def make_document(section_tokens, section_count=4):
+    sections = [f"【段落{i}】\n" + "补" * section_tokens + "\n" for i in range(section_count)]
+    return f"{TITLE}\n" + "".join(sections)
+
+
+def test_short_text_is_one_chunk():
+    text = make_document(10)
+    assert split_text_into_chunks(text, max_tokens=1000) == [text]
+
+
+def test_sections_split_only_at_line_start_markers():
+    text = "标题\n【组成】人参【注】不是段落\n【用法】水煎服\n"
+    assert split_sections(text) == ["标题\n", "【组成】人参【注】不是段落\n", "【用法】水煎服\n"]
+
+
+def test_chunks_respect_budget_and_carry_title():
+    chunks = split_text_into_chunks(make_document(120), max_tokens=300, overlap_tokens=20)
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert chunk.startswith(TITLE)
+        assert estimate_tokens(chunk[len(TITLE):]) <= 300
+
+
+def test_no_title_only_or_tiny_tail_chunks():
+    chunks = split_text_into_chunks(make_document(800), max_tokens=300, overlap_tokens=50)
+    body_tokens = [estimate_tokens(chunk[len(TITLE) + 1:]) for chunk in chunks]
+    assert all(tokens <= 300 for tokens in body_tokens)
+    # 只有最后一块可以不满预算，4 × 800 token 的正文在 300 token、重叠 50 的预算下需要 13 块
+    assert all(tokens > 250 for tokens in body_tokens[:-1])
+    assert len(chunks) == 13
+
+
+def test_small_sections_share_a_chunk():
+    chunks = split_text_into_chunks(make_document(100, section_count=6), max_tokens=300)
+    assert len(chunks) == 3 and all(chunk.count("【段落") == 2 for chunk in chunks)
+
+
+def test_token_window_overlap_and_coverage():
+    text = "".join(chr(0x4e00 + i) for i in range(1000))
+    windows = split_by_token_window(text, max_tokens=300, overlap_tokens=50)
+    assert all(estimate_tokens(window) <= 300 for window in windows)
+    for previous, current in zip(windows, windows[1:]):
+        assert previous[-50:] == current[:50]
+    assert windows[0][0] == text[0] and windows[-1][-1] == text[-1]
+
+
+def test_token_window_counts_non_cjk_like_estimate_tokens():
+    text = "—αβγ" * 200  # 非 ASCII 也非中文，每 4 个字符约 1 个 token
+    windows = split_by_token_window(text, max_tokens=50, overlap_tokens=0)
+    assert "".join(windows) == text
+    assert all(45 <= estimate_tokens(window) <= 50 for window in windows[:-1])
+
+
+def test_merge_deduplicates_entities_and_relations():
+    relation = {"subject": "十全大补汤", "subject_type": "Formula", "relation": "HAS_INGREDIENT",
+                "object": "人参", "object_type": "Herb"}
+    merged = merge_extraction_results([
+        {"entities": [{"name": "人参", "type": "Herb", "attributes": {"effect": "补气", "taboo": "反藜芦"}}],
+         "relations": [relation]},
+        None,
+        {"entities": [{"name": "人参", "type": "Herb", "attributes": {"effect": "大补元气"}},
+                      {"name": "人参", "type": "Formula"},
+                      {"name": "", "type": "Herb"}],
+         "relations": [dict(relation), {**relation, "object": None}]},
+    ])
+    assert merged["entities"] == [
+        {"name": "人参", "type": "Herb", "attributes": {"effect": "大补元气", "taboo": "反藜芦"}},
+        {"name": "人参", "type": "Formula"},
+    ]
+    assert merged["relations"] == [relation]
@@ -0,0 +1,65 @@
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from __002__extract_information.__000__extract_graph_data_utils import (append_jsonl_records,
+                                                                        finalize_extraction_results,
+                                                                        get_checkpoint_path, load_existing_results,
+                                                                        read_jsonl_records)
+
+
+def test_checkpoint_path_sits_next_to_json():
+    assert get_checkpoint_path("out/herb_knowledge_graph.json") == "out/herb_knowledge_graph.jsonl"
+
+
+def test_append_and_read_skip_truncated_last_line(tmp_path):
+    log_path = str(tmp_path / "a.jsonl")
+    append_jsonl_records(log_path, [{"filename": "a.txt", "result": {"entities": []}}])
+    append_jsonl_records(log_path, [{"filename": "b.txt", "result": None, "error": "超时"}])
+    with open(log_path, "a", encoding="utf-8") as f:
+        f.write('{"filename": "c.txt", "res')  # 写到一半被杀
+    assert [record["filename"] for record in read_jsonl_records(log_path)] == ["a.txt", "b.txt"]
+
+
+def test_finalize_keeps_last_record_per_file_in_first_seen_order(tmp_path):
+    output_path = str(tmp_path / "out.json")
+    append_jsonl_records(get_checkpoint_path(output_path), [
+        {"filename": "a.txt", "result": None, "error": "429"},
+        {"filename": "b.txt", "result": {"entities": [1]}},
+        {"filename": "a.txt", "result": {"entities": [2]}},
+    ])
+    assert finalize_extraction_results(output_path) == 2
+    with open(output_path, "r", encoding="utf-8") as f:
+        output_list = json.load(f)["output_list"]
+    assert output_list == [{"filename": "a.txt", "result": {"entities": [2]}},
+                           {"filename": "b.txt", "result": {"entities": [1]}}]
+
+
+def test_finalize_writes_finetune_list_without_filenames(tmp_path):
+    output_path, finetune_path = str(tmp_path / "out.json"), str(tmp_path / "finetune.json")
+    append_jsonl_records(get_checkpoint_path(output_path), [{"filename": "a.txt", "result": {}}])
+    append_jsonl_records(get_checkpoint_path(finetune_path), [{"filename": "a.txt", "input": "原文", "output": "{}"}])
+    finalize_extraction_results(output_path, finetune_path)
+    with open(finetune_path, "r", encoding="utf-8") as f:
+        assert json.load(f) == [{"input": "原文", "output": "{}"}]
+
+
+def test_resume_skips_done_files_and_retries_failed_ones(tmp_path):
+    output_path = str(tmp_path / "out.json")
+    append_jsonl_records(get_checkpoint_path(output_path), [
+        {"filename": "a.txt", "result": {}},
+        {"filename": "b.txt", "result": None, "error": "429"},
+        {"filename": "c.txt", "result": None, "error": "超时"},
+        {"filename": "c.txt", "result": {}},
+    ])
+    processed, record_count = load_existing_results(output_path)
+    assert processed == {"a.txt", "c.txt"} and record_count == 4
+
+
+def test_resume_imports_legacy_json_into_log(tmp_path):
+    output_path = tmp_path / "out.json"
+    output_path.write_text(json.dumps({"output_list": [{"filename": "a.txt", "result": {}}]}), encoding="utf-8")
+    processed, record_count = load_existing_results(str(output_path))
+    assert processed == {"a.txt"} and record_count == 1
+    assert Path(get_checkpoint_path(str(output_path))).exists()
@@ -0,0 +1,45 @@
+import sys
+from pathlib import Path
+
+import faiss
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from __003__insert_json_neo4j.__000__incremental_index_utils import update_faiss_index
+from common.string_table import StringTable
+
+NAME_COUNT = 3000
+REMOVED_COUNT = 300
+QUERY_COUNT = 200
+
+
+def make_encoder(names, dim=32):
+    """每个名称对应一个固定的随机单位向量，代替向量模型"""
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((len(names), dim)).astype("float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    vector_of = dict(zip(names, vectors))
+    return lambda texts: np.stack([vector_of[text] for text in texts])
+
+
+@pytest.mark.parametrize("index_type", ["flat", "hnsw", "ivf"])
+def test_removal_keeps_ids_mapped_to_names(tmp_path, index_type):
+    names = [f"名称{i}" for i in range(NAME_COUNT)]
+    encode = make_encoder(names)
+    index_path, mapping_path = str(tmp_path / "a.index"), str(tmp_path / "a.strtab")
+
+    update_faiss_index(names, index_path, mapping_path, encode, index_type)
+    kept = names[REMOVED_COUNT:]
+    stats = update_faiss_index(kept, index_path, mapping_path, encode, index_type)
+    assert stats["removed"] == REMOVED_COUNT and stats["encoded"] == 0
+
+    index = faiss.read_index(index_path)
+    if index_type == "ivf":
+        ivf = faiss.extract_index_ivf(index)
+        ivf.nprobe = ivf.nlist  # 检索全部聚类，结果只取决于 id 映射是否正确
+    table = StringTable(mapping_path)
+    queries = kept[:QUERY_COUNT]
+    _, ids = index.search(encode(queries), 1)
+    assert index.ntotal == len(kept)
+    assert [table.get(int(i)) for i in ids[:, 0]] == queries
@@ -0,0 +1,65 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from __003__insert_json_neo4j.__000__ingest_delta_utils import (build_manifest, compute_ingest_delta,
+                                                                count_delta_rows, hash_props, load_manifest,
+                                                                retain_deleted_in_manifest, save_manifest)
+
+INGREDIENT = ("Formula", "HAS_INGREDIENT", "Herb")
+
+
+def snapshot(herbs, ingredients):
+    """herbs: {名称: 属性}；ingredients: 四君子汤的组成药材"""
+    entity_groups = {"Herb": [{"name": name, "props": props} for name, props in herbs.items()],
+                     "Formula": [{"name": "四君子汤", "props": {}}]}
+    relation_groups = {INGREDIENT: [{"subject": "四君子汤", "object": name} for name in ingredients]}
+    return entity_groups, relation_groups
+
+
+def test_hash_ignores_key_order():
+    assert hash_props({"a": 1, "b": "补气"}) == hash_props({"b": "补气", "a": 1})
+    assert hash_props({"a": 1}) != hash_props({"a": 2})
+
+
+def test_first_ingest_inserts_everything():
+    delta = compute_ingest_delta(*snapshot({"人参": {}, "白术": {}}, ["人参", "白术"]), load_manifest(None))
+    assert count_delta_rows(delta) == {"entity_inserts": 3, "entity_updates": 0, "entity_deletes": 0,
+                                       "relation_inserts": 2, "relation_deletes": 0}
+
+
+def test_unchanged_data_produces_no_changes():
+    groups = snapshot({"人参": {"effect": "补气"}}, ["人参"])
+    delta = compute_ingest_delta(*groups, build_manifest(*groups))
+    assert not any(count_delta_rows(delta).values())
+
+
+def test_changes_are_classified():
+    old = build_manifest(*snapshot({"人参": {"effect": "补气"}, "白术": {}, "茯苓": {}}, ["人参", "白术", "茯苓"]))
+    delta = compute_ingest_delta(*snapshot({"人参": {"effect": "大补元气"}, "白术": {}, "甘草": {}},
+                                           ["人参", "白术", "甘草"]), old)
+    assert delta["entity_updates"] == {"Herb": [{"name": "人参", "props": {"effect": "大补元气"}}]}
+    assert delta["entity_inserts"] == {"Herb": [{"name": "甘草", "props": {}}]}
+    assert delta["entity_deletes"] == {"Herb": [{"name": "茯苓"}]}
+    assert delta["relation_inserts"] == {INGREDIENT: [{"subject": "四君子汤", "object": "甘草"}]}
+    assert delta["relation_deletes"] == {INGREDIENT: [{"subject": "四君子汤", "object": "茯苓"}]}
+
+
+def test_retained_deletes_are_reported_again(tmp_path):
+    manifest_path = str(tmp_path / "manifest.json")
+    save_manifest(manifest_path, build_manifest(*snapshot({"人参": {}, "茯苓": {}}, ["人参", "茯苓"])))
+    old = load_manifest(manifest_path)
+    current = snapshot({"人参": {}}, ["人参"])
+    delta = compute_ingest_delta(*current, old)
+    save_manifest(manifest_path, retain_deleted_in_manifest(delta["manifest"], old))
+
+    again = compute_ingest_delta(*current, load_manifest(manifest_path))
+    assert again["entity_deletes"] == {"Herb": [{"name": "茯苓"}]}
+    assert again["relation_deletes"] == {INGREDIENT: [{"subject": "四君子汤", "object": "茯苓"}]}
+    assert not again["entity_inserts"] and not again["relation_inserts"]
+
+
+def test_manifest_with_other_version_counts_as_first_ingest(tmp_path):
+    manifest_path = str(tmp_path / "manifest.json")
+    save_manifest(manifest_path, {"version": -1, "entities": {"Herb\x1f人参": "x"}, "relations": []})
+    assert load_manifest(manifest_path)["entities"] == {}
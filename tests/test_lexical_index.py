@@ -0,0 +1,59 @@
+import math
+import sys
+from collections import Counter
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.lexical_index import NgramIndex, char_ngrams
+
+TEXTS = ["头痛", "偏头痛", "腹痛", "四君子汤", "六君子汤", "失眠"]
+
+
+def reference_bm25(texts, query, k1=1.2, b=0.75):
+    """按 BM25 定义逐个文本计算的分数，作为对照"""
+    docs = [Counter(char_ngrams(text)) for text in texts]
+    avg_length = sum(sum(doc.values()) for doc in docs) / len(docs)
+    scores = []
+    for doc in docs:
+        length = sum(doc.values())
+        score = 0.0
+        for gram, query_tf in Counter(char_ngrams(query)).items():
+            tf = doc.get(gram, 0)
+            if not tf:
+                continue
+            df = sum(1 for other in docs if gram in other)
+            idf = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+            score += query_tf * idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avg_length))
+        scores.append(score)
+    return scores
+
+
+def test_char_ngrams_normalise_variants_and_whitespace():
+    assert char_ngrams("头 疼") == ["头", "痛", "头痛"]
+    assert char_ngrams("人参", ngram_range=(2, 2)) == ["人参"]
+
+
+@pytest.mark.parametrize("query", ["头疼", "四君子", "腹部疼痛"])
+def test_scores_match_bm25_definition(query):
+    index = NgramIndex(TEXTS)
+    expected = reference_bm25(TEXTS, query)
+    self_score = index._self_score(Counter(char_ngrams(query)))
+    hits = index.search(query, top_k=len(TEXTS))
+    assert [text_id for text_id, _ in hits] == sorted((i for i, s in enumerate(expected) if s > 0),
+                                                      key=lambda i: -expected[i])
+    for text_id, score in hits:
+        assert score == pytest.approx(min(1.0, expected[text_id] / self_score), rel=1e-5)
+
+
+def test_exact_and_variant_matches_rank_first():
+    index = NgramIndex(TEXTS)
+    assert index.search("头痛", top_k=1) == [(0, pytest.approx(1.0))]
+    assert index.search("头疼", top_k=1)[0][0] == 0
+    assert index.search("四君子", top_k=1)[0][0] == 3
+
+
+def test_no_overlap_and_empty_index_return_nothing():
+    assert NgramIndex(TEXTS).search("人参") == []
+    assert NgramIndex([]).search("头痛") == []
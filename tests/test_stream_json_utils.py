@@ -0,0 +1,37 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from __003__insert_json_neo4j.__000__stream_json_utils import iter_json_array_items
+
+DATA = {
+    "meta": {"version": -2.5e-3, "ok": True, "note": "含有 ] 和 } 的字符串"},
+    "results": [1.5, -0.25, 12e3, 1E+2, 0, {"name": "人参", "dose": [3.14, None, "x"]}, "末尾"],
+    "tail": 7.75,
+}
+
+
+@pytest.mark.parametrize("indent", [None, 2])
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 1 << 16])
+def test_items_survive_any_chunk_boundary(tmp_path, indent, chunk_size):
+    json_path = tmp_path / "a.json"
+    json_path.write_text(json.dumps(DATA, ensure_ascii=False, indent=indent), encoding="utf-8")
+    assert list(iter_json_array_items(str(json_path), chunk_size=chunk_size)) == DATA["results"]
+
+
+def test_missing_or_empty_array(tmp_path):
+    json_path = tmp_path / "a.json"
+    json_path.write_text('{"results": [], "other": 1}', encoding="utf-8")
+    assert list(iter_json_array_items(str(json_path), chunk_size=1)) == []
+    json_path.write_text('{"output_list": [1]}', encoding="utf-8")
+    assert list(iter_json_array_items(str(json_path))) == []
+
+
+def test_malformed_array_raises(tmp_path):
+    json_path = tmp_path / "a.json"
+    json_path.write_text('{"results": [1 2]}', encoding="utf-8")
+    with pytest.raises(ValueError):
+        list(iter_json_array_items(str(json_path), chunk_size=1))